@@ -1,22 +1,30 @@
-from flask import Flask, request, jsonify
-from recommend import recommend_courses
+from flask import Flask, Response, request, jsonify
+from recommend import recommend_courses, get_job_status
 from career_video_analysis import analyze_career_video
 from student_chatbot import chatbot_bp
 import google.generativeai as genai
 import os
-import tempfile
+import threading
+import time
 import subprocess
 import re
-from pymongo import MongoClient
 from dotenv import load_dotenv
 from flask_cors import CORS
 from generate_quiz import generate_quiz_from_transcript
-from score_quiz import score_quiz_with_ai
+from score_quiz import score_quiz_with_ai, score_quiz_batch
 from interview_analysis import analyze_interview
-from live_cheating_detector import check_cheating, clear_session
+from live_cheating_detector import check_cheating, clear_session, session_count, SESSIONS as CHEATING_SESSIONS
 from utils.progress_tracker import set_progress, get_progress
+from utils.db import get_db, pool_stats, ping as mongo_ping
 from bson.objectid import ObjectId
-from generate_next_question import generate_next_question
+from generate_next_question import next_unique_question, interview_bank_key
+from utils.llm_governor import generate_content, get_stats as get_llm_stats, LLMUnavailable, breaker as llm_breaker
+from utils.structured_output import generate_structured
+from utils.domains import COURSE_DOMAINS
+from utils.interview_sessions import open_session, record_question, start_session
+from utils.dispatcher import route_class, run_cpu, run_frame, Overloaded, stats as dispatch_stats
+from utils import dispatcher, model_registry, metrics, request_metrics, media_cache
+from utils.scratch import job_dir, ScratchSpaceError
 
 # =========================
 #  LOAD ENV VARIABLES
@@ -29,6 +37,9 @@ else:
 
 MONGO_CONN = os.getenv("MONGO_CONN")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+SCORE_BATCH_MAX_SUBMISSIONS = int(os.getenv("SCORE_BATCH_MAX_SUBMISSIONS", 1000))
+# How long /ready reuses its last Mongo ping
+READY_CACHE_SEC = float(os.getenv("READY_CACHE_SEC", 5))
 
 if not MONGO_CONN:
     print("❌ ERROR: MONGO_CONN missing in environment!")
@@ -52,6 +63,13 @@ CORS(app, supports_credentials=True)
 # Register chatbot blueprint
 app.register_blueprint(chatbot_bp)
 
+# Per-route request counts, latency histograms and in-flight gauges
+request_metrics.init_app(app)
+
+# Preload WARMUP_MODELS in the background; /warmup reports progress
+if model_registry.WARMUP_MODELS:
+    threading.Thread(target=dispatcher.warmup, name="model-warmup", daemon=True).start()
+
 
 # =======================================
 # CORS HEADERS FIX (NO HARDCODED DOMAINS)
@@ -81,6 +99,28 @@ def options_handler(path):
     return '', 204
 
 
+@app.errorhandler(LLMUnavailable)
+def llm_unavailable_handler(e):
+    response = jsonify({"error": str(e)})
+    if e.retry_after:
+        response.headers["Retry-After"] = str(int(max(1, e.retry_after)))
+    return response, 503
+
+
+@app.errorhandler(ScratchSpaceError)
+def scratch_space_handler(e):
+    response = jsonify({"error": str(e)})
+    response.headers["Retry-After"] = "60"
+    return response, 507
+
+
+@app.errorhandler(Overloaded)
+def overloaded_handler(e):
+    response = jsonify({"error": str(e)})
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response, 503
+
+
 # =========================
 # UTILITY FUNCTIONS
 # =========================
@@ -93,25 +133,28 @@ def extract_youtube_id(url):
             return m.group(1)
     return None
 
-def download_audio(video_url):
-    print(f"[PY] Downloading audio for {video_url}")
-    cmd = [
-        "yt-dlp", "-f", "bestaudio", "--extract-audio",
-        "--audio-format", "mp3",
-        "-o", os.path.join(tempfile.gettempdir(), "%(id)s.%(ext)s"),
-        video_url
-    ]
-    subprocess.run(cmd, capture_output=True, text=True)
+def download_audio(video_url, dest_dir):
     vid = extract_youtube_id(video_url)
-    mp3_path = os.path.join(tempfile.gettempdir(), f"{vid}.mp3")
-    return mp3_path if os.path.exists(mp3_path) else None
+
+    def run_yt_dlp(work_dir):
+        print(f"[PY] Downloading audio for {video_url}")
+        cmd = [
+            "yt-dlp", "-f", "bestaudio", "--extract-audio",
+            "--audio-format", "mp3",
+            "-o", os.path.join(work_dir, "%(id)s.%(ext)s"),
+            video_url
+        ]
+        subprocess.run(cmd, capture_output=True, text=True)
+        mp3_path = os.path.join(work_dir, f"{vid}.mp3")
+        return mp3_path if os.path.exists(mp3_path) else None
+
+    # A YouTube video's audio never changes, so the video id is the cache key
+    return media_cache.fetch_with(f"youtube-audio:{vid}", run_yt_dlp, os.path.join(dest_dir, f"{vid}.mp3"))
 
 def run_whisper(audio_path):
     print(f"[PY] Running Whisper on {audio_path}")
     try:
-        import whisper
-        whisper_model = whisper.load_model("base")
-        result = whisper_model.transcribe(audio_path, verbose=False)
+        result = model_registry.transcribe(audio_path, verbose=False)
         return [
             {"start": seg["start"], "end": seg["end"], "text": seg["text"].strip()}
             for seg in result.get("segments", [])
@@ -122,14 +165,8 @@ def run_whisper(audio_path):
 
 
 def save_transcript(course_id, lesson_id, video_id, transcript):
-    client = MongoClient(MONGO_CONN)
-    try:
-        db = client.get_default_database()
-        if db is None:
-            db = client["test"]
-    except:
-        db = client["test"]
-    
+    db = get_db()
+
     # Ensure IDs are ObjectIds for Mongoose compatibility
     c_id = ObjectId(course_id) if isinstance(course_id, str) else course_id
     l_id = ObjectId(lesson_id) if isinstance(lesson_id, str) else lesson_id
@@ -146,13 +183,7 @@ def save_transcript(course_id, lesson_id, video_id, transcript):
     )
 
 def find_lesson(video_id):
-    client = MongoClient(MONGO_CONN)
-    try:
-        db = client.get_default_database()
-        if db is None:
-            db = client["test"]
-    except:
-        db = client["test"]
+    db = get_db()
     for course in db["courses"].find():
         for week in course.get("weeks", []):
             for module in week.get("modules", []):
@@ -171,7 +202,118 @@ def home():
     return jsonify({"message": "Velocitix AI Service Running"}), 200
 
 
+# =========================
+#  METRICS & READINESS
+# =========================
+_model_ready = metrics.gauge("model_ready_processes", "Processes with the model loaded, by tier")
+_model_load_seconds = metrics.gauge("model_load_seconds", "Slowest load time of the model, by tier")
+_cheating_sessions = metrics.gauge("cheating_sessions", "Live proctoring sessions held in memory")
+_mongo_pool = metrics.gauge("mongo_pool", "Mongo connection pool statistics for this process")
+_warmup_done = metrics.gauge("warmup_done", "1 once WARMUP_MODELS are loaded")
+
+
+def _model_states_by_tier():
+    # Frame shards are asked directly; the cpu pool can't address single
+    # workers, so it is reported as of the last warmup.
+    tiers = {"main": [model_registry.states()]}
+    warmed = dispatcher.warmup_status()["tiers"]
+    if "cpu" in warmed:
+        tiers["cpu"] = [warmed["cpu"]]
+    if dispatcher.CPU_EXECUTOR != "inline":
+        shards = dispatcher.on_frame_shards(model_registry.states)
+        if shards:
+            tiers["frame"] = shards
+    return tiers
+
+
+def _collect_runtime_metrics():
+    for tier, processes in _model_states_by_tier().items():
+        for name in processes[0]["models"]:
+            infos = [p["models"][name] for p in processes]
+            ready = [i for i in infos if i["state"] == model_registry.READY]
+            _model_ready.set(len(ready), model=name, tier=tier)
+            _model_load_seconds.set(max((i["load_seconds"] for i in ready), default=0), model=name, tier=tier)
+
+    if dispatcher.serves("frame"):
+        if CHEATING_SESSIONS.shared:
+            _cheating_sessions.set(session_count())
+        else:
+            _cheating_sessions.set(sum(dispatcher.on_frame_shards(session_count)))
+    for stat, value in pool_stats().items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool) and stat != "pid":
+            _mongo_pool.set(value, stat=stat)
+    _warmup_done.set(1 if dispatcher.warmup_status()["state"] == "done" else 0)
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics_api():
+    _collect_runtime_metrics()
+    return Response(metrics.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+
+_mongo_check = {"at": 0.0, "ok": False, "error": None}
+
+
+@app.route("/ready", methods=["GET"])
+def ready_api():
+    now = time.monotonic()
+    if now - _mongo_check["at"] > READY_CACHE_SEC:
+        ok, error = mongo_ping()
+        _mongo_check.update(at=now, ok=ok, error=error)
+
+    warm = dispatcher.warmup_status()
+    checks = {
+        "mongo": {"ok": _mongo_check["ok"], "error": _mongo_check["error"]},
+        "models": {
+            "ok": not model_registry.WARMUP_MODELS or warm["state"] == "done",
+            "state": warm["state"],
+            "models": warm["models"],
+            "error": warm["error"],
+        },
+        # Reported, but an open breaker doesn't take the worker out of rotation:
+        # requests still get a fast 503 and the breaker probes for recovery.
+        "llm": {"ok": llm_breaker.state != "open", "breaker": llm_breaker.state, "required": False},
+    }
+    ready = all(c["ok"] for c in checks.values() if c.get("required", True))
+    return jsonify({"ready": ready, "checks": checks}), 200 if ready else 503
+
+
+@app.route("/db/pool", methods=["GET"])
+def db_pool_stats():
+    return jsonify(pool_stats()), 200
+
+
+@app.route("/warmup", methods=["GET"])
+def warmup_status_api():
+    return jsonify({**dispatcher.warmup_status(), "local": model_registry.states()}), 200
+
+
+@app.route("/warmup", methods=["POST"])
+def warmup_api():
+    names = (request.json or {}).get("models") if request.is_json else None
+    try:
+        return jsonify(dispatcher.warmup(names)), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@app.route("/media-cache/stats", methods=["GET"])
+def media_cache_stats():
+    return jsonify(media_cache.stats()), 200
+
+
+@app.route("/dispatch/stats", methods=["GET"])
+def dispatch_stats_api():
+    return jsonify(dispatch_stats()), 200
+
+
+@app.route("/llm/metrics", methods=["GET"])
+def llm_metrics():
+    return jsonify(get_llm_stats()), 200
+
+
 @app.route("/recommend", methods=["POST"])
+@route_class("io")
 def recommend():
     data = request.json
     student_id = data.get("student_id")
@@ -179,27 +321,42 @@ def recommend():
     if not student_id:
         return jsonify({"error": "Student ID missing"}), 400
     try:
-        return jsonify(recommend_courses(student_id, refresh)), 200
+        result = recommend_courses(student_id, refresh)
+        # 202 while the full analysis job is still running in the background
+        return jsonify(result), 200 if result.get("isProcessed") else 202
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+@app.route("/recommend/status/<student_id>", methods=["GET"])
+@route_class("io")
+def recommend_status(student_id):
+    try:
+        return jsonify(get_job_status(student_id)), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 404
+
+
 @app.route("/analyze-career-video", methods=["POST"])
+@route_class("cpu")
 def analyze_video():
     video_url = request.json.get("video_url")
     print(f"[AI] Received request to analyze video: {video_url}")
     if not video_url:
         return jsonify({"error": "Missing video_url"}), 400
     try:
-        results = analyze_career_video(video_url)
+        results = analyze_career_video(video_url, run=run_cpu)
         print(f"[AI] Analysis complete for: {video_url}")
         return jsonify(results), 200
+    except (ScratchSpaceError, LLMUnavailable):
+        raise
     except Exception as e:
         print(f"[AI] Analysis failed: {e}")
         return jsonify({"error": str(e)}), 500
 
 
 @app.route("/generate-transcript", methods=["POST"])
+@route_class("cpu")
 def generate_transcript():
     data = request.json
     video_url = data.get("videoUrl")
@@ -210,13 +367,17 @@ def generate_transcript():
         video_id = extract_youtube_id(video_url).strip()
         set_progress(video_id, 5)
 
-        audio_path = download_audio(video_url)
-        if not audio_path:
-            set_progress(video_id, 0)
-            return jsonify({"error": "Audio download failed"}), 500
-
-        set_progress(video_id, 25)
-        transcript = run_whisper(audio_path)
+        # Per-request scratch directory: concurrent requests for the same
+        # video each download their own copy, removed when Whisper is done
+        with job_dir("transcript", video_id) as job:
+            audio_path = download_audio(video_url, job.path)
+            if not audio_path:
+                set_progress(video_id, 0)
+                return jsonify({"error": "Audio download failed"}), 500
+            job.check_quota()
+
+            set_progress(video_id, 25)
+            transcript = run_cpu(run_whisper, audio_path)
         if not transcript:
             set_progress(video_id, 0)
             return jsonify({"error": "Whisper failed"}), 500
@@ -230,22 +391,30 @@ def generate_transcript():
         set_progress(video_id, 100)
         return jsonify({"message": "Transcript saved", "videoId": video_id}), 200
 
+    except ScratchSpaceError:
+        set_progress(video_id, 0)
+        raise
     except Exception as e:
         set_progress(video_id, 0)
         return jsonify({"error": str(e)}), 500
 
 
 @app.route("/generate-quiz", methods=["POST"])
+@route_class("io")
 def generate_quiz_api():
     transcript = request.json.get("transcript")
     if not transcript:
         return jsonify({"error": "Transcript missing"}), 400
 
-    text = " ".join(seg.get("text", "") for seg in transcript) if isinstance(transcript, list) else str(transcript)
-    return jsonify(generate_quiz_from_transcript(text)), 200
+    # Segment lists are passed through so long transcripts can be chunked on
+    # segment boundaries.
+    if not isinstance(transcript, list):
+        transcript = str(transcript)
+    return jsonify(generate_quiz_from_transcript(transcript)), 200
 
 
 @app.route("/score-quiz", methods=["POST"])
+@route_class("io")
 def score_quiz_api():
     data = request.json
     if not data.get("studentAnswers") or not data.get("originalQuestions"):
@@ -253,12 +422,29 @@ def score_quiz_api():
     return jsonify(score_quiz_with_ai(data["studentAnswers"], data["originalQuestions"])), 200
 
 
+@app.route("/score-quiz/batch", methods=["POST"])
+@route_class("io")
+def score_quiz_batch_api():
+    submissions = (request.json or {}).get("submissions")
+    if not isinstance(submissions, list) or not submissions:
+        return jsonify({"error": "Missing submissions"}), 400
+    if len(submissions) > SCORE_BATCH_MAX_SUBMISSIONS:
+        return jsonify({"error": f"At most {SCORE_BATCH_MAX_SUBMISSIONS} submissions per batch"}), 413
+    for i, sub in enumerate(submissions):
+        if not isinstance(sub, dict) or not sub.get("studentAnswers") or not sub.get("originalQuestions"):
+            return jsonify({"error": f"Missing quiz data in submission {i}"}), 400
+
+    results, stats = score_quiz_batch(submissions)
+    return jsonify({"results": results, "stats": stats}), 200
+
+
 @app.route("/progress/<lesson_id>", methods=["GET"])
 def get_progress_api(lesson_id):
     return jsonify({"progress": get_progress(lesson_id)}), 200
 
 
 @app.route("/generate-next-question", methods=["POST"])
+@route_class("io")
 def next_question_api():
     try:
         data = request.json
@@ -270,26 +456,11 @@ def next_question_api():
         is_skipped = data.get("skip", False)
         timedOut = data.get("timedOut", False)
 
-        client = MongoClient(MONGO_CONN)
-        db = client["auth_db"]
+        db = get_db("auth_db")
         sessions = db["interviewsessions"]
         courses = db["courses"]
 
-        session = sessions.find_one({"student": ObjectId(student_id), "course": ObjectId(course_id)})
-
-        if not session:
-            sessions.insert_one({
-                "student": ObjectId(student_id),
-                "course": ObjectId(course_id),
-                "questions": [],
-                "answers": [],
-                "skippedQuestions": [],
-                "notAttemptedQuestions": [],
-                "timestamps": [],
-                "status": "in-progress",
-                "lastGeneratedQuestion": {"index": 0, "question": ""}
-            })
-            session = sessions.find_one({"student": ObjectId(student_id), "course": ObjectId(course_id)})
+        session, used = open_session(sessions, ObjectId(student_id), ObjectId(course_id))
 
         if is_skipped and not answer:
             answer = "Skipped"
@@ -309,55 +480,52 @@ def next_question_api():
             for lesson in module.get("lessons", [])
         ][:10]
 
-        used = set(
-            q.get("question", "").strip()
-            for arr in ["questions", "notAttemptedQuestions", "skippedQuestions", "answers"]
-            for q in session.get(arr, [])
-        )
-
         current_index = session.get("lastGeneratedQuestion", {}).get("index", 0)
-        for _ in range(3):
-            res = generate_next_question(
-                answer,
-                current_index,
-                transcript,
-                proficiency,
-                course.get("title", "Course"),
-                skills,
-                lessons,
-                ideal_roles,
-            )
-            nq = res.get("nextQuestion", "").strip()
-            if nq and nq not in used:
-                sessions.update_one(
-                    {"_id": session["_id"]},
-                    {"$set": {"lastGeneratedQuestion": {"index": current_index + 1, "question": nq}}}
-                )
-                return jsonify({"nextQuestion": nq})
+        nq, source = next_unique_question(
+            answer,
+            current_index,
+            transcript,
+            proficiency,
+            course.get("title", "Course"),
+            skills,
+            lessons,
+            ideal_roles,
+            used=used,
+            bank_key=interview_bank_key(student_id, course_id),
+        )
+        if nq:
+            record_question(sessions, session["_id"], current_index + 1, nq)
+            return jsonify({"nextQuestion": nq, "source": source})
 
         return jsonify({"error": "AI failed to generate unique question"}), 409
 
+    except LLMUnavailable:
+        raise
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @app.route("/check-frame", methods=["POST"])
+@route_class("frame")
 def detect_cheating_api():
     file = request.files.get("frame")
     session_id = request.form.get("sessionId") or request.args.get("sessionId") or "default"
     if not file:
         return jsonify({"error": "No frame uploaded"}), 400
-    return jsonify(check_cheating(file.read(), session_id)), 200
+    frame_load = dispatcher.load("frame")
+    return jsonify(run_frame(session_id, check_cheating, file.read(), session_id, frame_load)), 200
 
 
 @app.route("/cheating-session/reset", methods=["POST"])
+@route_class("frame")
 def reset_cheating_session_api():
     session_id = (request.json or {}).get("sessionId", "default")
-    clear_session(session_id)
+    run_frame(session_id, clear_session, session_id)
     return jsonify({"ok": True}), 200
 
 
 @app.route("/analyze-session", methods=["POST"])
+@route_class("cpu")
 def final_interview_analysis_api():
     try:
         data = request.json
@@ -369,28 +537,26 @@ def final_interview_analysis_api():
             return jsonify({"error": "Missing videoUrl or studentId"}), 400
 
         print(f"[PY] Running interview analysis for student={student_id}")
-        return jsonify(analyze_interview(video_url, answers, student_id)), 200
+        return jsonify(analyze_interview(video_url, answers, student_id, run=run_cpu)), 200
 
+    except (ScratchSpaceError, LLMUnavailable):
+        raise
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @app.route("/reset/<session_id>", methods=["POST"])
+@route_class("frame")
 def reset_session_api(session_id):
-    clear_session(session_id)
+    run_frame(session_id, clear_session, session_id)
     return jsonify({"status": "ok"}), 200
 
 
 @app.route("/initial-question/<student_id>", methods=["GET"])
+@route_class("io")
 def initial_question_api(student_id):
     try:
-        client = MongoClient(MONGO_CONN)
-        try:
-            db = client.get_default_database()
-            if db is None:
-                db = client["test"]
-        except:
-            db = client["test"]
+        db = get_db()
 
         course_id_str = request.args.get("courseId")
         if not course_id_str:
@@ -426,31 +592,34 @@ def initial_question_api(student_id):
         Generate the first mock interview question (just the question text).
         """
 
-        res = model.generate_content(prompt)
+        res = generate_content(model, prompt, endpoint="initial-question")
         question = res.text.strip()
 
-        db["interviewsessions"].update_one(
-            {"student": ObjectId(student_id), "course": ObjectId(course_id)},
-            {"$set": {
-                "course": ObjectId(course_id),
-                "questions": [{"index": 0, "question": question}],
-                "answers": [],
-                "skippedQuestions": [],
-                "notAttemptedQuestions": [],
-                "lastGeneratedQuestion": {"index": 0, "question": question},
-                "status": "in-progress",
-            }},
-            upsert=True
-        )
+        start_session(db["interviewsessions"], ObjectId(student_id), course_id, question)
 
         return jsonify({"question": question}), 200
 
+    except LLMUnavailable:
+        raise
     except Exception as e:
         return jsonify({"error": "Failed to generate question"}), 500
 
 
+COURSE_METADATA_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "domain": {"type": "string", "enum": COURSE_DOMAINS},
+        "idealRoles": {"type": "array", "items": {"type": "string"}},
+        "skillsCovered": {"type": "array", "items": {"type": "string"}},
+        "challengesAddressed": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["domain", "idealRoles", "skillsCovered", "challengesAddressed"],
+}
+
+
 # === AI SUGGEST COURSE METADATA ENDPOINT ===
 @app.route("/suggest-course-metadata", methods=["POST"])
+@route_class("io")
 def suggest_course_metadata():
     data = request.json
     title = data.get("title", "").strip()
@@ -472,20 +641,13 @@ def suggest_course_metadata():
     Respond as JSON with keys: domain, idealRoles, skillsCovered, challengesAddressed.
     """
     try:
-        res = model.generate_content(prompt)
-        # Try to parse the response as JSON
-        import json
         try:
-            result = json.loads(res.text)
-        except Exception:
-            # Fallback: try to extract JSON from text
-            import re
-            match = re.search(r'\{.*\}', res.text, re.DOTALL)
-            if match:
-                result = json.loads(match.group(0))
-            else:
-                return jsonify({"error": "AI did not return valid JSON."}), 500
+            result = generate_structured(model, prompt, COURSE_METADATA_SCHEMA, endpoint="suggest-course-metadata")
+        except ValueError:
+            return jsonify({"error": "AI did not return valid JSON."}), 500
         return jsonify(result), 200
+    except LLMUnavailable:
+        raise
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
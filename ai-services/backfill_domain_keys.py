@@ -0,0 +1,69 @@
+import sys
+import json
+import argparse
+from pymongo import UpdateOne
+from utils.db import collection
+from utils.domains import course_domain_key, domain_keys
+
+# Maintains the normalized domain keys used for exact, indexed domain
+# lookups: courses.domainKey and careerassessments.profile_analysis.domainKeys.
+# New courses get domainKey from the Course model hook; run this once after
+# deploying, and again whenever shared/course_domains.json changes.
+
+courses_col = collection("courses")
+assessments_col = collection("careerassessments")
+
+BATCH_SIZE = 500
+
+
+def ensure_indexes():
+    courses_col.create_index("domainKey")
+    assessments_col.create_index("profile_analysis.domainKeys")
+
+
+def _flush(col, ops):
+    if not ops:
+        return 0
+    modified = col.bulk_write(ops, ordered=False).modified_count
+    ops.clear()
+    return modified
+
+
+def backfill_courses(force=False):
+    ops, counts = [], {"scanned": 0, "modified": 0}
+    for course in courses_col.find({}, {"domain": 1, "domainKey": 1}).batch_size(BATCH_SIZE):
+        counts["scanned"] += 1
+        key = course_domain_key(course.get("domain"))
+        if force or course.get("domainKey") != key:
+            ops.append(UpdateOne({"_id": course["_id"]}, {"$set": {"domainKey": key}}))
+        if len(ops) >= BATCH_SIZE:
+            counts["modified"] += _flush(courses_col, ops)
+    counts["modified"] += _flush(courses_col, ops)
+    return counts
+
+
+def backfill_assessments(force=False):
+    ops, counts = [], {"scanned": 0, "modified": 0}
+    query = {"profile_analysis.domain": {"$exists": True}}
+    for doc in assessments_col.find(query, {"profile_analysis.domain": 1, "profile_analysis.domainKeys": 1}).batch_size(BATCH_SIZE):
+        counts["scanned"] += 1
+        keys = domain_keys(doc["profile_analysis"].get("domain"))
+        if force or doc["profile_analysis"].get("domainKeys") != keys:
+            ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"profile_analysis.domainKeys": keys}}))
+        if len(ops) >= BATCH_SIZE:
+            counts["modified"] += _flush(assessments_col, ops)
+    counts["modified"] += _flush(assessments_col, ops)
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill normalized domain keys and their indexes.")
+    parser.add_argument("--force", action="store_true", help="Rewrite keys even if unchanged")
+    args = parser.parse_args()
+
+    print("📤 Backfilling domain keys...", file=sys.stderr)
+    ensure_indexes()
+    print(json.dumps({
+        "courses": backfill_courses(force=args.force),
+        "assessments": backfill_assessments(force=args.force),
+    }))
@@ -0,0 +1,188 @@
+"""
+Recommendation scoring benchmark: the original per-call compute_score loop
+versus the precomputed course feature index (full scan), inverted-index
+top-k retrieval with the substring matcher (checked to give identical
+results) and with the semantic matcher, on a synthetic catalog.
+
+    python benchmarks/bench_course_index.py --sizes 1000 10000 50000
+
+Runs without MongoDB or Gemini; the index is built from in-memory documents.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from course_index import CourseIndex, TagFeatures, score_features  # noqa: E402
+
+DOMAINS = ["Technology and Innovation", "Healthcare and Wellness", "Business and Finance",
+           "Creative Arts and Design", "Education and Social Services"]
+LEVELS = ["Beginner", "Intermediate", "Proficient"]
+ROLES = ["Frontend Developer", "Backend Developer", "Data Analyst", "Nurse", "Counselor",
+         "Financial Analyst", "UX Designer", "Teacher", "Product Manager", "ML Engineer"]
+SKILLS = ["Python", "JavaScript", "HTML", "CSS", "React", "SQL", "Excel", "Statistics",
+          "Figma", "Communication", "Leadership", "Anatomy", "Accounting", "Machine Learning",
+          "Node.js", "Docker", "Public Speaking", "Research", "Pandas", "Git"]
+
+
+def _pseudo_words(count, seed):
+    """Distinct made-up words, standing in for a real catalog's long tail."""
+    rng = random.Random(seed)
+    syllables = ["ka", "lo", "mi", "ser", "tan", "vu", "dex", "ro", "pli", "gan", "zo", "fen", "tri", "qua", "mor"]
+    words = set()
+    while len(words) < count:
+        words.add("".join(rng.choice(syllables) for _ in range(rng.randint(2, 4))).capitalize())
+    return sorted(words)
+
+
+ROLES += [f"{word} Specialist" for word in _pseudo_words(200, 1)]
+SKILLS += _pseudo_words(400, 2)
+CHALLENGES = ["Confidence", "Field exposure", "Syntax errors", "Lack of experience",
+              "Time management", "Networking", "Interview anxiety"]
+CHALLENGES += [f"{word} gaps" for word in _pseudo_words(100, 3)]
+
+
+def legacy_compute_score(course, tags):
+    """The scorer as it was before the index, kept here as the reference."""
+    score = 0
+    breakdown = {}
+    domain_score = 0
+    if course.get("domain", "").lower() == tags.get("domain", "").lower():
+        domain_score = 2
+    elif tags.get("domain", "").lower() in course.get("domain", "").lower() or course.get("domain", "").lower() in tags.get("domain", "").lower():
+        domain_score = 1
+    score += domain_score
+    breakdown["domain"] = domain_score
+    level_score = 2 if course.get("level", "").lower() == tags.get("level", "").lower() else 0
+    score += level_score
+    breakdown["level"] = level_score
+    role_score = 0
+    for role in course.get("idealRoles", []):
+        if tags.get("desiredRole", "").lower() in role.lower():
+            role_score = 2
+            break
+        elif tags.get("desiredRole", "").split(" ")[0] in role.lower():
+            role_score = 1
+    score += role_score
+    breakdown["role"] = role_score
+    skill_score = 0
+    for skill in tags.get("skills", []):
+        for course_skill in course.get("skillsCovered", []):
+            if skill.lower() in course_skill.lower():
+                skill_score += 1
+                break
+    skill_score = min(skill_score, 3)
+    score += skill_score
+    breakdown["skills"] = skill_score
+    challenge_score = 0
+    for challenge in tags.get("challenges", []):
+        for course_challenge in course.get("challengesAddressed", []):
+            if challenge.lower() in course_challenge.lower():
+                challenge_score += 1
+                break
+    challenge_score = min(challenge_score, 2)
+    score += challenge_score
+    breakdown["challenges"] = challenge_score
+    if score >= 7:
+        label = "Highly Recommended"
+    elif score >= 4:
+        label = "Recommended"
+    else:
+        label = "Useful"
+    return int(score), label, breakdown
+
+
+def legacy_top(courses, tags, k, min_score=3, fallback=5):
+    """Reference selection: score everything, filter, full sort, then cut."""
+    scored = [(c["_id"], *legacy_compute_score(c, tags)[:1]) for c in courses]
+    kept = [e for e in scored if e[1] >= min_score]
+    if not kept:
+        return sorted(scored, key=lambda e: -e[1])[:fallback]
+    return sorted(kept, key=lambda e: -e[1])[:k]
+
+
+def synthetic_course(rng, i):
+    return {
+        "_id": i,
+        "title": f"Course {i}",
+        "domain": rng.choice(DOMAINS),
+        "level": rng.choice(LEVELS),
+        "idealRoles": rng.sample(ROLES, rng.randint(0, 3)),
+        "skillsCovered": [s if rng.random() < 0.7 else f"Intro to {s}" for s in rng.sample(SKILLS, rng.randint(0, 8))],
+        "challengesAddressed": rng.sample(CHALLENGES, rng.randint(0, 3)),
+    }
+
+
+def synthetic_tags(rng):
+    return {
+        "domain": rng.choice(DOMAINS + ["Technology", "Agriculture"]),
+        "level": rng.choice(LEVELS),
+        "desiredRole": rng.choice(ROLES),
+        "skills": rng.sample(SKILLS, 3) + [s.lower() for s in rng.sample(SKILLS, 2)],
+        "challenges": rng.sample(CHALLENGES, 2),
+    }
+
+
+def run(size, queries, seed, k):
+    rng = random.Random(seed)
+    courses = [synthetic_course(rng, i) for i in range(size)]
+    profiles = [synthetic_tags(rng) for _ in range(queries)]
+
+    started = time.perf_counter()
+    index = CourseIndex(courses, matcher="substring")
+    build = time.perf_counter() - started
+
+    started = time.perf_counter()
+    semantic = CourseIndex(courses, matcher="semantic")
+    semantic_build = time.perf_counter() - started
+
+    started = time.perf_counter()
+    legacy = [[legacy_compute_score(c, tags) for c in courses] for tags in profiles]
+    legacy_time = (time.perf_counter() - started) / queries
+
+    started = time.perf_counter()
+    indexed = []
+    for tags in profiles:
+        tf = TagFeatures(tags)
+        indexed.append([score_features(f, tf) for f in index.features])
+    indexed_time = (time.perf_counter() - started) / queries
+
+    if legacy != indexed:
+        raise SystemExit(f"Score mismatch at size {size}")
+
+    started = time.perf_counter()
+    top = [index.top_k(tags, k) for tags in profiles]
+    top_time = (time.perf_counter() - started) / queries
+
+    started = time.perf_counter()
+    for tags in profiles:
+        semantic.top_k(tags, k)
+    semantic_time = (time.perf_counter() - started) / queries
+
+    expected = [legacy_top(courses, tags, k) for tags in profiles]
+    if [[(f.id, s) for f, s, *_ in t] for t in top] != expected:
+        raise SystemExit(f"Top-{k} mismatch at size {size}")
+
+    print(f"{size:>8} {build * 1000:>10.1f} {semantic_build * 1000:>10.1f} {legacy_time * 1000:>12.2f} "
+          f"{indexed_time * 1000:>12.2f} {top_time * 1000:>12.2f} {semantic_time * 1000:>12.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--queries", type=int, default=20, help="student profiles scored per size")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--top-k", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'courses':>8} {'build ms':>10} {'sem build':>10} {'legacy ms/q':>12} "
+          f"{'scan ms/q':>12} {'top-k ms/q':>12} {'sem ms/q':>12}")
+    for size in args.sizes:
+        run(size, args.queries, args.seed, args.top_k)
+
+
+if __name__ == "__main__":
+    main()
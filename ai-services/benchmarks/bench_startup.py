@@ -0,0 +1,114 @@
+"""
+Worker startup benchmark: wall time and peak RSS of importing the service
+modules (and the heavy libraries behind them) in a fresh interpreter, plus
+the load time of each lazily loaded model.
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --repeat 5 --models whisper face_live
+
+Every measurement runs in its own subprocess, so nothing is cached between
+rows. Modules whose dependencies are not installed are reported, not fatal.
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+import statistics
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SERVICE_DIR = os.path.dirname(HERE)
+
+SERVICE_MODULES = [
+    "app",
+    "student_chatbot",
+    "recommend",
+    "live_cheating_detector",
+    "interview_analysis",
+    "career_video_analysis",
+]
+LIBRARIES = ["cv2", "mediapipe", "moviepy.editor", "whisper", "google.generativeai", "pymongo"]
+
+_IMPORT_PROBE = """
+import sys, time, json, resource
+sys.path.insert(0, {service_dir!r})
+t = time.perf_counter()
+try:
+    import {module}
+    error = None
+except Exception as e:
+    error = f"{{type(e).__name__}}: {{e}}"
+seconds = time.perf_counter() - t
+loaded = sorted(m for m in ("cv2", "mediapipe", "whisper", "torch", "moviepy") if m in sys.modules)
+print(json.dumps({{"seconds": seconds, "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+                  "heavy": loaded, "error": error}}))
+"""
+
+_MODEL_PROBE = """
+import sys, json, resource
+sys.path.insert(0, {service_dir!r})
+from utils import model_registry
+try:
+    model_registry.get({model!r})
+    error = None
+except Exception as e:
+    error = f"{{type(e).__name__}}: {{e}}"
+info = model_registry.states()["models"][{model!r}]
+print(json.dumps({{"seconds": info["load_seconds"] or 0.0,
+                  "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+                  "heavy": [], "error": error}}))
+"""
+
+
+def _probe(code):
+    env = {**os.environ, "LLM_SUMMARY_INTERVAL": "0"}
+    out = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, cwd=SERVICE_DIR, env=env
+    )
+    lines = [line for line in out.stdout.splitlines() if line.startswith("{")]
+    if not lines:
+        return {"seconds": 0.0, "rss_mb": 0.0, "heavy": [], "error": (out.stderr.strip().splitlines() or ["no output"])[-1]}
+    return json.loads(lines[-1])
+
+
+def measure(code, repeat):
+    runs = [_probe(code) for _ in range(repeat)]
+    return {
+        "seconds": round(statistics.median(r["seconds"] for r in runs), 3),
+        "rss_mb": round(max(r["rss_mb"] for r in runs), 1),
+        "heavy": runs[-1]["heavy"],
+        "error": runs[-1]["error"],
+    }
+
+
+def main():
+    from utils.model_registry import _REGISTRY
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per row (median time reported)")
+    parser.add_argument("--modules", nargs="*", default=SERVICE_MODULES + LIBRARIES)
+    parser.add_argument("--models", nargs="*", default=list(_REGISTRY))
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    rows = []
+    for module in args.modules:
+        code = _IMPORT_PROBE.format(service_dir=SERVICE_DIR, module=module)
+        rows.append({"kind": "import", "name": module, **measure(code, args.repeat)})
+    for model in args.models:
+        code = _MODEL_PROBE.format(service_dir=SERVICE_DIR, model=model)
+        rows.append({"kind": "model", "name": model, **measure(code, args.repeat)})
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+
+    print(f"{'kind':<7} {'name':<24} {'seconds':>8} {'peak MB':>8}  heavy modules loaded / error")
+    for r in rows:
+        detail = r["error"] or ", ".join(r["heavy"]) or "-"
+        print(f"{r['kind']:<7} {r['name']:<24} {r['seconds']:>8} {r['rss_mb']:>8}  {detail}")
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, SERVICE_DIR)
+    main()
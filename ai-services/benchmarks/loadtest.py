@@ -0,0 +1,268 @@
+"""
+Offline load test for the AI service. Boots app.py in-process against an
+in-memory Mongo (mongomock) and a fake Gemini model, then drives a weighted
+mix of routes from concurrent virtual users and reports throughput and
+latency percentiles per route.
+
+    pip install -r benchmarks/requirements.txt
+    python benchmarks/loadtest.py --users 16 --duration 30 \\
+        --mix recommend=3,generate=3,check-frame=5,score-quiz=2,score-quiz-batch=1,next-question=2 \\
+        --llm-latency 0.8 --llm-failure-rate 0.02
+
+No network access is needed; Cloudinary, Atlas and Gemini are never called.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SERVICE_DIR = os.path.dirname(HERE)
+sys.path.insert(0, SERVICE_DIR)
+sys.path.insert(0, HERE)
+
+# Quiet background reporters; the harness prints its own summary
+os.environ.setdefault("LLM_SUMMARY_INTERVAL", "0")
+os.environ.setdefault("GEMINI_API_KEY", "loadtest")
+
+DEFAULT_MIX = "recommend=3,generate=3,check-frame=5,score-quiz=2,score-quiz-batch=1,next-question=2"
+
+
+# =========================
+#  REQUESTS
+# =========================
+def _frame_bytes(rng):
+    import cv2
+    import numpy as np
+
+    frame = np.full((480, 640, 3), rng.randint(60, 200), dtype=np.uint8)
+    frame += np.random.default_rng(rng.randint(0, 1 << 30)).integers(0, 20, frame.shape, dtype=np.uint8)
+    ok, buf = cv2.imencode(".jpg", frame)
+    return buf.tobytes()
+
+
+class Scenario:
+    """Builds one request per route from the seeded ids."""
+
+    def __init__(self, course_ids, user_ids, refresh_ratio, seed, routes=None):
+        self.course_ids = course_ids
+        self.user_ids = user_ids
+        self.refresh_ratio = refresh_ratio
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        # Encoding frames needs opencv; only pay for it when frames are sent
+        self._frames = []
+        if routes is None or "check-frame" in routes:
+            self._frames = [_frame_bytes(random.Random(seed + i)) for i in range(4)]
+
+    def _pick(self, seq):
+        with self._lock:
+            return self._rng.choice(seq)
+
+    def _chance(self, p):
+        with self._lock:
+            return self._rng.random() < p
+
+    def recommend(self, client):
+        return client.post("/recommend", json={
+            "student_id": self._pick(self.user_ids),
+            "refresh": self._chance(self.refresh_ratio),
+        })
+
+    def generate(self, client):
+        return client.post("/generate", json={
+            "userId": self._pick(self.user_ids),
+            "courseId": self._pick(self.course_ids),
+            "message": "Can you explain the main idea of this week's lesson?",
+            "newConversation": self._chance(0.2),
+        })
+
+    def check_frame(self, client):
+        from io import BytesIO
+
+        return client.post("/check-frame", data={
+            "frame": (BytesIO(self._pick(self._frames)), "frame.jpg"),
+            "sessionId": f"load-{self._pick(self.user_ids)}",
+        }, content_type="multipart/form-data")
+
+    # Same shape as generate_quiz output: MCQs plus a free-text question
+    QUIZ = [
+        {"type": "mcq", "question": f"Question {i}?", "options": ["A", "B", "C", "D"], "correctAnswer": "A"}
+        for i in range(3)
+    ] + [{"type": "text", "question": "Why does it matter?", "correctAnswer": "Because it scales."}]
+
+    def _answers(self):
+        return [self._pick("AB"), self._pick("AB"), "A", self._pick(["Because it scales.", "It is faster."])]
+
+    def score_quiz(self, client):
+        return client.post("/score-quiz", json={
+            "originalQuestions": self.QUIZ,
+            "studentAnswers": self._answers(),
+        })
+
+    def score_quiz_batch(self, client):
+        # Exact matches and wrong MCQ options are graded without Gemini
+        return client.post("/score-quiz/batch", json={"submissions": [
+            {"studentId": self._pick(self.user_ids), "originalQuestions": self.QUIZ, "studentAnswers": self._answers()}
+            for _ in range(8)
+        ]})
+
+    def next_question(self, client):
+        return client.post("/generate-next-question", json={
+            "previousAnswer": "I would start by profiling the slow query.",
+            "studentId": self._pick(self.user_ids),
+            "courseId": self._pick(self.course_ids),
+            "proficiency": "Intermediate",
+        })
+
+
+ROUTES = {
+    "recommend": Scenario.recommend,
+    "generate": Scenario.generate,
+    "check-frame": Scenario.check_frame,
+    "score-quiz": Scenario.score_quiz,
+    "score-quiz-batch": Scenario.score_quiz_batch,
+    "next-question": Scenario.next_question,
+}
+
+
+# =========================
+#  RESULTS
+# =========================
+class Results:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}
+        self.statuses = {}
+
+    def record(self, route, latency, status):
+        with self._lock:
+            self.latencies.setdefault(route, []).append(latency)
+            codes = self.statuses.setdefault(route, {})
+            codes[status] = codes.get(status, 0) + 1
+
+    def report(self, elapsed):
+        rows = []
+        for route, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            codes = self.statuses[route]
+            errors = sum(n for code, n in codes.items() if not (isinstance(code, int) and code < 500))
+            rows.append({
+                "route": route,
+                "requests": len(values),
+                "errors": errors,
+                "rps": round(len(values) / elapsed, 2),
+                "p50_ms": round(_percentile(values, 50) * 1000, 1),
+                "p95_ms": round(_percentile(values, 95) * 1000, 1),
+                "p99_ms": round(_percentile(values, 99) * 1000, 1),
+                "max_ms": round(values[-1] * 1000, 1),
+                "statuses": {str(k): v for k, v in sorted(codes.items(), key=lambda kv: str(kv[0]))},
+            })
+        return rows
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def _parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ROUTES:
+            raise SystemExit(f"Unknown route in --mix: {name} (known: {', '.join(ROUTES)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+# =========================
+#  DRIVER
+# =========================
+def run(args):
+    # The app prints as it works ([RECO] lines, prompt dumps); keep stdout
+    # for the report so --json output stays parseable
+    with contextlib.redirect_stdout(sys.stderr):
+        rows, elapsed = _drive(args)
+    if args.json:
+        print(json.dumps({"elapsed": round(elapsed, 2), "routes": rows}, indent=2))
+        return
+
+    total = sum(r["requests"] for r in rows)
+    print(f"{'route':<16} {'reqs':>7} {'err':>5} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for r in rows:
+        print(f"{r['route']:<16} {r['requests']:>7} {r['errors']:>5} {r['rps']:>8} "
+              f"{r['p50_ms']:>9} {r['p95_ms']:>9} {r['p99_ms']:>9} {r['max_ms']:>9}")
+    print(f"{'total':<16} {total:>7} {'':>5} {round(total / elapsed, 2):>8}")
+
+
+def _drive(args):
+    import loadtest_fakes
+
+    os.chdir(SERVICE_DIR)  # app.py resolves ../server/.env relative to cwd
+    client = loadtest_fakes.install(args.llm_latency, args.llm_jitter, args.llm_failure_rate)
+    course_ids, user_ids = loadtest_fakes.seed(client, args.courses, args.students, args.seed)
+
+    started = time.perf_counter()
+    from app import app
+    print(f"[LOAD] App imported in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    mix = _parse_mix(args.mix)
+    names, weights = list(mix), list(mix.values())
+    scenario = Scenario(course_ids, user_ids, args.refresh_ratio, args.seed, routes=names)
+    results = Results()
+    deadline = time.monotonic() + args.duration
+
+    def user(n):
+        rng = random.Random(args.seed * 1000 + n)
+        http = app.test_client()
+        while time.monotonic() < deadline:
+            route = rng.choices(names, weights)[0]
+            t0 = time.perf_counter()
+            try:
+                status = ROUTES[route](scenario, http).status_code
+            except Exception as e:
+                status = type(e).__name__
+            results.record(route, time.perf_counter() - t0, status)
+            if args.think_time:
+                time.sleep(rng.expovariate(1 / args.think_time))
+
+    print(f"[LOAD] {args.users} users for {args.duration}s, mix {mix}, "
+          f"LLM {args.llm_latency}s ±{args.llm_jitter} fail={args.llm_failure_rate}", file=sys.stderr)
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.users) as pool:
+        list(pool.map(user, range(args.users)))
+    elapsed = time.perf_counter() - t0
+
+    return results.report(elapsed), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=8, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=20, help="seconds to run")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="route=weight pairs")
+    parser.add_argument("--think-time", type=float, default=0.0, help="mean pause between a user's requests (s)")
+    parser.add_argument("--refresh-ratio", type=float, default=0.3, help="share of /recommend calls with refresh")
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="mean fake Gemini latency (s)")
+    parser.add_argument("--llm-jitter", type=float, default=0.5, help="lognormal sigma of the latency")
+    parser.add_argument("--llm-failure-rate", type=float, default=0.0, help="share of Gemini calls that fail")
+    parser.add_argument("--courses", type=int, default=200)
+    parser.add_argument("--students", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
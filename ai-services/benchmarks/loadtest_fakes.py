@@ -0,0 +1,163 @@
+"""
+Stand-ins for the external services used by benchmarks/loadtest.py:
+an in-process Mongo (mongomock) and a fake Gemini model with configurable
+latency and failure injection. install() must run before app is imported.
+"""
+import json
+import time
+import random
+import itertools
+import threading
+from types import SimpleNamespace
+
+import mongomock
+from bson import ObjectId
+
+_counter = itertools.count(1)
+
+
+class LLMSettings:
+    latency = 0.8          # mean seconds per call
+    jitter = 0.5           # lognormal sigma
+    failure_rate = 0.0     # fraction of calls raising ServiceUnavailable
+    seed = 7
+
+
+_rng = random.Random(LLMSettings.seed)
+_rng_lock = threading.Lock()
+
+
+def _sample_latency():
+    with _rng_lock:
+        if LLMSettings.latency <= 0:
+            return 0.0
+        return _rng.lognormvariate(0, LLMSettings.jitter) * LLMSettings.latency
+
+
+def _should_fail():
+    with _rng_lock:
+        return _rng.random() < LLMSettings.failure_rate
+
+
+def _sample(schema, name="value"):
+    """A value matching a Gemini-style (upper-case type) response schema."""
+    kind = (schema.get("type") or "STRING").upper()
+    if kind == "OBJECT":
+        return {k: _sample(v, k) for k, v in schema.get("properties", {}).items()}
+    if kind == "ARRAY":
+        return [_sample(schema.get("items", {"type": "STRING"}), name) for _ in range(3)]
+    if kind == "INTEGER":
+        return 7
+    if kind == "NUMBER":
+        return 7.0
+    if kind == "BOOLEAN":
+        return True
+    if schema.get("enum"):
+        return schema["enum"][0]
+    # Unique text, so duplicate checks (e.g. interview questions) never stall
+    return f"Sample {name} {next(_counter)}?"
+
+
+class FakeGenerativeModel:
+    """Drop-in for google.generativeai.GenerativeModel."""
+
+    def __init__(self, model_name="fake", *args, **kwargs):
+        self.model_name = model_name
+
+    def generate_content(self, prompt, generation_config=None, **kwargs):
+        from google.api_core import exceptions
+
+        time.sleep(_sample_latency())
+        if _should_fail():
+            raise exceptions.ServiceUnavailable("injected failure")
+
+        config = generation_config or {}
+        schema = config.get("response_schema") if isinstance(config, dict) else None
+        if schema:
+            text = json.dumps(_sample(schema))
+        else:
+            text = f"Sample answer {next(_counter)}: what would you do next?"
+
+        prompt_chars = len(prompt) if isinstance(prompt, str) else len(str(prompt))
+        return SimpleNamespace(
+            text=text,
+            usage_metadata=SimpleNamespace(
+                prompt_token_count=prompt_chars // 4,
+                candidates_token_count=len(text) // 4,
+            ),
+        )
+
+
+def install(latency=None, jitter=None, failure_rate=None):
+    """Patch Gemini and MongoClient. Call before importing app."""
+    import google.generativeai as genai
+    import utils.db
+
+    if latency is not None:
+        LLMSettings.latency = latency
+    if jitter is not None:
+        LLMSettings.jitter = jitter
+    if failure_rate is not None:
+        LLMSettings.failure_rate = failure_rate
+
+    genai.configure = lambda *args, **kwargs: None
+    genai.GenerativeModel = FakeGenerativeModel
+
+    shared = mongomock.MongoClient()
+    utils.db.MongoClient = lambda *args, **kwargs: shared
+    return shared
+
+
+# =========================
+#  SEED DATA
+# =========================
+DOMAINS = ["Technology and Innovation", "Healthcare and Wellness", "Business and Finance"]
+LEVELS = ["Beginner", "Intermediate", "Proficient"]
+SKILLS = ["Python", "JavaScript", "SQL", "React", "Statistics", "Communication", "Excel", "Anatomy"]
+ROLES = ["Frontend Developer", "Data Analyst", "Nurse", "Financial Analyst"]
+
+
+def _course(rng):
+    return {
+        "_id": ObjectId(),
+        "title": f"Course {next(_counter)}",
+        "description": "Synthetic course for load testing.",
+        "domain": rng.choice(DOMAINS),
+        "level": rng.choice(LEVELS),
+        "idealRoles": rng.sample(ROLES, 2),
+        "skillsCovered": rng.sample(SKILLS, 4),
+        "challengesAddressed": ["Confidence", "Lack of experience"],
+        "weeks": [{
+            "weekNumber": w + 1,
+            "modules": [{
+                "title": f"Module {w + 1}",
+                "lessons": [{"title": f"Lesson {w + 1}.{l + 1}", "videoUrl": "https://example.invalid"} for l in range(3)],
+            }],
+        } for w in range(4)],
+    }
+
+
+def seed(client, courses=200, students=100, seed=7):
+    """Courses, students and analysed assessments in every database the app reads."""
+    rng = random.Random(seed)
+    course_docs = [_course(rng) for _ in range(courses)]
+    user_ids = [ObjectId() for _ in range(students)]
+
+    for db in (client.get_database("test"), client.get_database("auth_db")):
+        db.courses.insert_many([dict(c) for c in course_docs])
+        db.students.insert_many([{"user": u, "name": f"Student {i}"} for i, u in enumerate(user_ids)])
+        db.careerassessments.insert_many([{
+            "userId": u,
+            "domain": rng.choice(DOMAINS),
+            "answers": [{"questionNumber": n, "answer": "x"} for n in range(1, 11)],
+            "profile_analysis": {
+                "domain": rng.choice(DOMAINS),
+                "level": rng.choice(LEVELS),
+                "skills": rng.sample(SKILLS, 3),
+                "desiredRole": rng.choice(ROLES),
+                "challenges": ["Confidence"],
+            },
+            "corrected_level": rng.choice(LEVELS),
+        } for u in user_ids])
+
+    return [str(c["_id"]) for c in course_docs], [str(u) for u in user_ids]
@@ -1,14 +1,15 @@
 import os
-import requests
-import cloudinary
-import cloudinary.uploader
-import moviepy.editor as mp
-import whisper
-import cv2
-import mediapipe as mp_face
 import google.generativeai as genai
-import uuid
 from dotenv import load_dotenv
+from utils.llm_governor import LLMUnavailable
+from utils.structured_output import generate_structured
+from utils import model_registry, media_cache
+from utils.model_registry import LazyModule
+from utils.scratch import job_dir
+
+# Loaded on first use, so importing this module stays cheap
+cv2 = LazyModule("cv2")
+mp_face = LazyModule("mediapipe")
 
 
 # Use environment variables to set ffmpeg path
@@ -19,29 +20,32 @@ os.environ["PATH"] += os.pathsep + r"C:\ffmpeg\ffmpeg-build\bin"
 # Load environment variables
 load_dotenv("../server/.env")
 
-# Configure Cloudinary
-cloudinary.config(
-    cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
-    api_key=os.getenv("CLOUDINARY_API_KEY"),
-    api_secret=os.getenv("CLOUDINARY_API_SECRET")
-)
-
 # Configure Gemini
 genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
 gemini_model = genai.GenerativeModel("gemini-2.5-flash")
 
-def download_video(cloud_url, save_path):
-    response = requests.get(cloud_url)
-    with open(save_path, 'wb') as f:
-        f.write(response.content)
+VIDEO_FEEDBACK_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "confidence_score": {"type": "integer"},
+        "communication_clarity": {"type": "integer"},
+        "tone": {"type": "string", "enum": ["confident", "hesitant", "passionate", "unsure", "neutral"]},
+        "keywords": {"type": "array", "items": {"type": "string"}},
+        "corrected_level": {"type": "string", "enum": ["Beginner", "Intermediate", "Proficient"]},
+    },
+    "required": ["confidence_score", "communication_clarity", "tone", "keywords", "corrected_level"],
+}
+
+def download_video(cloud_url, save_path, max_bytes=None):
+    return media_cache.fetch(cloud_url, save_path, max_bytes=max_bytes)
 
 def extract_audio(video_path, audio_path):
+    mp = model_registry.get("moviepy")
     with mp.VideoFileClip(video_path) as clip:
         clip.audio.write_audiofile(audio_path)
 
 def transcribe_audio(audio_path):
-    model = whisper.load_model("base")
-    result = model.transcribe(audio_path)
+    result = model_registry.transcribe(audio_path)
     return result["text"]
 
 def analyze_transcript(text):
@@ -60,15 +64,9 @@ def analyze_transcript(text):
     Return ONLY the JSON.
     """
     try:
-        response = gemini_model.generate_content(prompt)
-        # Attempt to extract JSON if Gemini wraps it in markdown blocks
-        import re
-        import json
-        text_resp = response.text.strip()
-        match = re.search(r'\{.*\}', text_resp, re.DOTALL)
-        if match:
-            return json.loads(match.group(0))
-        return json.loads(text_resp)
+        return generate_structured(gemini_model, prompt, VIDEO_FEEDBACK_SCHEMA, endpoint="career-video")
+    except LLMUnavailable:
+        raise
     except Exception as e:
         print(f"Gemini error: {e}")
         return {
@@ -104,27 +102,32 @@ def analyze_face_patterns(video_path):
 
     return round((face_visible_frames / total_frames) * 100, 2) if total_frames else 0.0
 
-def analyze_career_video(cloud_url):
-    unique_id = uuid.uuid4().hex
-    local_video = f"temp_video_{unique_id}.mp4"
-    local_audio = f"temp_audio_{unique_id}.wav"
+def extract_video_features(cloud_url):
+    """
+    The CPU-heavy part of the analysis: download, transcribe and scan the
+    video for a face. Makes no LLM calls, so it can run in a worker process.
+    """
+    with job_dir("career") as job:
+        local_video = job.file("video.mp4")
+        local_audio = job.file("audio.wav")
 
-    try:
-        download_video(cloud_url, local_video)
+        download_video(cloud_url, local_video, max_bytes=job.remaining())
         extract_audio(local_video, local_audio)
-        transcript = transcribe_audio(local_audio)
-        ai_feedback = analyze_transcript(transcript)
-        eye_contact_percent = analyze_face_patterns(local_video)
-
+        job.check_quota()
         return {
-            "transcript": transcript,
-            "eye_contact_percent": eye_contact_percent,
-            **ai_feedback
+            "transcript": transcribe_audio(local_audio),
+            "eye_contact_percent": analyze_face_patterns(local_video),
         }
 
-    finally:    
-        # Always delete temp files if they exist
-        if os.path.exists(local_video):
-            os.remove(local_video)
-        if os.path.exists(local_audio):
-            os.remove(local_audio)
\ No newline at end of file
+def analyze_career_video(cloud_url, run=None):
+    """
+    `run(fn, *args)` executes the media step (e.g. dispatcher.run_cpu); the
+    Gemini step always runs in the calling process, under its LLM limits.
+    """
+    features = run(extract_video_features, cloud_url) if run else extract_video_features(cloud_url)
+    ai_feedback = analyze_transcript(features["transcript"])
+
+    return {
+        **features,
+        **ai_feedback
+    }
@@ -0,0 +1,391 @@
+import os
+import time
+import heapq
+import threading
+from collections import OrderedDict
+from utils.domains import course_domain_key
+
+# Fields the recommendation scorer reads from a course document.
+SCORING_PROJECTION = {
+    "title": 1,
+    "domain": 1,
+    "domainKey": 1,
+    "level": 1,
+    "idealRoles": 1,
+    "skillsCovered": 1,
+    "challengesAddressed": 1,
+    "updatedAt": 1,
+}
+
+# How often (seconds) the cached index checks whether the catalog changed.
+COURSE_INDEX_CHECK_SEC = float(os.getenv("COURSE_INDEX_CHECK_SEC", 30))
+
+# Upper bound on stored recommendations per student.
+RECOMMEND_TOP_K = int(os.getenv("RECOMMEND_TOP_K", 20))
+
+# Distinct query terms whose posting lists are cached per index.
+COURSE_INDEX_TERM_CACHE = int(os.getenv("COURSE_INDEX_TERM_CACHE", 4096))
+
+# How role/skill/challenge terms match course values: "semantic" (fuzzy,
+# alias-aware, word-boundary) or "substring" (the original rules).
+RECOMMEND_MATCHER = os.getenv("RECOMMEND_MATCHER", "semantic")
+SEMANTIC_FIELDS = ("roles", "skills", "challenges")
+
+# Joins list fields into one searchable string. It never appears in course
+# text, so a substring match on the blob is a match inside a single entry.
+_SEP = "\x00"
+
+
+def _lower_list(values):
+    return [str(v).lower() for v in (values or []) if v is not None]
+
+
+class CourseFeatures:
+    """Normalized, precomputed view of one course for scoring."""
+
+    __slots__ = (
+        "id", "domain", "domain_key", "level", "roles", "roles_blob", "has_roles",
+        "skills", "skills_blob", "challenges", "challenges_blob",
+    )
+
+    def __init__(self, course):
+        self.id = course.get("_id")
+        self.domain = (course.get("domain") or "").lower()
+        self.domain_key = course.get("domainKey") or course_domain_key(course.get("domain"))
+        self.level = (course.get("level") or "").lower()
+
+        roles = _lower_list(course.get("idealRoles"))
+        self.roles = frozenset(roles)
+        self.has_roles = bool(roles)
+        self.roles_blob = _SEP.join(roles)
+
+        skills = _lower_list(course.get("skillsCovered"))
+        self.skills = frozenset(skills)
+        self.skills_blob = _SEP.join(skills)
+
+        challenges = _lower_list(course.get("challengesAddressed"))
+        self.challenges = frozenset(challenges)
+        self.challenges_blob = _SEP.join(challenges)
+
+
+class TagFeatures:
+    """Normalized student profile tags, computed once per request."""
+
+    __slots__ = ("domain", "level", "role", "role_first_word", "skills", "challenges")
+
+    def __init__(self, tags):
+        self.domain = (tags.get("domain") or "").lower()
+        self.level = (tags.get("level") or "").lower()
+        role = tags.get("desiredRole") or ""
+        self.role = role.lower()
+        # Matches the original scorer, which compared the first word as-is.
+        self.role_first_word = role.split(" ")[0]
+        self.skills = _lower_list(tags.get("skills"))
+        self.challenges = _lower_list(tags.get("challenges"))
+
+
+def _count_hits(terms, exact, blob, cap):
+    if not blob:
+        return 0
+    hits = 0
+    for term in terms:
+        # Exact entry match is a set lookup; otherwise fall back to a single
+        # substring check against all entries at once.
+        if term in exact or term in blob:
+            hits += 1
+            if hits >= cap:
+                break
+    return hits
+
+
+def score_features(cf, tf):
+    """
+    Same scoring rules as recommend.compute_score, on precomputed features.
+    Returns: (score, label, breakdown_dict)
+    """
+    # Domain match (exact: 2, partial: 1)
+    if cf.domain == tf.domain:
+        domain_score = 2
+    elif tf.domain in cf.domain or cf.domain in tf.domain:
+        domain_score = 1
+    else:
+        domain_score = 0
+
+    # Level match (exact: 2)
+    level_score = 2 if cf.level == tf.level else 0
+
+    # Role relevance (exact: 2, partial: 1)
+    role_score = 0
+    if cf.has_roles:
+        if tf.role in cf.roles_blob:
+            role_score = 2
+        elif tf.role_first_word in cf.roles_blob:
+            role_score = 1
+
+    # Skill overlap (1 per overlap, max 3) and challenge relevance (max 2)
+    skill_score = _count_hits(tf.skills, cf.skills, cf.skills_blob, 3)
+    challenge_score = _count_hits(tf.challenges, cf.challenges, cf.challenges_blob, 2)
+
+    return _result(domain_score, level_score, role_score, skill_score, challenge_score)
+
+
+def _result(domain_score, level_score, role_score, skill_score, challenge_score):
+    score = domain_score + level_score + role_score + skill_score + challenge_score
+    breakdown = {
+        "domain": domain_score,
+        "level": level_score,
+        "role": role_score,
+        "skills": skill_score,
+        "challenges": challenge_score,
+    }
+
+    # Label assignment
+    if score >= 7:
+        label = "Highly Recommended"
+    elif score >= 4:
+        label = "Recommended"
+    else:
+        label = "Useful"
+
+    return int(score), label, breakdown
+
+
+class CourseIndex:
+    """
+    Course features plus inverted indexes from field values to catalog
+    positions. A query term is resolved against the distinct values of a
+    field - a much smaller set than the catalog - and the result is cached.
+
+    matcher="substring" resolves terms with the original substring rules,
+    so scores equal compute_score. matcher="semantic" resolves role, skill
+    and challenge terms with utils.semantic_matcher instead (aliases,
+    fuzzy n-gram similarity, whole-word containment), one vectorized query
+    per student.
+    """
+
+    def __init__(self, courses, version=None, matcher=None):
+        self.features = [CourseFeatures(c) for c in courses]
+        self.by_id = {f.id: f for f in self.features}
+        self.version = version
+        self.matcher = matcher or RECOMMEND_MATCHER
+        self.built_at = time.time()
+
+        self._postings = {"domain": {}, "level": {}, "roles": {}, "skills": {}, "challenges": {}}
+        for pos, f in enumerate(self.features):
+            self._postings["domain"].setdefault(f.domain, []).append(pos)
+            self._postings["level"].setdefault(f.level, []).append(pos)
+            for field in SEMANTIC_FIELDS:
+                for value in getattr(f, field):
+                    self._postings[field].setdefault(value, []).append(pos)
+        self._term_cache = OrderedDict()
+        self._term_lock = threading.Lock()
+
+        self._semantic = None
+        if self.matcher == "semantic":
+            from utils.semantic_matcher import SemanticMatcher
+            phrases = set()
+            for field in SEMANTIC_FIELDS:
+                phrases.update(self._postings[field])
+            self._semantic = SemanticMatcher(sorted(phrases))
+
+    def __len__(self):
+        return len(self.features)
+
+    def in_domains(self, keys):
+        """Filter for top_k(match=...) keeping courses whose domainKey is in `keys`."""
+        keys = frozenset(keys)
+        return lambda f: f.domain_key in keys
+
+    def score_all(self, tags):
+        tf = tags if isinstance(tags, TagFeatures) else TagFeatures(tags)
+        return [(f, *score_features(f, tf)) for f in self.features]
+
+    # ---- term resolution ----
+    def _cached(self, key):
+        with self._term_lock:
+            hit = self._term_cache.get(key)
+            if hit is not None:
+                self._term_cache.move_to_end(key)
+            return hit
+
+    def _store(self, key, positions):
+        with self._term_lock:
+            self._term_cache[key] = positions
+            while len(self._term_cache) > COURSE_INDEX_TERM_CACHE:
+                self._term_cache.popitem(last=False)
+
+    def _positions(self, field, values):
+        positions = set()
+        postings = self._postings[field]
+        for value in values:
+            positions.update(postings.get(value, ()))
+        return frozenset(positions)
+
+    def _resolve_substring(self, field, term):
+        key = ("substring", field, term)
+        hit = self._cached(key)
+        if hit is None:
+            if field == "domain":
+                matches = [v for v in self._postings[field] if term in v or v in term]
+            else:
+                matches = [v for v in self._postings[field] if term in v]
+            hit = self._positions(field, matches)
+            self._store(key, hit)
+        return hit
+
+    def _resolve_semantic(self, queries):
+        """[(field, term)] -> [positions], all uncached terms in one matcher call."""
+        keys = [("semantic", field, term) for field, term in queries]
+        resolved = [self._cached(key) for key in keys]
+        missing = sorted({term for (_, _, term), hit in zip(keys, resolved) if hit is None})
+        if missing:
+            matched = dict(zip(missing, self._semantic.match(missing)))
+            for i, key in enumerate(keys):
+                if resolved[i] is None:
+                    _, field, term = key
+                    resolved[i] = self._positions(field, matched[term])
+                    self._store(key, resolved[i])
+        return resolved
+
+    def _resolve_profile(self, tf):
+        """Positions matching each profile term: domain, role, first word, skills, challenges."""
+        queries = [("roles", tf.role), ("roles", tf.role_first_word)]
+        queries += [("skills", t) for t in tf.skills]
+        queries += [("challenges", t) for t in tf.challenges]
+        if self._semantic is not None:
+            resolved = self._resolve_semantic(queries)
+        else:
+            resolved = [self._resolve_substring(field, term) for field, term in queries]
+
+        n_skills = len(tf.skills)
+        return {
+            "domain": self._resolve_substring("domain", tf.domain),
+            "role": resolved[0],
+            "role_first_word": resolved[1],
+            "skills": resolved[2:2 + n_skills],
+            "challenges": resolved[2 + n_skills:],
+        }
+
+    def candidates(self, tf, resolved=None):
+        """
+        Positions of every course that shares at least one term with the
+        profile. Anything else can only score on level, i.e. at most 2.
+        """
+        resolved = resolved or self._resolve_profile(tf)
+        found = set(resolved["domain"]) | resolved["role"] | resolved["role_first_word"]
+        for positions in resolved["skills"]:
+            found.update(positions)
+        for positions in resolved["challenges"]:
+            found.update(positions)
+        return found
+
+    def _score(self, pos, tf, resolved):
+        f = self.features[pos]
+        if f.domain == tf.domain:
+            domain_score = 2
+        elif pos in resolved["domain"]:
+            domain_score = 1
+        else:
+            domain_score = 0
+        level_score = 2 if f.level == tf.level else 0
+        if pos in resolved["role"]:
+            role_score = 2
+        elif pos in resolved["role_first_word"]:
+            role_score = 1
+        else:
+            role_score = 0
+        skill_score = min(sum(1 for p in resolved["skills"] if pos in p), 3)
+        challenge_score = min(sum(1 for p in resolved["challenges"] if pos in p), 2)
+        return _result(domain_score, level_score, role_score, skill_score, challenge_score)
+
+    def _scored(self, positions, tf, resolved, match):
+        """(position, features, score, label, breakdown) in catalog order."""
+        for pos in sorted(positions):
+            f = self.features[pos]
+            if match is None or match(f):
+                yield (pos, f, *self._score(pos, tf, resolved))
+
+    def top_k(self, tags, k, min_score=3, fallback=5, match=None):
+        """
+        Best-scoring courses as [(features, score, label, breakdown)], best
+        first, at most k of them. Only courses sharing a term with the
+        profile are scored. If none reach min_score, the best `fallback`
+        courses are returned instead. Ties keep catalog order.
+        """
+        tf = tags if isinstance(tags, TagFeatures) else TagFeatures(tags)
+        resolved = self._resolve_profile(tf)
+        candidates = self.candidates(tf, resolved)
+        scored = list(self._scored(candidates, tf, resolved, match))
+        best = heapq.nlargest(k, (e for e in scored if e[2] >= min_score), key=lambda e: e[2])
+        if not best and fallback:
+            # Level-only matches score 2; every other course scores 0.
+            level_only = set(self._postings["level"].get(tf.level, ())) - candidates
+            scored = sorted(scored + list(self._scored(level_only, tf, resolved, match)))
+            best = heapq.nlargest(fallback, scored, key=lambda e: e[2])
+            seen = candidates | level_only
+            for pos, f in enumerate(self.features):
+                if len(best) >= fallback:
+                    break
+                if pos not in seen and (match is None or match(f)):
+                    best.append((pos, f, *self._score(pos, tf, resolved)))
+        return [entry[1:] for entry in best]
+
+
+def recommendation_entries(scored):
+    """Stored form of scored entries: course reference plus score only."""
+    return [
+        {"courseId": f.id, "score": score, "label": label, "breakdown": breakdown}
+        for f, score, label, breakdown in scored
+    ]
+
+
+def refresh_selection(index, tags):
+    """Recommendations for a known profile: score >= 3, else the best 5."""
+    return recommendation_entries(index.top_k(tags, RECOMMEND_TOP_K, min_score=3, fallback=5))
+
+
+# =========================
+#  CACHED INDEX
+# =========================
+_index = None
+_last_check = 0.0
+_index_lock = threading.Lock()
+
+
+def catalog_version(courses_col):
+    """Cheap fingerprint of the catalog: course count + latest updatedAt."""
+    latest = next(iter(courses_col.find({}, {"updatedAt": 1}).sort("updatedAt", -1).limit(1)), None)
+    return (courses_col.estimated_document_count(), latest.get("updatedAt") if latest else None)
+
+
+def build_course_index(courses_col, version=None):
+    started = time.perf_counter()
+    index = CourseIndex(courses_col.find({}, SCORING_PROJECTION), version)
+    print(f"[INDEX] Built course index: {len(index)} courses in {time.perf_counter() - started:.3f}s")
+    return index
+
+
+def get_course_index(courses_col, force=False):
+    """
+    Process-wide course index. Rebuilt when the catalog fingerprint changes,
+    checked at most every COURSE_INDEX_CHECK_SEC seconds.
+    """
+    global _index, _last_check
+    now = time.monotonic()
+    if not force and _index is not None and now - _last_check < COURSE_INDEX_CHECK_SEC:
+        return _index
+
+    with _index_lock:
+        if not force and _index is not None and time.monotonic() - _last_check < COURSE_INDEX_CHECK_SEC:
+            return _index
+        version = catalog_version(courses_col)
+        if force or _index is None or _index.version != version:
+            _index = build_course_index(courses_col, version)
+        _last_check = time.monotonic()
+        return _index
+
+
+def invalidate_course_index():
+    global _last_check
+    with _index_lock:
+        _last_check = 0.0
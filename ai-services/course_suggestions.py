@@ -0,0 +1,170 @@
+import os
+import sys
+import json
+import hashlib
+import argparse
+import threading
+from datetime import datetime, timezone
+import google.generativeai as genai
+from bson import ObjectId
+from dotenv import load_dotenv
+from utils.structured_output import generate_structured
+from utils.db import collection
+
+# Load environment variables
+load_dotenv("../server/.env")
+
+# MongoDB setup (shared pooled client)
+courses_col = collection("courses")
+suggestions_col = collection("coursesuggestions")
+
+# Gemini setup
+genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+model = genai.GenerativeModel("gemini-2.5-flash")
+
+# Only the fields the suggestion prompt is built from
+COURSE_PROJECTION = {"title": 1, "description": 1, "weeks.modules.title": 1}
+MAX_SUGGESTIONS = 5
+SUGGESTIONS_SCHEMA = {"type": "array", "items": {"type": "string"}}
+
+# Course ids with a background refresh currently running
+_refreshing = set()
+_refresh_lock = threading.Lock()
+
+
+def _suggestion_inputs(course):
+    modules = [
+        mod.get("title", "")
+        for week in course.get("weeks", [])
+        for mod in week.get("modules", [])
+    ]
+    return {
+        "title": course.get("title", ""),
+        "description": course.get("description", ""),
+        "modules": modules[:5],
+    }
+
+
+def course_suggestion_version(course):
+    """
+    Hash of everything the suggestion prompt depends on. Editing lessons or
+    later modules does not change it, so suggestions are only regenerated
+    when the prompt itself would change.
+    """
+    payload = json.dumps(_suggestion_inputs(course), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def generate_suggestions(course):
+    inputs = _suggestion_inputs(course)
+    modules_text = ", ".join(inputs["modules"])
+
+    prompt = f"""
+You are a course assistant for the course: **{inputs["title"]}**
+
+Based on the course description and modules, generate 3–5 short **starter questions** a student might ask.
+
+### Course Overview
+**Description:** {inputs["description"]}
+**Modules:** {modules_text}
+
+Return the questions as a JSON array of strings. Do not include any explanation or intro.
+"""
+
+    raw = generate_structured(model, prompt, SUGGESTIONS_SCHEMA, endpoint="suggestions")
+    questions = [q.lstrip("-•* ").strip() for q in raw if q.strip()]
+    return questions[:MAX_SUGGESTIONS]
+
+
+def store_suggestions(course, questions, version=None):
+    suggestions_col.update_one(
+        {"courseId": course["_id"]},
+        {"$set": {
+            "courseId": course["_id"],
+            "version": version or course_suggestion_version(course),
+            "questions": questions,
+            "generatedAt": datetime.now(timezone.utc),
+        }},
+        upsert=True
+    )
+
+
+def refresh_suggestions(course):
+    version = course_suggestion_version(course)
+    questions = generate_suggestions(course)
+    if questions:
+        store_suggestions(course, questions, version)
+    return questions
+
+
+def _refresh_worker(course):
+    try:
+        refresh_suggestions(course)
+        print(f"[SUGGEST] Refreshed suggestions for course {course['_id']}")
+    except Exception as e:
+        print(f"[SUGGEST] Background refresh failed for {course['_id']}: {e}")
+    finally:
+        with _refresh_lock:
+            _refreshing.discard(course["_id"])
+
+
+def refresh_in_background(course):
+    """Start a refresh unless one is already running for this course."""
+    with _refresh_lock:
+        if course["_id"] in _refreshing:
+            return False
+        _refreshing.add(course["_id"])
+    threading.Thread(target=_refresh_worker, args=(course,), daemon=True).start()
+    return True
+
+
+def get_course_suggestions(course):
+    """
+    Return starter questions for a course.
+    - Stored and current version: served directly, no Gemini call.
+    - Stored but the course changed: stale questions are served while a
+      refresh runs in the background.
+    - Never generated: generated inline once and stored.
+    """
+    cached = suggestions_col.find_one({"courseId": course["_id"]}, {"version": 1, "questions": 1})
+    if cached and cached.get("questions"):
+        if cached.get("version") != course_suggestion_version(course):
+            refresh_in_background(course)
+        return cached["questions"]
+
+    return refresh_suggestions(course)
+
+
+def precompute_all(force=False, course_id=None):
+    """Fill suggestions for the whole catalog (or one course). Returns counts."""
+    suggestions_col.create_index("courseId", unique=True)
+    query = {"_id": ObjectId(course_id)} if course_id else {}
+    stored = {
+        doc["courseId"]: doc.get("version")
+        for doc in suggestions_col.find({}, {"courseId": 1, "version": 1})
+    }
+
+    counts = {"generated": 0, "skipped": 0, "failed": 0}
+    for course in courses_col.find(query, COURSE_PROJECTION):
+        if not force and stored.get(course["_id"]) == course_suggestion_version(course):
+            counts["skipped"] += 1
+            continue
+        try:
+            if refresh_suggestions(course):
+                counts["generated"] += 1
+            else:
+                counts["failed"] += 1
+        except Exception as e:
+            counts["failed"] += 1
+            print(f"[SUGGEST] Failed for course {course['_id']}: {e}", file=sys.stderr)
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute chat starter questions for courses.")
+    parser.add_argument("--course-id", type=str, help="Only process this course")
+    parser.add_argument("--force", action="store_true", help="Regenerate even if up to date")
+    args = parser.parse_args()
+
+    print("📤 Precomputing course suggestions...", file=sys.stderr)
+    print(json.dumps(precompute_all(force=args.force, course_id=args.course_id)))
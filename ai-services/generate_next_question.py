@@ -1,6 +1,13 @@
 import os
+import time
+import random
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED, TimeoutError as FuturesTimeout
 import google.generativeai as genai
 from dotenv import load_dotenv
+from utils.llm_governor import generate_content, LLMUnavailable
+from utils.structured_output import generate_structured
 
 # Load environment variables
 load_dotenv("../server/.env")
@@ -9,7 +16,36 @@ load_dotenv("../server/.env")
 genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
 model = genai.GenerativeModel("gemini-2.5-flash")
 
-def generate_next_question(
+# "serial": one candidate per call, retried up to 3 times on duplicates
+# "parallel": NEXT_QUESTION_CANDIDATES concurrent calls, first unused one wins
+# "multi": one call that returns NEXT_QUESTION_CANDIDATES alternatives
+# Parallel mode costs NEXT_QUESTION_CANDIDATES Gemini calls per turn and
+# fills the endpoint's LLM slots with a couple of concurrent interviews;
+# only enable it with a per-endpoint limit sized for it.
+NEXT_QUESTION_MODE = os.getenv("NEXT_QUESTION_MODE", "serial").lower()
+NEXT_QUESTION_CANDIDATES = int(os.getenv("NEXT_QUESTION_CANDIDATES", 3))
+# Hard latency budget before falling back to the question bank.
+NEXT_QUESTION_BUDGET_SEC = float(os.getenv("NEXT_QUESTION_BUDGET_SEC", 8))
+CANDIDATES_SCHEMA = {"type": "array", "items": {"type": "string"}}
+QUESTION_BANK_SESSIONS = 200
+QUESTION_BANK_SIZE = 100
+
+_candidate_pool = ThreadPoolExecutor(max_workers=int(os.getenv("NEXT_QUESTION_WORKERS", 8)))
+
+# student+course key -> questions previously generated in that interview.
+# Questions are written from one student's answers, so they are never
+# offered to another student; unused speculative candidates land here too.
+_question_bank = OrderedDict()
+_bank_lock = threading.Lock()
+
+FALLBACK_TEMPLATES = [
+    "Can you explain {topic} and describe where you would use it in a real project?",
+    "What are the most common mistakes people make with {topic}, and how would you avoid them?",
+    "How would you explain {topic} to a teammate who has never used it?",
+]
+
+
+def build_next_question_prompt(
     answer,
     index,
     transcript_text="",
@@ -17,7 +53,8 @@ def generate_next_question(
     course_title="",
     skills=[],
     lessons=[],
-    roles=[]
+    roles=[],
+    num_candidates=1,
 ):
     skills_str = "\n".join(f"- {s}" for s in skills[:8])
     lessons_str = "\n".join(f"- {l}" for l in lessons[:10])
@@ -61,12 +98,203 @@ Rules:
 
 Return ONLY the next question.
 """
+    if num_candidates > 1:
+        prompt += f"""
+Instead of one question, return {num_candidates} alternative next questions, each on a different subtopic.
+Return them as a JSON array of strings, one question per element.
+"""
+    return prompt
+
+
+def generate_next_question(
+    answer,
+    index,
+    transcript_text="",
+    proficiency="Beginner",
+    course_title="",
+    skills=[],
+    lessons=[],
+    roles=[],
+    generation_config=None,
+):
+    prompt = build_next_question_prompt(
+        answer, index, transcript_text, proficiency, course_title, skills, lessons, roles
+    )
     print("🤖 Gemini Prompt:", prompt.strip())
     try:
-        response = model.generate_content(prompt)
+        response = generate_content(
+            model, prompt, endpoint="generate-next-question", generation_config=generation_config
+        )
         result = response.text.strip().split("\n")[0]
         print("🤖 Gemini Response:", result)
         return {"nextQuestion": result}
+    except LLMUnavailable:
+        raise
     except Exception as e:
         print("❌ Gemini error:", e)
         return {"error": str(e)}
+
+
+# =========================
+#  QUESTION BANK
+# =========================
+def interview_bank_key(student_id, course_id):
+    return f"{student_id}:{course_id}"
+
+
+def remember_questions(bank_key, questions):
+    questions = [q for q in questions if q]
+    if not bank_key or not questions:
+        return
+    with _bank_lock:
+        bank = _question_bank.pop(bank_key, [])
+        for q in questions:
+            if q not in bank:
+                bank.append(q)
+        _question_bank[bank_key] = bank[-QUESTION_BANK_SIZE:]
+        while len(_question_bank) > QUESTION_BANK_SESSIONS:
+            _question_bank.popitem(last=False)
+
+
+def fallback_question(bank_key, used, skills=[], lessons=[]):
+    """Unused question banked for this student and course, else a templated one from the course topics."""
+    with _bank_lock:
+        banked = list(_question_bank.get(bank_key, [])) if bank_key else []
+    for q in banked:
+        if q not in used:
+            return q
+
+    topics = [t for t in list(skills) + list(lessons) if t]
+    random.shuffle(topics)
+    for topic in topics:
+        for template in FALLBACK_TEMPLATES:
+            q = template.format(topic=topic)
+            if q not in used:
+                return q
+    return None
+
+
+# =========================
+#  CANDIDATE STRATEGIES
+# =========================
+def _bank_result(bank_key, fut):
+    """Done-callback for candidates that finished after the budget."""
+    try:
+        remember_questions(bank_key, [fut.result().get("nextQuestion", "").strip()])
+    except Exception:
+        pass
+
+
+def _serial_candidates(args, used, deadline, bank_key):
+    for _ in range(3):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        # On the pool so the budget holds even while one governed call sits
+        # in the LLM queue or backs off; a late answer still goes to the bank
+        fut = _candidate_pool.submit(generate_next_question, *args)
+        try:
+            res = fut.result(timeout=remaining)
+        except FuturesTimeout:
+            fut.add_done_callback(lambda f: _bank_result(bank_key, f))
+            return None
+        except LLMUnavailable:
+            return None
+        if res.get("error"):
+            # Transient failures were already retried by the LLM governor,
+            # so only duplicates are worth another round trip here.
+            return None
+        nq = res.get("nextQuestion", "").strip()
+        remember_questions(bank_key, [nq])
+        if nq and nq not in used:
+            return nq
+    return None
+
+
+def _parallel_candidates(args, used, deadline, bank_key, n):
+    # Slightly different temperatures keep the candidates from collapsing
+    # onto the same question.
+    futures = [
+        _candidate_pool.submit(
+            generate_next_question, *args, generation_config={"temperature": 0.7 + 0.15 * i}
+        )
+        for i in range(n)
+    ]
+
+    pending = set(futures)
+    picked = None
+    while pending and picked is None:
+        done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+        if not done:
+            break
+        for fut in done:
+            try:
+                nq = fut.result().get("nextQuestion", "").strip()
+            except LLMUnavailable:
+                continue
+            remember_questions(bank_key, [nq])
+            if picked is None and nq and nq not in used:
+                picked = nq
+
+    # Late candidates still go into the bank for later turns.
+    for fut in pending:
+        fut.add_done_callback(lambda f: _bank_result(bank_key, f))
+    return picked
+
+
+def _multi_candidates(args, used, deadline, bank_key, n):
+    prompt = build_next_question_prompt(*args, num_candidates=n)
+    fut = _candidate_pool.submit(
+        generate_structured, model, prompt, CANDIDATES_SCHEMA, endpoint="generate-next-question"
+    )
+    try:
+        lines = [q.strip() for q in fut.result(timeout=max(0.0, deadline - time.monotonic()))]
+    except LLMUnavailable:
+        return None
+    except Exception as e:
+        print("❌ Gemini error:", e)
+        return None
+
+    candidates = [l for l in lines if l]
+    remember_questions(bank_key, candidates)
+    return next((q for q in candidates if q not in used), None)
+
+
+def next_unique_question(
+    answer,
+    index,
+    transcript_text="",
+    proficiency="Beginner",
+    course_title="",
+    skills=[],
+    lessons=[],
+    roles=[],
+    used=frozenset(),
+    bank_key=None,
+    mode=None,
+    budget_sec=None,
+):
+    """
+    Return (question, source) where source is "llm" or "bank", or
+    (None, None) when nothing unused could be produced.
+    """
+    mode = mode or NEXT_QUESTION_MODE
+    n = max(1, NEXT_QUESTION_CANDIDATES)
+    deadline = time.monotonic() + (budget_sec or NEXT_QUESTION_BUDGET_SEC)
+    args = (answer, index, transcript_text, proficiency, course_title, skills, lessons, roles)
+
+    if mode == "multi":
+        nq = _multi_candidates(args, used, deadline, bank_key, n)
+    elif mode == "serial":
+        nq = _serial_candidates(args, used, deadline, bank_key)
+    else:
+        nq = _parallel_candidates(args, used, deadline, bank_key, n)
+
+    if nq:
+        return nq, "llm"
+
+    nq = fallback_question(bank_key, used, skills, lessons)
+    if nq:
+        print(f"[NEXT-Q] Falling back to question bank after {mode} mode")
+        return nq, "bank"
+    return None, None
@@ -3,12 +3,53 @@ import argparse
 import json
 import os
 import re
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from utils.llm_governor import LLMUnavailable
+from utils.structured_output import generate_structured
 
 # Load environment variables
 load_dotenv("../server/.env")
 
-def generate_quiz_from_transcript(transcript):
+# Transcripts up to this size are sent in one prompt.
+QUIZ_SINGLE_PASS_CHARS = 12000
+# Longer ones are split into at most QUIZ_MAX_CHUNKS chunks of at least
+# QUIZ_CHUNK_CHARS each, and concepts are extracted from every chunk in
+# parallel before one final quiz assembly call.
+QUIZ_CHUNK_CHARS = int(os.getenv("QUIZ_CHUNK_CHARS", 8000))
+QUIZ_MAX_CHUNKS = int(os.getenv("QUIZ_MAX_CHUNKS", 8))
+# Keep at or below the governor's per-endpoint limit for "generate-quiz-map".
+QUIZ_MAP_CONCURRENCY = int(os.getenv("QUIZ_MAP_CONCURRENCY", 4))
+
+QUIZ_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "type": {"type": "string", "enum": ["mcq", "fill", "text"]},
+            "question": {"type": "string"},
+            "options": {"type": "array", "items": {"type": "string"}},
+            "correctAnswer": {"type": "string"},
+            "explanation": {"type": "string"},
+        },
+        "required": ["type", "question", "correctAnswer", "explanation"],
+    },
+}
+
+CONCEPTS_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "concept": {"type": "string"},
+            "summary": {"type": "string"},
+        },
+        "required": ["concept", "summary"],
+    },
+}
+
+
+def _get_model():
     import google.generativeai as genai
 
     api_key = os.getenv("GEMINI_API_KEY")
@@ -16,26 +57,44 @@ def generate_quiz_from_transcript(transcript):
         raise ValueError("GEMINI_API_KEY not found in environment variables.")
 
     genai.configure(api_key=api_key)
-    model = genai.GenerativeModel("gemini-2.5-flash")
+    return genai.GenerativeModel("gemini-2.5-flash")
+
 
-    # Convert transcript to plain text if it's a list or dict
+def _transcript_segments(transcript):
+    """Split a transcript into its natural segments (Whisper segments or sentences)."""
+    if isinstance(transcript, dict) and "transcript" in transcript:
+        transcript = transcript["transcript"]
     if isinstance(transcript, list):
-        transcript = " ".join(seg.get("text", "") for seg in transcript)
-    elif isinstance(transcript, dict) and "transcript" in transcript:
-        transcript = " ".join(seg.get("text", "") for seg in transcript["transcript"])
-    elif not isinstance(transcript, str):
-        transcript = str(transcript)
+        return [
+            (seg.get("text", "") if isinstance(seg, dict) else str(seg)).strip()
+            for seg in transcript
+        ]
+    return re.split(r"(?<=[.!?])\s+", str(transcript).strip())
 
-    transcript = transcript.strip()
 
-    # Truncate if too long
-    if len(transcript) > 12000:
-        transcript = transcript[:12000] + "..."
+def chunk_transcript(segments, max_chunks=QUIZ_MAX_CHUNKS, min_chunk_chars=QUIZ_CHUNK_CHARS):
+    """Group segments into roughly equal chunks without splitting a segment."""
+    segments = [s for s in segments if s]
+    total = sum(len(s) + 1 for s in segments)
+    target = max(min_chunk_chars, -(-total // max(1, max_chunks)))
 
-    prompt = f"""
+    chunks, current, size = [], [], 0
+    for seg in segments:
+        current.append(seg)
+        size += len(seg) + 1
+        if size >= target:
+            chunks.append(" ".join(current))
+            current, size = [], 0
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+def _quiz_prompt(source, source_title="Transcript", source_label="transcript", coverage=""):
+    return f"""
 You are an intelligent educational assistant.
 
-Given the transcript of a video lesson, generate a high-quality quiz with 2 to 10 questions that test understanding of its key concepts.
+Given the {source_label} of a video lesson, generate a high-quality quiz with 2 to 10 questions that test understanding of its key concepts.{coverage}
 
 Each question must follow this structure:
 
@@ -63,58 +122,130 @@ Always include an explanation for each question. Avoid vague or empty explanatio
   ...
 ]
 
-Transcript:
+{source_title}:
 \"\"\"
-{transcript}
+{source}
 \"\"\"
 
 Return only the JSON array as output.
 """
 
-    try:
-        response = model.generate_content(prompt)
-        raw_output = response.text.strip()
-
-        # Extract valid JSON array
-        json_match = re.search(r"\[\s*{.*}\s*\]", raw_output, re.DOTALL)
-        if not json_match:
-            raise ValueError("No valid JSON array found in model output.")
-
-        quiz_data = json.loads(json_match.group(0))
-
-        # Clean and validate quiz items
-        cleaned_quiz = []
-        for q in quiz_data:
-            q_type = q.get("type", "").strip().lower()
-            question = q.get("question", "").strip()
-            correct = q.get("correctAnswer", "").strip()
-            explanation = q.get("explanation", "").strip()
-
-            # Skip if invalid structure
-            if not q_type or not question or not correct:
+
+def _clean_quiz(quiz_data):
+    # Clean and validate quiz items
+    cleaned_quiz = []
+    for q in quiz_data:
+        q_type = q.get("type", "").strip().lower()
+        question = q.get("question", "").strip()
+        correct = q.get("correctAnswer", "").strip()
+        explanation = q.get("explanation", "").strip()
+
+        # Skip if invalid structure
+        if not q_type or not question or not correct:
+            continue
+
+        # Fallback for empty explanation
+        if not explanation:
+            explanation = f'The correct answer is "{correct}" because it best matches the concept in the question.'
+
+        quiz_item = {
+            "type": q_type,
+            "question": question,
+            "correctAnswer": correct,
+            "explanation": explanation,
+        }
+
+        if q_type == "mcq":
+            options = q.get("options", [])
+            if not isinstance(options, list) or len(options) != 4:
                 continue
+            quiz_item["options"] = [opt.strip() for opt in options]
+
+        cleaned_quiz.append(quiz_item)
 
-            # Fallback for empty explanation
-            if not explanation:
-                explanation = f'The correct answer is "{correct}" because it best matches the concept in the question.'
+    return cleaned_quiz
 
-            quiz_item = {
-                "type": q_type,
-                "question": question,
-                "correctAnswer": correct,
-                "explanation": explanation,
-            }
 
-            if q_type == "mcq":
-                options = q.get("options", [])
-                if not isinstance(options, list) or len(options) != 4:
-                    continue
-                quiz_item["options"] = [opt.strip() for opt in options]
+def _extract_concepts(model, chunk, section):
+    prompt = f"""
+You are an intelligent educational assistant.
+
+Below is section {section} of a video lesson transcript. List the 3 to 6 most important concepts taught in it.
+For each concept give a one or two sentence summary with the concrete facts, definitions or examples from the section
+that a quiz question could test.
 
-            cleaned_quiz.append(quiz_item)
+### Output format (JSON array only):
+[
+  {{"concept": "string", "summary": "string"}}
+]
+
+Transcript section:
+\"\"\"
+{chunk}
+\"\"\"
+
+Return only the JSON array as output.
+"""
+    try:
+        concepts = generate_structured(model, prompt, CONCEPTS_SCHEMA, endpoint="generate-quiz-map")
+        return [c for c in concepts if c.get("concept")]
+    except LLMUnavailable:
+        raise
+    except Exception as e:
+        print(f"[QUIZ] Concept extraction failed for section {section}: {e}", file=sys.stderr)
+        return []
+
+
+def _concept_outline(model, segments):
+    chunks = chunk_transcript(segments)
+    print(f"[QUIZ] Long transcript: extracting concepts from {len(chunks)} sections", file=sys.stderr)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(QUIZ_MAP_CONCURRENCY, len(chunks)))) as pool:
+        per_section = list(pool.map(
+            lambda args: _extract_concepts(model, *args),
+            [(chunk, i + 1) for i, chunk in enumerate(chunks)],
+        ))
+
+    lines = []
+    for i, concepts in enumerate(per_section):
+        if not concepts:
+            continue
+        lines.append(f"Section {i + 1}:")
+        lines.extend(
+            f"- {c.get('concept', '').strip()}: {c.get('summary', '').strip()}" for c in concepts
+        )
+    return "\n".join(lines), len(chunks)
+
+
+def generate_quiz_from_transcript(transcript):
+    model = _get_model()
+
+    segments = _transcript_segments(transcript)
+    if isinstance(transcript, str):
+        text = transcript.strip()
+    else:
+        text = " ".join(s for s in segments if s).strip()
+
+    try:
+        if len(text) <= QUIZ_SINGLE_PASS_CHARS:
+            prompt = _quiz_prompt(text)
+        else:
+            outline, sections = _concept_outline(model, segments)
+            if not outline:
+                # Every section failed; fall back to the truncated single pass.
+                prompt = _quiz_prompt(text[:QUIZ_SINGLE_PASS_CHARS] + "...")
+            else:
+                prompt = _quiz_prompt(
+                    outline,
+                    source_title="Key concepts by section",
+                    source_label="key concepts (grouped by section)",
+                    coverage=f"\nSpread the questions across the {sections} sections so the whole lesson is covered.",
+                )
 
-        return cleaned_quiz
+        return _clean_quiz(generate_structured(model, prompt, QUIZ_SCHEMA, endpoint="generate-quiz"))
 
+    except LLMUnavailable:
+        raise
     except Exception as e:
         print(f"[❌ ERROR] Failed to generate or parse quiz: {e}", file=sys.stderr)
         return []
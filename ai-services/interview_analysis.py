@@ -1,15 +1,16 @@
 import os
 import re
-import json
-import requests
-import cloudinary
-import cloudinary.uploader
-import moviepy.editor as mp
-import whisper
-import cv2
-import mediapipe as mp_face
 import google.generativeai as genai
 from dotenv import load_dotenv
+from utils.llm_governor import LLMUnavailable
+from utils.structured_output import generate_structured
+from utils import model_registry, media_cache
+from utils.model_registry import LazyModule
+from utils.scratch import job_dir, ScratchSpaceError
+
+# Loaded on first use, so importing this module stays cheap
+cv2 = LazyModule("cv2")
+mp_face = LazyModule("mediapipe")
 
 # Set FFMPEG path if on Windows
 os.environ["FFMPEG_BINARY"] = r"C:\ffmpeg\ffmpeg-build\bin\ffmpeg.exe"
@@ -18,42 +19,37 @@ os.environ["PATH"] += os.pathsep + r"C:\ffmpeg\ffmpeg-build\bin"
 # Load environment variables
 load_dotenv("../server/.env")
 
-# Cloudinary config
-cloudinary.config(
-    cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
-    api_key=os.getenv("CLOUDINARY_API_KEY"),
-    api_secret=os.getenv("CLOUDINARY_API_SECRET")
-)
-
 # Gemini config
 genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
 gemini_model = genai.GenerativeModel("gemini-2.5-flash")
 
 # === Helper Functions ===
 
-def download_video(cloud_url, save_path):
-    response = requests.get(cloud_url, stream=True)
-    with open(save_path, 'wb') as f:
-        for chunk in response.iter_content(chunk_size=8192):
-            f.write(chunk)
-    return save_path
+def download_video(cloud_url, save_path, max_bytes=None):
+    return media_cache.fetch(cloud_url, save_path, max_bytes=max_bytes)
 
 def extract_audio(video_path, audio_path):
+    mp = model_registry.get("moviepy")
     with mp.VideoFileClip(video_path) as clip:
         clip.audio.write_audiofile(audio_path)
     return audio_path
 
 def transcribe_audio(audio_path):
-    model = whisper.load_model("base")
-    result = model.transcribe(audio_path)
+    result = model_registry.transcribe(audio_path)
     return result["text"]
 
-def extract_json(raw_text):
-    try:
-        match = next(re.finditer(r"\{.*\}", raw_text, re.DOTALL))
-        return json.loads(match.group())
-    except:
-        return {"error": "Invalid JSON in Gemini output"}
+INTERVIEW_FEEDBACK_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "confidence": {"type": "integer"},
+        "clarity": {"type": "integer"},
+        "tone": {"type": "string"},
+        "keywords": {"type": "array", "items": {"type": "string"}},
+        "careerFocused": {"type": "string"},
+        "subjectKnowledgeScore": {"type": "integer"},
+    },
+    "required": ["confidence", "clarity", "tone", "keywords", "careerFocused", "subjectKnowledgeScore"],
+}
 
 def analyze_transcript(text):
     prompt = f"""
@@ -71,9 +67,11 @@ def analyze_transcript(text):
     {text}
     """
     try:
-        response = gemini_model.generate_content(prompt)
-        cleaned = extract_json(response.text)
-        return cleaned
+        return generate_structured(gemini_model, prompt, INTERVIEW_FEEDBACK_SCHEMA, endpoint="interview-analysis")
+    except LLMUnavailable:
+        raise
+    except ValueError:
+        return {"error": "Invalid JSON in Gemini output"}
     except Exception as e:
         return {"error": f"Gemini error: {str(e)}"}
 
@@ -112,100 +110,123 @@ def analyze_face_visibility(video_path):
 
 # === Exported Analysis Function ===
 
-def analyze_interview(video_url, answers, student_id):
+def extract_interview_features(video_url, student_id):
     """
-    Full AI interview analysis pipeline.
-    Returns data structured for InterviewReport model.
+    The CPU-heavy part of the analysis: download, transcribe and scan the
+    video for faces. Makes no LLM calls, so it can run in a worker process.
     """
-    unique_id = str(student_id)
-    video_path = f"temp_interview_video_{unique_id}.mp4"
-    audio_path = f"temp_interview_audio_{unique_id}.wav"
+    # Each run gets its own scratch directory, so concurrent analyses
+    # for one student can't overwrite each other's files
+    with job_dir("interview", student_id) as job:
+        video_path = job.file("interview_video.mp4")
+        audio_path = job.file("interview_audio.wav")
 
-    try:
         print(f"[AI Interview] Starting analysis for student={student_id}")
-        
+
         # 1️⃣ Download & process video/audio
-        download_video(video_url, video_path)
+        download_video(video_url, video_path, max_bytes=job.remaining())
         extract_audio(video_path, audio_path)
+        job.check_quota()
 
         # 2️⃣ Transcribe
         print("[AI Interview] Transcribing audio...")
         transcript = transcribe_audio(audio_path)
 
-        # 3️⃣ NLP-based analysis
-        print("[AI Interview] Analyzing transcript via Gemini...")
-        ai_feedback = analyze_transcript(transcript)
-
-        # 4️⃣ Facial analysis
+        # 3️⃣ Facial analysis
         print("[AI Interview] Analyzing face visibility...")
         face_stats = analyze_face_visibility(video_path)
 
-        # === 5️⃣ Compute normalized scores ===
-        def safe_num(val, default=5):
-            try:
-                if isinstance(val, (int, float)):
-                    return float(val)
-                if isinstance(val, str) and val.isdigit():
-                    return float(val)
-                match = re.search(r'\d+', str(val))
-                return float(match.group()) if match else default
-            except:
-                return default
-
-        tone_conf = min(100, safe_num(ai_feedback.get("confidence", 5)) * 10)
-        communication = min(100, safe_num(ai_feedback.get("clarity", 5)) * 10)
-        technical = min(100, safe_num(ai_feedback.get("subjectKnowledgeScore", 5)) * 10)
-        soft_skills = 80 if str(ai_feedback.get("careerFocused", "")).lower().startswith("yes") else 50
-        eye_contact = face_stats.get("faceVisiblePercent", 0)
-        total = round((tone_conf + communication + technical + soft_skills + eye_contact) / 5, 2)
-
-        overall_scores = {
-            "toneConfidence": tone_conf,
-            "communication": communication,
-            "technical": technical,
-            "softSkills": soft_skills,
-            "eyeContact": eye_contact,
-            "total": total
-        }
-
-        # === 6️⃣ Per-question breakdown ===
-        per_question = []
-        for i, ans in enumerate(answers or []):
-            per_question.append({
-                "index": i,
-                "question": ans.get("question", ""),
-                "answer": ans.get("answer", ""),
-                "scores": {
-                    "toneConfidence": tone_conf,
-                    "communication": communication,
-                    "technical": technical,
-                    "softSkills": soft_skills,
-                    "eyeContact": eye_contact,
-                },
-                "feedback": f"Answer {i+1}: Good effort with clear communication."
-            })
-
-        # === 7️⃣ Return structured analysis ===
-        result = {
-            "studentId": student_id,
-            "overallScores": overall_scores,
-            "perQuestion": per_question,
-            "ai_feedback": ai_feedback,
-            "face_stats": face_stats,
-            "transcript": transcript,
-            "cheating_detected": (
-                face_stats.get("multipleFaceFrames", 0) > 5 or
-                face_stats.get("faceVisiblePercent", 0) < 60
-            ),
-        }
-
-        print("[AI Interview] ✅ Analysis complete.")
-        return result
+    return {"transcript": transcript, "face_stats": face_stats}
+
 
+def analyze_interview(video_url, answers, student_id, run=None):
+    """
+    Full AI interview analysis pipeline.
+    Returns data structured for InterviewReport model.
+
+    `run(fn, *args)` executes the media step (e.g. dispatcher.run_cpu); the
+    Gemini step always runs in the calling process, under its LLM limits.
+    """
+    try:
+        if run:
+            features = run(extract_interview_features, video_url, student_id)
+        else:
+            features = extract_interview_features(video_url, student_id)
+        return _build_report(features, answers, student_id)
+
+    except (ScratchSpaceError, LLMUnavailable):
+        raise
     except Exception as e:
         print("❌ [AI Interview] Error:", str(e))
         return {"error": str(e)}
 
-    finally:
-        if os.path.exists(video_path): os.remove(video_path)
-        if os.path.exists(audio_path): os.remove(audio_path)
+
+def _build_report(features, answers, student_id):
+    transcript = features["transcript"]
+    face_stats = features["face_stats"]
+
+    # 4️⃣ NLP-based analysis
+    print("[AI Interview] Analyzing transcript via Gemini...")
+    ai_feedback = analyze_transcript(transcript)
+
+    # === 5️⃣ Compute normalized scores ===
+    def safe_num(val, default=5):
+        try:
+            if isinstance(val, (int, float)):
+                return float(val)
+            if isinstance(val, str) and val.isdigit():
+                return float(val)
+            match = re.search(r'\d+', str(val))
+            return float(match.group()) if match else default
+        except:
+            return default
+
+    tone_conf = min(100, safe_num(ai_feedback.get("confidence", 5)) * 10)
+    communication = min(100, safe_num(ai_feedback.get("clarity", 5)) * 10)
+    technical = min(100, safe_num(ai_feedback.get("subjectKnowledgeScore", 5)) * 10)
+    soft_skills = 80 if str(ai_feedback.get("careerFocused", "")).lower().startswith("yes") else 50
+    eye_contact = face_stats.get("faceVisiblePercent", 0)
+    total = round((tone_conf + communication + technical + soft_skills + eye_contact) / 5, 2)
+
+    overall_scores = {
+        "toneConfidence": tone_conf,
+        "communication": communication,
+        "technical": technical,
+        "softSkills": soft_skills,
+        "eyeContact": eye_contact,
+        "total": total
+    }
+
+    # === 6️⃣ Per-question breakdown ===
+    per_question = []
+    for i, ans in enumerate(answers or []):
+        per_question.append({
+            "index": i,
+            "question": ans.get("question", ""),
+            "answer": ans.get("answer", ""),
+            "scores": {
+                "toneConfidence": tone_conf,
+                "communication": communication,
+                "technical": technical,
+                "softSkills": soft_skills,
+                "eyeContact": eye_contact,
+            },
+            "feedback": f"Answer {i+1}: Good effort with clear communication."
+        })
+
+    # === 7️⃣ Return structured analysis ===
+    result = {
+        "studentId": student_id,
+        "overallScores": overall_scores,
+        "perQuestion": per_question,
+        "ai_feedback": ai_feedback,
+        "face_stats": face_stats,
+        "transcript": transcript,
+        "cheating_detected": (
+            face_stats.get("multipleFaceFrames", 0) > 5 or
+            face_stats.get("faceVisiblePercent", 0) < 60
+        ),
+    }
+
+    print("[AI Interview] ✅ Analysis complete.")
+    return result
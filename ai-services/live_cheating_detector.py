@@ -1,32 +1,25 @@
-import cv2
 import numpy as np
-from collections import deque, defaultdict
+from collections import deque
 import time
-import mediapipe as mp
 import math
 import traceback
 import statistics
 import os
+from utils import model_registry
+from utils.model_registry import LazyModule
+from utils import session_store
 
-# ---------- MediaPipe init ----------
-mp_face_detection = mp.solutions.face_detection
-mp_face_mesh = mp.solutions.face_mesh
+cv2 = LazyModule("cv2")
 
-FACE_DET = mp_face_detection.FaceDetection(
-    model_selection=0, min_detection_confidence=0.5
-)
-FACE_MESH = mp_face_mesh.FaceMesh(
-    static_image_mode=False,
-    max_num_faces=1,
-    refine_landmarks=True,
-    min_detection_confidence=0.5,
-    min_tracking_confidence=0.5,
-)
+# ---------- MediaPipe init ----------
+# FaceDetection + FaceMesh are built on the first frame (see
+# utils.model_registry "face_live"), not when this module is imported.
 
 # ---------- Per-session state ----------
 # Use session id (e.g., user id) to keep per-user state for calibration/debounce.
-STATE = defaultdict(
-    lambda: {
+# SESSION_STORE picks where it lives (see utils/session_store.py).
+def _new_state():
+    return {
         "warning_given": False,
         "cancelled": False,
         "stable_frames": 0,
@@ -48,7 +41,10 @@ STATE = defaultdict(
         "last_warning_str": None,     # last warning text for cooldown
         "calib_start_time": None,     # time when calibration began
     }
-)
+
+
+SESSIONS = session_store.create(_new_state)
+
 # ---------- Tuning parameters (adjust these as needed) ----------
 CALIBRATION_TIME_SEC = 4.0      # seconds to build baseline (4s calibration)
 NO_FACE_TOLERANCE = 1           # allow tiny detection glitches
@@ -71,6 +67,22 @@ RESET_STABLE_FRAMES = 5
 WARNING_COOLDOWN = 2.0          # seconds before repeating the same toast
 DEBUG = os.environ.get("CHEAT_DETECTOR_DEBUG", "0") == "1"
 
+# Frame rate hints (next_frame_interval_ms in every response)
+FRAME_INTERVAL_MIN_MS = int(os.getenv("FRAME_INTERVAL_MIN_MS", 500))      # calibrating / something's wrong
+FRAME_INTERVAL_BASE_MS = int(os.getenv("FRAME_INTERVAL_BASE_MS", 1000))   # normal rate
+# Slowest rate for a stable session (MAX), and under load (OVERLOAD_MAX);
+# never faster than BASE. With a stable-session interval of I, a violation
+# is first seen within I and a critical, whose deadline frame is timed
+# exactly, confirmed within I + CRITICAL_GRACE_PERIOD. Fixed 1s polling gave
+# 1s and 5s; the defaults give 2s and 5s for stable sessions (3s and 6s
+# under load) in exchange for up to half the frames. Set both to BASE to
+# keep 1s detection.
+FRAME_INTERVAL_MAX_MS = max(FRAME_INTERVAL_BASE_MS, int(os.getenv("FRAME_INTERVAL_MAX_MS", 2000)))
+FRAME_INTERVAL_OVERLOAD_MAX_MS = max(
+    FRAME_INTERVAL_MAX_MS, int(os.getenv("FRAME_INTERVAL_OVERLOAD_MAX_MS", 3000))
+)
+STABLE_RAMP_FRAMES = 20         # stable frames to go from BASE to MAX
+
 # ---------- Utilities ----------
 def _landmark_to_xy(landmark, w, h):
     return np.array([landmark.x * w, landmark.y * h], dtype=np.float32)
@@ -164,7 +176,53 @@ def _get_eye_points(face_landmarks, w, h, is_left=True):
 
 
 # ---------- Main function ----------
-def check_cheating(frame_bytes: bytes, session_id: str = "default"):
+def check_cheating(frame_bytes: bytes, session_id: str = "default", load: float = 0.0):
+    """
+    `load` is how busy the frame tier is (in-flight / limit); it stretches
+    the next-frame hint for stable sessions only.
+    """
+    st, version = SESSIONS.load(session_id)
+    try:
+        response = _check_frame(st, frame_bytes, session_id)
+        response["next_frame_interval_ms"] = next_frame_interval_ms(st, load)
+        return response
+    finally:
+        if not SESSIONS.save(session_id, st, version) and DEBUG:
+            print(f"[CheatDetector:{session_id}] state changed concurrently; update from this frame dropped")
+
+
+def next_frame_interval_ms(st, load=0.0, now=None):
+    """
+    How long the client should wait before sending the next frame: fast
+    while calibrating or while anything looks wrong, slowing down as the
+    session stays stable, and slower still for stable sessions when the
+    server is busy.
+    """
+    if st.get("cancelled", False):
+        return FRAME_INTERVAL_OVERLOAD_MAX_MS
+
+    now = time.time() if now is None else now
+    if st.get("last_critical_time") is not None:
+        # Grace timer running: sample quickly, and land a frame right at the deadline
+        remaining_ms = (st["last_critical_time"] + CRITICAL_GRACE_PERIOD - now) * 1000
+        return int(max(100, min(FRAME_INTERVAL_MIN_MS, remaining_ms + 50)))
+
+    unsettled = (
+        st.get("bad_frames", 0) or st.get("noface_frames", 0)
+        or st.get("multi_frames", 0) or st.get("mesh_fail_frames", 0)
+    )
+    if not st.get("baseline_ready", False) or unsettled:
+        return FRAME_INTERVAL_MIN_MS
+
+    stable = max(0, st.get("stable_frames", 0) - RESET_STABLE_FRAMES)
+    ramp = min(1.0, stable / STABLE_RAMP_FRAMES)
+    interval = FRAME_INTERVAL_BASE_MS + ramp * (FRAME_INTERVAL_MAX_MS - FRAME_INTERVAL_BASE_MS)
+    if load > 0.5:
+        interval = max(interval, min(FRAME_INTERVAL_OVERLOAD_MAX_MS, interval * (1 + 2 * (min(load, 1.0) - 0.5))))
+    return int(interval)
+
+
+def _check_frame(st, frame_bytes, session_id):
     """
     Improved check_cheating:
     - time-based calibration (CALIBRATION_TIME_SEC)
@@ -173,7 +231,7 @@ def check_cheating(frame_bytes: bytes, session_id: str = "default"):
     - ignore eye movement (USE_EAR=False)
     - warning cooldown + debounce
     """
-    st = STATE[session_id]
+    FACE_DET, FACE_MESH = model_registry.get("face_live")
 
     # Ensure baseline keys exist (defensive)
     if "baseline_ready" not in st:
@@ -489,6 +547,9 @@ def check_cheating(frame_bytes: bytes, session_id: str = "default"):
             "baseline_ready": bool(st.get("baseline_ready", False)),
         }
 
+def session_count():
+    return SESSIONS.count()
+
+
 def clear_session(session_id: str):
-    if session_id in STATE:
-        del STATE[session_id]
+    SESSIONS.delete(session_id)
@@ -1,11 +1,22 @@
 import os
 import re
-import json
+import time
+import threading
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
 from bson import ObjectId
-from pymongo import MongoClient
 from dotenv import load_dotenv
 import google.generativeai as genai
 from career_video_analysis import analyze_career_video
+from course_index import (
+    RECOMMEND_TOP_K, CourseFeatures, TagFeatures, score_features, get_course_index,
+    recommendation_entries, refresh_selection,
+)
+from utils.db import collection
+from utils.dispatcher import run_cpu
+from utils.domains import domain_keys
+from utils.structured_output import generate_structured
 
 # Load .env variables
 load_dotenv("../server/.env")
@@ -14,16 +25,9 @@ load_dotenv("../server/.env")
 genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
 model = genai.GenerativeModel("gemini-2.5-flash")
 
-# MongoDB setup
-client = MongoClient(os.getenv("MONGO_CONN"))
-try:
-    db = client.get_default_database()
-    if db is None:
-        db = client["test"]
-except:
-    db = client["test"]
-assessments_col = db["careerassessments"]
-courses_col = db["courses"]
+# MongoDB setup (shared pooled client)
+assessments_col = collection("careerassessments")
+courses_col = collection("courses")
 
 CACHE_KEYS = [
     "profile_analysis",
@@ -34,12 +38,17 @@ CACHE_KEYS = [
     "corrected_level"
 ]
 
-def extract_json(text):
-    if not text:
-        raise ValueError("Gemini returned empty output.")
-
-    match = re.search(r"(?:json)?\s*(\{.*?\})\s*", text, re.DOTALL)
-    return json.loads(match.group(1)) if match else json.loads(text)
+PROFILE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "domain": {"type": "string"},
+        "level": {"type": "string", "enum": ["Beginner", "Intermediate", "Proficient"]},
+        "skills": {"type": "array", "items": {"type": "string"}},
+        "desiredRole": {"type": "string"},
+        "challenges": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["domain", "level", "skills", "desiredRole", "challenges"],
+}
 
 def analyze_with_gemini(answers: dict) -> dict:
     prompt = f"""
@@ -72,8 +81,7 @@ def analyze_with_gemini(answers: dict) -> dict:
     Weekly Availability (Q9): {answers['question9']}
     """
     try:
-        response = model.generate_content(prompt)
-        return extract_json(response.text.strip())
+        return generate_structured(model, prompt, PROFILE_SCHEMA, endpoint="recommend")
     except Exception as e:
         raise ValueError(f"Gemini analysis failed: {e}")
 
@@ -116,68 +124,86 @@ def compute_score(course, tags):
     - role relevance
     - skill overlap
     - challenge relevance
+    Accepts a raw course document or a precomputed CourseFeatures entry.
     Returns: (score, label, breakdown_dict)
     """
-    score = 0
-    breakdown = {}
-
-    # Domain match (exact: 2, partial: 1)
-    domain_score = 0
-    if course.get("domain", "").lower() == tags.get("domain", "").lower():
-        domain_score = 2
-    elif tags.get("domain", "").lower() in course.get("domain", "").lower() or course.get("domain", "").lower() in tags.get("domain", "").lower():
-        domain_score = 1
-    score += domain_score
-    breakdown["domain"] = domain_score
-
-    # Level match (exact: 2)
-    level_score = 2 if course.get("level", "").lower() == tags.get("level", "").lower() else 0
-    score += level_score
-    breakdown["level"] = level_score
-
-    # Role relevance (exact: 2, partial: 1)
-    role_score = 0
-    for role in course.get("idealRoles", []):
-        if tags.get("desiredRole", "").lower() in role.lower():
-            role_score = 2
-            break
-        elif tags.get("desiredRole", "").split(" ")[0] in role.lower():
-            role_score = 1
-    score += role_score
-    breakdown["role"] = role_score
-
-    # Skill overlap (1 per overlap, max 3)
-    skill_score = 0
-    for skill in tags.get("skills", []):
-        for course_skill in course.get("skillsCovered", []):
-            if skill.lower() in course_skill.lower():
-                skill_score += 1
-                break
-    skill_score = min(skill_score, 3)
-    score += skill_score
-    breakdown["skills"] = skill_score
-
-    # Challenge relevance (1 per overlap, max 2)
-    challenge_score = 0
-    for challenge in tags.get("challenges", []):
-        for course_challenge in course.get("challengesAddressed", []):
-            if challenge.lower() in course_challenge.lower():
-                challenge_score += 1
-                break
-    challenge_score = min(challenge_score, 2)
-    score += challenge_score
-    breakdown["challenges"] = challenge_score
-
-
-    # Label assignment
-    if score >= 7:
-        label = "Highly Recommended"
-    elif score >= 4:
-        label = "Recommended"
-    else:
-        label = "Useful"
+    features = course if isinstance(course, CourseFeatures) else CourseFeatures(course)
+    tag_features = tags if isinstance(tags, TagFeatures) else TagFeatures(tags)
+    return score_features(features, tag_features)
+
+
+def _domain_filter(index, domain):
+    """
+    Course filter for the student's domain: exact domainKey match against
+    the canonical domains the (free-form) domain maps to. Unmappable text
+    falls back to a literal case-insensitive substring match.
+    """
+    keys = domain_keys(domain)
+    if keys:
+        return index.in_domains(keys)
+    needle = (domain or "").lower()
+    return lambda f: needle in f.domain
+
+
+# Course fields returned with each recommendation. The syllabus (weeks,
+# modules, lessons) is fetched by the course pages, never stored here.
+COURSE_SUMMARY_PROJECTION = {
+    "title": 1,
+    "description": 1,
+    "level": 1,
+    "domain": 1,
+    "durationWeeks": 1,
+    "idealRoles": 1,
+    "skillsCovered": 1,
+    "challengesAddressed": 1,
+    "timeCommitmentRecommended": 1,
+    "aiInterviewEnabled": 1,
+}
+
+
+def _as_compact(entry):
+    """Compact view of a stored entry; older documents hold full course copies."""
+    if "courseId" in entry:
+        return entry
+    return {
+        "courseId": entry.get("_id"),
+        "score": entry.get("match_score", 0),
+        "label": entry.get("recommendation_label", "Useful"),
+        "breakdown": entry.get("score_breakdown", {}),
+    }
 
-    return int(score), label, breakdown  # Ensure integer score
+
+def _object_id(value):
+    if isinstance(value, ObjectId):
+        return value
+    try:
+        return ObjectId(value)
+    except Exception:
+        return None
+
+
+def hydrate_recommendations(entries):
+    """
+    Course summaries for stored recommendation entries, in order, with the
+    match_score / recommendation_label / score_breakdown fields the client
+    reads. Courses deleted since are dropped.
+    """
+    compact = [_as_compact(e) for e in entries or []]
+    ids = [oid for oid in (_object_id(e["courseId"]) for e in compact) if oid is not None]
+    if not ids:
+        return []
+    docs = {c["_id"]: c for c in courses_col.find({"_id": {"$in": ids}}, COURSE_SUMMARY_PROJECTION)}
+    courses = []
+    for entry in compact:
+        course = docs.get(_object_id(entry["courseId"]))
+        if course is None:
+            continue
+        course_with_score = serialize_mongo(course)
+        course_with_score["match_score"] = entry["score"]
+        course_with_score["recommendation_label"] = entry["label"]
+        course_with_score["score_breakdown"] = entry["breakdown"]
+        courses.append(course_with_score)
+    return courses
 
 
 def extract_video_keywords(feedback: str) -> list:
@@ -243,6 +269,15 @@ def recommend_courses(student_id: str, refresh=False):
     # FAST PATH: If already processed and not a refresh, return cached data immediately
     if not refresh and data.get("isProcessed") and "recommended_courses" in data:
         print(f"[RECO] Returning cached data for {student_id}")
+        stored = data["recommended_courses"] or []
+        if any("courseId" not in e for e in stored):
+            # One-time rewrite of legacy full course copies into references
+            assessments_col.update_one(
+                {"userId": user_object_id},
+                {"$set": {"recommended_courses": [
+                    {**c, "courseId": _object_id(c["courseId"])} for c in map(_as_compact, stored)
+                ]}}
+            )
         return {
             "isProcessed": True,
             "student_id": student_id,
@@ -251,7 +286,7 @@ def recommend_courses(student_id: str, refresh=False):
             "video_feedback": data.get("video_feedback", ""),
             "eye_contact_percent": data.get("eye_contact_percent", 0),
             "corrected_level": data.get("corrected_level", "Beginner"),
-            "recommended_courses": serialize_mongo(data["recommended_courses"])
+            "recommended_courses": hydrate_recommendations(stored)
         }
 
     # REFRESH PATH: If refresh=True or not yet processed, but has profile_analysis
@@ -264,35 +299,16 @@ def recommend_courses(student_id: str, refresh=False):
         if data.get("corrected_level"):
             tags["level"] = data["corrected_level"]
 
-        # Broaden search: fetch ALL courses to allow for "perfect fit" regardless of domain exact match
-        raw_courses = list(courses_col.find({})) 
-        scored_courses = []
-        for course in raw_courses:
-            score, label, breakdown = compute_score(course, tags)
-            # Only include if there's some relevance (score >= 3)
-            if score >= 3:
-                course_with_score = serialize_mongo(course)
-                course_with_score["match_score"] = score
-                course_with_score["recommendation_label"] = label
-                course_with_score["score_breakdown"] = breakdown
-                scored_courses.append((course_with_score, score))
-            
-        # If no courses meet the threshold, take top 5 matches
-        if not scored_courses:
-            all_scored = []
-            for course in raw_courses:
-                score, label, _ = compute_score(course, tags)
-                all_scored.append((course, score))
-            sorted_all = sorted(all_scored, key=lambda x: -x[1])[:5]
-            scored_courses = [(serialize_mongo(c), s) for c, s in sorted_all]
-
-        recommended = sorted([c for c, _ in scored_courses], key=lambda c: -c["match_score"])
-        
+        # Broaden search: consider ALL courses to allow for "perfect fit" regardless of domain exact match.
+        # Only include if there's some relevance (score >= 3); otherwise take the top 5 matches.
+        index = get_course_index(courses_col)
+        stored = refresh_selection(index, tags)
+
         # Update cache
         assessments_col.update_one(
             {"userId": user_object_id},
             {"$set": {
-                "recommended_courses": recommended,
+                "recommended_courses": stored,
                 "isProcessed": True
             }}
         )
@@ -305,74 +321,224 @@ def recommend_courses(student_id: str, refresh=False):
             "video_feedback": data.get("video_feedback"),
             "eye_contact_percent": data.get("eye_contact_percent"),
             "corrected_level": data.get("corrected_level"),
-            "recommended_courses": recommended
+            "recommended_courses": hydrate_recommendations(stored)
         }
 
-    # FULL ANALYSIS PATH: Only if profile_analysis is missing
-    print(f"[RECO] Running FULL AI analysis for {student_id}")
+    # FULL ANALYSIS PATH: Only if profile_analysis is missing.
+    # Gemini + the video pipeline take minutes, so they run as a background
+    # job and the caller polls until isProcessed is true.
     def get_answer(qn):
         ans = next((a["answer"] for a in data["answers"] if a["questionNumber"] == qn), "")
         return ", ".join(ans) if isinstance(ans, list) else ans
 
     answers = {f"question{i}": get_answer(i) for i in range(1, 10)}
-    tags = analyze_with_gemini(answers)
-
     video_url = get_answer(10)
     if not video_url:
         raise ValueError("Missing video URL for question 10")
 
-    video_analysis = analyze_career_video(video_url)
-    transcript = video_analysis.get("transcript", "")
-    eye_contact_percent = video_analysis.get("eye_contact_percent", 0)
-
-    confidence = video_analysis.get("confidence_score", 5)
-    communication = video_analysis.get("communication_clarity", 5)
-    tone = video_analysis.get("tone", "neutral")
-    corrected_level = video_analysis.get("corrected_level", "Beginner")
-    
-    video_keywords = video_analysis.get("keywords", [])
-    tags["level"] = corrected_level
-    tags["skills"] = list(set(tags.get("skills", []) + video_keywords))
-
-    video_feedback_summary = f"Confidence: {confidence}, Clarity: {communication}, Tone: {tone}"
-
-    raw_courses = list(courses_col.find({"domain": {"$regex": tags["domain"], "$options": "i"}}))
-    scored_courses = []
-    for course in raw_courses:
-        score, label, breakdown = compute_score(course, tags)
-        course_with_score = serialize_mongo(course)
-        course_with_score["match_score"] = score
-        course_with_score["recommendation_label"] = label
-        course_with_score["score_breakdown"] = breakdown
-        scored_courses.append((course_with_score, score))
+    job = start_full_analysis(user_object_id, answers, video_url) or data.get("analysisJob")
+    return {
+        "isProcessed": False,
+        "student_id": student_id,
+        "job": serialize_job(job),
+        "recommended_courses": [],
+    }
+
+
+# =========================
+#  FULL ANALYSIS JOB
+# =========================
+FULL_ANALYSIS_WORKERS = int(os.getenv("FULL_ANALYSIS_WORKERS", 2))
+# A queued/running job not updated for this long is assumed dead (e.g. the
+# worker process was restarted) and may be started again.
+FULL_ANALYSIS_STALE_SEC = int(os.getenv("FULL_ANALYSIS_STALE_SEC", 900))
+# Live jobs refresh analysisJob.updatedAt this often, however long a stage
+# (or the wait in the queue) takes. Must stay well below the stale limit.
+FULL_ANALYSIS_HEARTBEAT_SEC = int(os.getenv("FULL_ANALYSIS_HEARTBEAT_SEC", 60))
+
+JOB_STAGES = ("profile", "video", "recommendations")
+
+_job_pool = ThreadPoolExecutor(max_workers=FULL_ANALYSIS_WORKERS, thread_name_prefix="full-analysis")
+# Separate pool for the concurrent stages so jobs never wait on their own pool.
+_stage_pool = ThreadPoolExecutor(max_workers=FULL_ANALYSIS_WORKERS * 2, thread_name_prefix="analysis-stage")
+
+
+def _now():
+    return datetime.now(timezone.utc)
 
-    filtered = [c for c, score in scored_courses if score >= 3]
-    if not filtered:
-        filtered = [c for c, _ in sorted(scored_courses, key=lambda x: -x[1])[:3]]
 
-    recommended = sorted(filtered, key=lambda c: -c["match_score"])
+def serialize_job(job):
+    if not job:
+        return None
+    return {
+        "status": job.get("status"),
+        "stage": job.get("stage"),
+        "stages": job.get("stages", {}),
+        "error": job.get("error"),
+        "startedAt": job["startedAt"].isoformat() if job.get("startedAt") else None,
+        "updatedAt": job["updatedAt"].isoformat() if job.get("updatedAt") else None,
+    }
+
+
+def get_job_status(student_id: str):
+    try:
+        user_object_id = ObjectId(student_id)
+    except Exception:
+        raise ValueError("Invalid student_id format")
+    data = assessments_col.find_one({"userId": user_object_id}, {"analysisJob": 1, "isProcessed": 1})
+    if not data:
+        raise ValueError("Assessment data not found")
+    return {
+        "student_id": student_id,
+        "isProcessed": bool(data.get("isProcessed")),
+        "job": serialize_job(data.get("analysisJob")),
+    }
+
 
+def _set_job(user_object_id, **fields):
+    fields["updatedAt"] = _now()
     assessments_col.update_one(
         {"userId": user_object_id},
-        {"$set": {
-            "profile_analysis": tags,
-            "video_transcript": transcript,
-            "video_feedback": video_feedback_summary,
-            "eye_contact_percent": eye_contact_percent,
-            "corrected_level": corrected_level,
-            "recommended_courses": recommended,
-            "isProcessed": True
-        }}
+        {"$set": {f"analysisJob.{k}": v for k, v in fields.items()}},
     )
 
-    return {
-        "student_id": student_id,
-        "profile_analysis": serialize_mongo(tags),
-        "video_transcript": transcript,
-        "video_feedback": video_feedback_summary,
-        "eye_contact_percent": eye_contact_percent,
-        "corrected_level": corrected_level,
-        "recommended_courses": recommended,
-        "isProcessed": True
+
+_live_jobs = set()
+_live_jobs_lock = threading.Lock()
+_heartbeat_thread = None
+
+
+def _heartbeat():
+    while True:
+        time.sleep(FULL_ANALYSIS_HEARTBEAT_SEC)
+        with _live_jobs_lock:
+            user_ids = list(_live_jobs)
+        if not user_ids:
+            continue
+        try:
+            assessments_col.update_many(
+                {"userId": {"$in": user_ids}, "analysisJob.status": {"$in": ["queued", "running"]}},
+                {"$set": {"analysisJob.updatedAt": _now()}},
+            )
+        except Exception as e:
+            print(f"[RECO] Job heartbeat failed: {e}")
+
+
+def _track_job(user_object_id):
+    global _heartbeat_thread
+    with _live_jobs_lock:
+        _live_jobs.add(user_object_id)
+        if _heartbeat_thread is None:
+            _heartbeat_thread = threading.Thread(target=_heartbeat, name="full-analysis-heartbeat", daemon=True)
+            _heartbeat_thread.start()
+
+
+def _untrack_job(user_object_id):
+    with _live_jobs_lock:
+        _live_jobs.discard(user_object_id)
+
+
+def start_full_analysis(user_object_id, answers, video_url):
+    """
+    Claim and queue the full analysis for a student. Returns the new job
+    document, or None if a live job already exists for this student.
+    """
+    now = _now()
+    job = {
+        "status": "queued",
+        "stage": None,
+        "stages": {stage: "pending" for stage in JOB_STAGES},
+        "error": None,
+        "startedAt": now,
+        "updatedAt": now,
     }
+    claimed = assessments_col.update_one(
+        {
+            "userId": user_object_id,
+            "$or": [
+                {"analysisJob.status": {"$nin": ["queued", "running"]}},
+                {"analysisJob.updatedAt": {"$lt": now - timedelta(seconds=FULL_ANALYSIS_STALE_SEC)}},
+            ],
+        },
+        {"$set": {"analysisJob": job, "isProcessed": False}},
+    )
+    if not claimed.modified_count:
+        return None
+    print(f"[RECO] Queued FULL AI analysis for {user_object_id}")
+    _track_job(user_object_id)
+    _job_pool.submit(_run_full_analysis, user_object_id, answers, video_url)
+    return job
+
 
+def _run_stage(user_object_id, stage, fn, *args):
+    _set_job(user_object_id, **{"stage": stage, f"stages.{stage}": "running"})
+    try:
+        result = fn(*args)
+    except Exception:
+        _set_job(user_object_id, **{f"stages.{stage}": "failed"})
+        raise
+    _set_job(user_object_id, **{f"stages.{stage}": "done"})
+    return result
+
+
+def _run_full_analysis(user_object_id, answers, video_url):
+    print(f"[RECO] Running FULL AI analysis for {user_object_id}")
+    _set_job(user_object_id, status="running")
+    try:
+        # Profile analysis (Gemini) and video analysis are independent
+        profile_future = _stage_pool.submit(_run_stage, user_object_id, "profile", analyze_with_gemini, answers)
+        # The media steps go to the cpu tier like /analyze-career-video, so
+        # they never compete with io routes for this process's GIL
+        video_future = _stage_pool.submit(
+            _run_stage, user_object_id, "video", partial(analyze_career_video, run=run_cpu), video_url
+        )
+        wait([profile_future, video_future])
+        tags = profile_future.result()
+        video_analysis = video_future.result()
+
+        transcript = video_analysis.get("transcript", "")
+        eye_contact_percent = video_analysis.get("eye_contact_percent", 0)
+
+        confidence = video_analysis.get("confidence_score", 5)
+        communication = video_analysis.get("communication_clarity", 5)
+        tone = video_analysis.get("tone", "neutral")
+        corrected_level = video_analysis.get("corrected_level", "Beginner")
+
+        video_keywords = video_analysis.get("keywords", [])
+        tags["level"] = corrected_level
+        tags["skills"] = list(set(tags.get("skills", []) + video_keywords))
+        tags["domainKeys"] = domain_keys(tags.get("domain"))
+
+        video_feedback_summary = f"Confidence: {confidence}, Clarity: {communication}, Tone: {tone}"
+
+        def select():
+            index = get_course_index(courses_col)
+            return recommendation_entries(index.top_k(
+                tags, RECOMMEND_TOP_K, min_score=3, fallback=3, match=_domain_filter(index, tags["domain"]),
+            ))
+
+        stored = _run_stage(user_object_id, "recommendations", select)
+
+        now = _now()
+        assessments_col.update_one(
+            {"userId": user_object_id},
+            {"$set": {
+                "profile_analysis": tags,
+                "video_transcript": transcript,
+                "video_feedback": video_feedback_summary,
+                "eye_contact_percent": eye_contact_percent,
+                "corrected_level": corrected_level,
+                "recommended_courses": stored,
+                "isProcessed": True,
+                "analysisJob.status": "done",
+                "analysisJob.stage": None,
+                "analysisJob.updatedAt": now,
+                "analysisJob.finishedAt": now,
+            }}
+        )
+        print(f"[RECO] FULL AI analysis complete for {user_object_id}")
+    except Exception as e:
+        print(f"[RECO] FULL AI analysis failed for {user_object_id}: {e}")
+        _set_job(user_object_id, status="failed", error=str(e))
+    finally:
+        _untrack_job(user_object_id)
@@ -0,0 +1,171 @@
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from bson import ObjectId
+from pymongo import UpdateOne
+from course_index import SCORING_PROJECTION, CourseIndex, refresh_selection
+from utils.db import collection
+from utils.domains import COURSE_DOMAINS, course_domain_key, domain_key, domain_keys
+
+# Batch recompute of stored recommendations after catalog changes. Scores
+# are the same as recommend_courses(refresh=True); only students that
+# already have a profile analysis are touched.
+
+assessments_col = collection("careerassessments")
+courses_col = collection("courses")
+
+RECOMPUTE_BATCH_SIZE = int(os.getenv("RECOMPUTE_BATCH_SIZE", 500))
+RECOMPUTE_WORKERS = int(os.getenv("RECOMPUTE_WORKERS", os.cpu_count() or 2))
+# Seconds between progress lines.
+RECOMPUTE_PROGRESS_SEC = float(os.getenv("RECOMPUTE_PROGRESS_SEC", 5))
+
+CANONICAL_KEYS = {domain_key(d) for d in COURSE_DOMAINS}
+
+ASSESSMENT_PROJECTION = {"userId": 1, "profile_analysis": 1, "corrected_level": 1}
+
+
+# =========================
+#  WORKERS
+# =========================
+_worker_index = None
+
+
+def _init_worker(courses):
+    global _worker_index
+    _worker_index = CourseIndex(courses)
+
+
+def _recompute_batch(batch):
+    """[(userId, tags)] -> [(userId, recommendation entries)]"""
+    return [(user_id, refresh_selection(_worker_index, tags)) for user_id, tags in batch]
+
+
+# =========================
+#  SELECTION
+# =========================
+def domains_related(a, b):
+    """Same rule as the domain part of the score: equal or contained either way."""
+    a, b = (a or "").lower(), (b or "").lower()
+    return a in b or b in a
+
+
+def _target_domain(domain=None, course_id=None):
+    """(domain text, canonical domain keys) to target, or (None, []) for everyone."""
+    if course_id:
+        course = courses_col.find_one({"_id": ObjectId(course_id)}, {"domain": 1, "domainKey": 1})
+        if not course:
+            raise ValueError(f"Course {course_id} not found")
+        domain = course.get("domain", "")
+        key = course.get("domainKey") or course_domain_key(domain)
+        return domain, [key] if key in CANONICAL_KEYS else []
+    return domain, domain_keys(domain) if domain else []
+
+
+def _stream_profiles(domain=None, keys=None):
+    """(userId, tags) for every analysed student, optionally domain-filtered."""
+    query = {"profile_analysis": {"$exists": True, "$ne": None}}
+    if keys:
+        # Indexed exact lookup on the canonical keys; assessments analysed
+        # before domainKeys existed are matched on the text rule below.
+        query["$or"] = [
+            {"profile_analysis.domainKeys": {"$in": keys}},
+            {"profile_analysis.domainKeys": {"$exists": False}},
+        ]
+    cursor = assessments_col.find(query, ASSESSMENT_PROJECTION).batch_size(RECOMPUTE_BATCH_SIZE)
+    for doc in cursor:
+        tags = doc.get("profile_analysis") or {}
+        text_rule = domain and (not keys or "domainKeys" not in tags)
+        if text_rule and not domains_related(tags.get("domain"), domain):
+            continue
+        if doc.get("corrected_level"):
+            tags["level"] = doc["corrected_level"]
+        yield doc["userId"], tags
+
+
+def _batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _write(results):
+    if not results:
+        return 0
+    ops = [
+        UpdateOne({"userId": user_id}, {"$set": {"recommended_courses": entries, "isProcessed": True}})
+        for user_id, entries in results
+    ]
+    return assessments_col.bulk_write(ops, ordered=False).modified_count
+
+
+# =========================
+#  JOB
+# =========================
+def recompute_all(domain=None, course_id=None, workers=RECOMPUTE_WORKERS, batch_size=RECOMPUTE_BATCH_SIZE):
+    """Recompute stored recommendations for all (or domain-matched) students. Returns counts."""
+    domain, keys = _target_domain(domain, course_id)
+    courses = list(courses_col.find({}, SCORING_PROJECTION))
+    print(f"[RECOMPUTE] {len(courses)} courses, domain filter: {domain or '(none)'} {keys or ''}, workers: {workers}",
+          file=sys.stderr)
+
+    counts = {"students": 0, "modified": 0, "failed_batches": 0}
+    started = last_report = time.monotonic()
+
+    def report(force=False):
+        nonlocal last_report
+        now = time.monotonic()
+        if force or now - last_report >= RECOMPUTE_PROGRESS_SEC:
+            elapsed = now - started
+            rate = counts["students"] / elapsed if elapsed else 0.0
+            print(f"[RECOMPUTE] {counts['students']} students, {counts['modified']} updated, "
+                  f"{rate:.0f}/s, {elapsed:.1f}s elapsed", file=sys.stderr)
+            last_report = now
+
+    def collect(done):
+        for future in done:
+            try:
+                results = future.result()
+                counts["students"] += len(results)
+                counts["modified"] += _write(results)
+            except Exception as e:
+                counts["failed_batches"] += 1
+                print(f"[RECOMPUTE] Batch failed: {e}", file=sys.stderr)
+        report()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(courses,)) as pool:
+        pending = set()
+        for batch in _batches(_stream_profiles(domain, keys), batch_size):
+            # Keep only a couple of batches per worker in flight so memory
+            # stays flat however many assessments there are.
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            pending.add(pool.submit(_recompute_batch, batch))
+        collect(wait(pending)[0])
+
+    report(force=True)
+    counts["seconds"] = round(time.monotonic() - started, 2)
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recompute stored course recommendations for students.")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--course-id", type=str, help="Only students whose domain matches this course's domain")
+    target.add_argument("--domain", type=str, help="Only students whose domain matches this domain")
+    parser.add_argument("--workers", type=int, default=RECOMPUTE_WORKERS)
+    parser.add_argument("--batch-size", type=int, default=RECOMPUTE_BATCH_SIZE)
+    args = parser.parse_args()
+
+    print("📤 Recomputing recommendations...", file=sys.stderr)
+    print(json.dumps(recompute_all(
+        domain=args.domain, course_id=args.course_id, workers=args.workers, batch_size=args.batch_size,
+    )))
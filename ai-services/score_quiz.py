@@ -1,17 +1,69 @@
 import os
+import re
 import json
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 import google.generativeai as genai
 from dotenv import load_dotenv
+from utils.llm_governor import LLMUnavailable
+from utils.structured_output import generate_structured
 
 load_dotenv("../server/.env")
 
-def score_quiz_with_ai(student_answers, original_questions):
+# Unique (question, answer) pairs graded per Gemini call in batch mode.
+SCORE_BATCH_ITEMS_PER_CALL = int(os.getenv("SCORE_BATCH_ITEMS_PER_CALL", 120))
+SCORE_BATCH_CONCURRENCY = int(os.getenv("SCORE_BATCH_CONCURRENCY", 4))
+PASS_PERCENT = 60
+
+SCORE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "feedback": {"type": "array", "items": {"type": "string"}},
+        "scores": {"type": "array", "items": {"type": "integer"}},
+    },
+    "required": ["feedback", "scores"],
+}
+
+BATCH_SCORE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "results": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "id": {"type": "integer"},
+                    "feedback": {"type": "string"},
+                    "score": {"type": "integer"},
+                },
+                "required": ["id", "feedback", "score"],
+            },
+        },
+    },
+    "required": ["results"],
+}
+
+
+def _get_model():
     api_key = os.getenv("GEMINI_API_KEY")
     if not api_key:
         raise ValueError("GEMINI_API_KEY not found in .env")
 
     genai.configure(api_key=api_key)
-    model = genai.GenerativeModel("gemini-2.5-flash")
+    return genai.GenerativeModel("gemini-2.5-flash")
+
+
+def _with_totals(result):
+    scores = result.get("scores", [])
+    max_raw_score = len(scores) * 10
+    total_percent = round((sum(scores) / max_raw_score) * 100) if max_raw_score else 0
+    result["totalScore"] = total_percent
+    result["passed"] = total_percent >= PASS_PERCENT
+    return result
+
+
+def score_quiz_with_ai(student_answers, original_questions):
+    model = _get_model()
 
     prompt = f"""
 You're an intelligent quiz evaluator.
@@ -35,26 +87,11 @@ Student Answers:
 """
 
     try:
-        response = model.generate_content(prompt)
-        result_text = response.text.strip()
-
-        json_start = result_text.find("{")
-        json_end = result_text.rfind("}") + 1
-        json_data = result_text[json_start:json_end]
-        result = json.loads(json_data)
-
-        # Score normalization
-        scores = result.get("scores", [])
-        total_raw_score = sum(scores)
-        max_raw_score = len(scores) * 10
-        total_percent = round((total_raw_score / max_raw_score) * 100)
-
-        # Add total score and pass/fail
-        result["totalScore"] = total_percent
-        result["passed"] = total_percent >= 60
-
-        return result
+        result = generate_structured(model, prompt, SCORE_SCHEMA, endpoint="score-quiz")
+        return _with_totals(result)
 
+    except LLMUnavailable:
+        raise
     except Exception as e:
         print(f"[AI ERROR] {e}")
         return {
@@ -64,3 +101,147 @@ Student Answers:
             "passed": False,
             "error": str(e)
         }
+
+
+# =========================
+#  BATCH SCORING
+# =========================
+def _normalize(text):
+    return re.sub(r"\s+", " ", str(text or "")).strip().casefold()
+
+
+def _quiz_key(questions):
+    return hashlib.sha1(json.dumps(questions, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def _deterministic_grade(question, answer):
+    """
+    Grade answers that need no model: blanks, exact matches of the correct
+    answer and wrong MCQ options. Returns (feedback, score) or None.
+    """
+    if not answer:
+        return "Incorrect", 0
+    if answer == _normalize(question.get("correctAnswer")):
+        return "Correct", 10
+    if question.get("type") == "mcq" and answer in {_normalize(o) for o in question.get("options", [])}:
+        return "Incorrect", 0
+    return None
+
+
+def _grade_items_with_ai(model, items):
+    """items: [(question_dict, normalized_answer)] -> [(feedback, score)] in the same order."""
+    payload = [
+        {
+            "id": i,
+            "question": q.get("question", ""),
+            "correctAnswer": q.get("correctAnswer", ""),
+            "studentAnswer": answer,
+        }
+        for i, (q, answer) in enumerate(items)
+    ]
+    prompt = f"""
+You're an intelligent quiz evaluator.
+
+Each item below is one student's answer to one quiz question. Compare the student's answer to the correct answer
+and assign a score out of 10. Also give feedback: "Correct", "Partially correct", or "Incorrect".
+
+Return a JSON in the following format, with exactly one entry per item id:
+{{
+  "results": [ {{ "id": 0, "feedback": "Correct", "score": 10 }}, ... ]
+}}
+
+Only respond with valid JSON. No extra text or explanation.
+
+Items:
+{json.dumps(payload, indent=2)}
+"""
+    result = generate_structured(model, prompt, BATCH_SCORE_SCHEMA, endpoint="score-quiz-batch")
+
+    graded = {}
+    for entry in result.get("results", []):
+        graded[entry["id"]] = (entry["feedback"], max(0, min(10, entry["score"])))
+    return [graded.get(i, ("AI Error", 0)) for i in range(len(items))]
+
+
+def score_quiz_batch(submissions):
+    """
+    Grade many submissions at once. Submissions sharing a quiz are grouped,
+    identical answers to the same question are graded once, and only the
+    remaining free-text answers go to Gemini in a few large calls.
+
+    submissions: [{"studentAnswers": [...], "originalQuestions": [...], ...}]
+    Returns (results, stats); results[i] has the same shape as
+    score_quiz_with_ai() plus any "studentId" passed in.
+    """
+    model = None
+    quizzes = {}
+    for sub in submissions:
+        quizzes.setdefault(_quiz_key(sub["originalQuestions"]), sub["originalQuestions"])
+
+    # (quiz_key, question_index, normalized_answer) -> (feedback, score)
+    grades = {}
+    pending = []
+    for sub in submissions:
+        key = _quiz_key(sub["originalQuestions"])
+        questions = quizzes[key]
+        answers = list(sub["studentAnswers"]) + [""] * (len(questions) - len(sub["studentAnswers"]))
+        for qi, question in enumerate(questions):
+            item_key = (key, qi, _normalize(answers[qi]))
+            if item_key in grades:
+                continue
+            grade = _deterministic_grade(question, item_key[2])
+            grades[item_key] = grade
+            if grade is None:
+                pending.append(item_key)
+
+    errors = {}
+    if pending:
+        model = _get_model()
+        batches = [
+            pending[i:i + SCORE_BATCH_ITEMS_PER_CALL]
+            for i in range(0, len(pending), SCORE_BATCH_ITEMS_PER_CALL)
+        ]
+
+        def run(batch):
+            items = [(quizzes[k][qi], answer) for k, qi, answer in batch]
+            try:
+                return batch, _grade_items_with_ai(model, items), None
+            except LLMUnavailable:
+                raise
+            except Exception as e:
+                print(f"[AI ERROR] Batch scoring failed: {e}")
+                return batch, [("AI Error", 0)] * len(batch), str(e)
+
+        with ThreadPoolExecutor(max_workers=max(1, min(SCORE_BATCH_CONCURRENCY, len(batches)))) as pool:
+            for batch, results, error in pool.map(run, batches):
+                for item_key, grade in zip(batch, results):
+                    grades[item_key] = grade
+                    if error:
+                        errors[item_key] = error
+
+    results = []
+    for sub in submissions:
+        key = _quiz_key(sub["originalQuestions"])
+        questions = quizzes[key]
+        answers = list(sub["studentAnswers"]) + [""] * (len(questions) - len(sub["studentAnswers"]))
+        item_keys = [(key, qi, _normalize(answers[qi])) for qi in range(len(questions))]
+
+        result = _with_totals({
+            "feedback": [grades[k][0] for k in item_keys],
+            "scores": [grades[k][1] for k in item_keys],
+        })
+        error = next((errors[k] for k in item_keys if k in errors), None)
+        if error:
+            result["error"] = error
+        if "studentId" in sub:
+            result["studentId"] = sub["studentId"]
+        results.append(result)
+
+    stats = {
+        "submissions": len(submissions),
+        "quizzes": len(quizzes),
+        "uniqueAnswers": len(grades),
+        "gradedByAI": len(pending),
+        "llmCalls": -(-len(pending) // SCORE_BATCH_ITEMS_PER_CALL),
+    }
+    return results, stats
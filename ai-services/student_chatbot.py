@@ -2,26 +2,25 @@ from flask import Blueprint, request, jsonify
 import os
 import google.generativeai as genai
 from dotenv import load_dotenv
-from pymongo import MongoClient
 from bson import ObjectId
+from utils.db import collection
+from utils.dispatcher import route_class
+from course_suggestions import get_course_suggestions, COURSE_PROJECTION
+from utils.llm_governor import generate_content, LLMUnavailable
+from utils.chat_memory import (
+    append_turn, seed_conversation, reset_conversation, prompt_context, fold_in_background
+)
 
 # Load environment variables
 load_dotenv("../server/.env")
 
 chatbot_bp = Blueprint("chatbot", __name__)
 
-# MongoDB setup
-MONGO_CONN = os.getenv("MONGO_CONN")
-client = MongoClient(MONGO_CONN)
-try:
-    db = client.get_default_database()
-    if db is None:
-        db = client["test"]
-except:
-    db = client["test"]
-students_col = db.students
-assessments_col = db.careerassessments
-courses_col = db.courses
+# MongoDB setup (shared pooled client)
+students_col = collection("students")
+assessments_col = collection("careerassessments")
+courses_col = collection("courses")
+conversations_col = collection("chatconversations")
 
 # Gemini setup
 genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
@@ -37,16 +36,28 @@ def clean_id(doc):
     return doc
 
 @chatbot_bp.route("/generate", methods=["POST"])
+@route_class("io")
 def generate():
     try:
         data = request.get_json()
         user_id = data.get("userId")
         course_id = data.get("courseId")
         messages = data.get("messages", [])
+        message = (data.get("message") or "").strip()
+        new_conversation = bool(data.get("newConversation"))
 
         if not user_id or not course_id:
             return jsonify({"reply": "Missing userId or courseId"}), 400
 
+        # Conversation state lives server-side. Legacy clients still upload
+        # the whole history; only its newest message is new, and a
+        # one-message history means a fresh chat window.
+        if not message and messages:
+            message = (messages[-1].get("text") or "").strip()
+            new_conversation = len(messages) <= 1
+        if not message:
+            return jsonify({"reply": "Missing message"}), 400
+
         try:
             user_obj_id = ObjectId(user_id)
             course_obj_id = ObjectId(course_id)
@@ -90,10 +101,13 @@ def generate():
 {modules_formatted or 'No modules found.'}
 """.strip()
 
-        chat_history = "\n".join([
-            f"**User:** {m['text']}" if m["sender"] == "user" else f"**AI:** {m['text']}"
-            for m in messages[-10:]
-        ])
+        conv_filter = {"userId": user_obj_id, "courseId": course_obj_id}
+        if new_conversation:
+            reset_conversation(conversations_col, user_obj_id, course_obj_id)
+        elif len(messages) > 1 and not conversations_col.count_documents(conv_filter, limit=1):
+            seed_conversation(conversations_col, user_obj_id, course_obj_id, messages[:-1])
+        conversation = append_turn(conversations_col, user_obj_id, course_obj_id, "user", message)
+        conversation_summary, chat_history = prompt_context(conversation)
 
         if level == "Beginner":
             tone = "Use simple, friendly language. Avoid jargon."
@@ -135,23 +149,32 @@ You are an expert AI tutor helping a student understand their course.
   - Use `•` or `-` for bullet points (with line breaks).
   - Use triple backticks ``` for code blocks if needed.
 
+### Earlier in this conversation (summary):
+{conversation_summary or 'Nothing yet.'}
+
 ### Recent Chat:
 {chat_history}
 
 Respond to the student's latest query:
 """.strip()
 
-        response = model.generate_content(prompt)
+        response = generate_content(model, prompt, endpoint="generate")
         reply = response.text.strip()
 
+        conversation = append_turn(conversations_col, user_obj_id, course_obj_id, "bot", reply)
+        fold_in_background(conversations_col, model, conversation)
+
         return jsonify({ "reply": reply })
 
+    except LLMUnavailable:
+        return jsonify({"reply": "The AI tutor is busy right now. Please try again in a moment."}), 503
     except Exception as e:
         print("Error:", e)
         return jsonify({"reply": "Sorry, an error occurred while processing your request."}), 500
 
 
 @chatbot_bp.route("/suggestions", methods=["POST"])
+@route_class("io")
 def suggest_questions():
     try:
         data = request.get_json()
@@ -161,36 +184,19 @@ def suggest_questions():
         if not user_id or not course_id:
             return jsonify({"error": "Missing userId or courseId"}), 400
 
-        obj_id = ObjectId(user_id)
-        course_obj_id = ObjectId(course_id)
-
-        student = students_col.find_one({"user": obj_id})
-        assessment = assessments_col.find_one({"userId": obj_id})
-        course = courses_col.find_one({"_id": course_obj_id})
+        try:
+            ObjectId(user_id)
+            course_obj_id = ObjectId(course_id)
+        except Exception:
+            return jsonify({"error": "Invalid userId or courseId"}), 400
 
-        if not student or not assessment or not course:
+        # Suggestions only depend on the course, so they are stored per
+        # course version instead of being generated on every chat open.
+        course = courses_col.find_one({"_id": course_obj_id}, COURSE_PROJECTION)
+        if not course:
             return jsonify({"error": "Data not found"}), 404
 
-        course_title = course.get("title", "")
-        course_desc = course.get("description", "")
-        modules = [mod["title"] for week in course.get("weeks", []) for mod in week.get("modules", [])]
-        modules_text = ", ".join(modules[:5])
-
-        prompt = f"""
-You are a course assistant for the course: **{course_title}**
-
-Based on the course description and modules, generate 3–5 short **starter questions** a student might ask.
-
-### Course Overview
-**Description:** {course_desc}  
-**Modules:** {modules_text}
-
-Return the questions as a clean bullet list using `•`. Do not include any explanation or intro.
-"""
-
-        response = model.generate_content(prompt)
-        raw = response.text.strip().split("\n")
-        questions = [q.lstrip("-•* ").strip() for q in raw if q.strip()]
+        questions = get_course_suggestions(course)
 
         return jsonify({ "questions": questions[:5] })
 
@@ -0,0 +1,169 @@
+import os
+import threading
+from datetime import datetime, timezone
+from pymongo import ReturnDocument
+from utils.llm_governor import generate_content
+from utils.llm_instrumentation import estimate_tokens
+
+# Token budget for verbatim recent turns in the prompt. Anything older is
+# folded into the running summary.
+CHAT_RECENT_TOKEN_BUDGET = int(os.getenv("CHAT_RECENT_TOKEN_BUDGET", 1500))
+# Keep at least this many recent turns verbatim even if they are long.
+CHAT_MIN_RECENT_TURNS = int(os.getenv("CHAT_MIN_RECENT_TURNS", 2))
+# Upper bound for the running summary itself.
+CHAT_SUMMARY_MAX_TOKENS = int(os.getenv("CHAT_SUMMARY_MAX_TOKENS", 400))
+
+# Conversations with a summarization currently running in this process.
+_folding = set()
+_folding_lock = threading.Lock()
+_indexed = False
+
+
+def _conversation_filter(user_id, course_id):
+    return {"userId": user_id, "courseId": course_id}
+
+
+def _ensure_index(conversations_col):
+    global _indexed
+    if not _indexed:
+        conversations_col.create_index([("userId", 1), ("courseId", 1)], unique=True)
+        _indexed = True
+
+
+def reset_conversation(conversations_col, user_id, course_id):
+    conversations_col.delete_one(_conversation_filter(user_id, course_id))
+
+
+def append_turn(conversations_col, user_id, course_id, sender, text):
+    """
+    Append one turn and return the updated conversation document. Turns get
+    a monotonically increasing seq so folding can drop exactly the turns it
+    summarized even while new ones are being appended.
+    """
+    _ensure_index(conversations_col)
+    return conversations_col.find_one_and_update(
+        _conversation_filter(user_id, course_id),
+        [
+            {"$set": {
+                "userId": user_id,
+                "courseId": course_id,
+                "summary": {"$ifNull": ["$summary", ""]},
+                "nextSeq": {"$add": [{"$ifNull": ["$nextSeq", 0]}, 1]},
+                "turns": {"$concatArrays": [
+                    {"$ifNull": ["$turns", []]},
+                    [{
+                        "seq": {"$ifNull": ["$nextSeq", 0]},
+                        # $literal: user text starting with "$" must not be
+                        # read as a field path inside the update pipeline.
+                        "sender": {"$literal": sender},
+                        "text": {"$literal": text},
+                        "tokens": estimate_tokens(text),
+                    }],
+                ]},
+                "updatedAt": datetime.now(timezone.utc),
+            }},
+        ],
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def seed_conversation(conversations_col, user_id, course_id, messages):
+    """Start server-side state from a client-supplied history."""
+    conv = None
+    for m in messages:
+        conv = append_turn(
+            conversations_col, user_id, course_id,
+            "user" if m.get("sender") == "user" else "bot", m.get("text", ""),
+        )
+    return conv
+
+
+def split_turns(turns, budget=CHAT_RECENT_TOKEN_BUDGET):
+    """Split turns into (to_fold, recent) so recent fits the token budget."""
+    recent, used = [], 0
+    for turn in reversed(turns):
+        tokens = turn.get("tokens") or estimate_tokens(turn.get("text", ""))
+        if len(recent) >= CHAT_MIN_RECENT_TURNS and used + tokens > budget:
+            break
+        recent.append(turn)
+        used += tokens
+    recent.reverse()
+    return turns[:len(turns) - len(recent)], recent
+
+
+def format_turns(turns):
+    return "\n".join(
+        f"**User:** {t['text']}" if t["sender"] == "user" else f"**AI:** {t['text']}"
+        for t in turns
+    )
+
+
+def prompt_context(conversation):
+    """
+    (summary, recent_history_text) for the prompt. Bounded even if a fold
+    is still pending: turns past the budget are simply left out until the
+    summary catches up.
+    """
+    _, recent = split_turns(conversation.get("turns", []))
+    return conversation.get("summary", ""), format_turns(recent)
+
+
+def _summarize(model, summary, turns):
+    prompt = f"""
+You maintain a running summary of a tutoring chat between a student and an AI tutor.
+Update the summary with the new exchanges below. Keep what the student asked about, what was explained,
+and anything the student struggled with or still needs. Drop pleasantries and formatting.
+Keep it under {CHAT_SUMMARY_MAX_TOKENS * 3 // 4} words.
+
+### Current summary
+{summary or "(empty)"}
+
+### New exchanges
+{format_turns(turns)}
+
+Return only the updated summary.
+""".strip()
+    response = generate_content(model, prompt, endpoint="chat-summary")
+    return response.text.strip()
+
+
+def fold_conversation(conversations_col, model, conversation):
+    """Fold turns that no longer fit the budget into the running summary."""
+    to_fold, _ = split_turns(conversation.get("turns", []))
+    if not to_fold:
+        return False
+
+    summary = _summarize(model, conversation.get("summary", ""), to_fold)
+    last_seq = to_fold[-1]["seq"]
+    conversations_col.update_one(
+        {"_id": conversation["_id"]},
+        {
+            "$set": {"summary": summary, "summarizedThrough": last_seq},
+            "$pull": {"turns": {"seq": {"$lte": last_seq}}},
+        },
+    )
+    return True
+
+
+def _fold_worker(conversations_col, model, conversation):
+    try:
+        fold_conversation(conversations_col, model, conversation)
+    except Exception as e:
+        print(f"[CHAT] Summarization failed for {conversation['_id']}: {e}")
+    finally:
+        with _folding_lock:
+            _folding.discard(conversation["_id"])
+
+
+def fold_in_background(conversations_col, model, conversation):
+    if not split_turns(conversation.get("turns", []))[0]:
+        return False
+    with _folding_lock:
+        if conversation["_id"] in _folding:
+            return False
+        _folding.add(conversation["_id"])
+    threading.Thread(
+        target=_fold_worker, args=(conversations_col, model, conversation), daemon=True
+    ).start()
+    return True
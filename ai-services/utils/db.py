@@ -0,0 +1,196 @@
+import os
+import threading
+from pymongo import MongoClient, monitoring
+from pymongo.errors import ConfigurationError
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv("../server/.env")
+
+# =========================
+#  CONFIG
+# =========================
+MONGO_CONN = os.getenv("MONGO_CONN")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 50))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", 0))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", 60000))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", 5000))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", 30000))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", 5000))
+
+FALLBACK_DB_NAME = "test"
+
+
+# =========================
+#  POOL STATISTICS
+# =========================
+class _PoolStats(monitoring.ConnectionPoolListener):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.open = 0
+            self.in_use = 0
+            self.created = 0
+            self.closed = 0
+            self.checkouts = 0
+            self.checkout_failures = 0
+            self.pool_cleared = 0
+
+    def _bump(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._bump(pool_cleared=1)
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._bump(open=1, created=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._bump(open=-1, closed=1)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._bump(checkout_failures=1)
+
+    def connection_checked_out(self, event):
+        self._bump(in_use=1, checkouts=1)
+
+    def connection_checked_in(self, event):
+        self._bump(in_use=-1)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "open": self.open,
+                "in_use": self.in_use,
+                "created": self.created,
+                "closed": self.closed,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "pool_cleared": self.pool_cleared,
+            }
+
+
+_stats = _PoolStats()
+
+
+# =========================
+#  CLIENT
+# =========================
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def _reset_after_fork():
+    # MongoClient is not fork-safe: a child must never reuse the parent's
+    # sockets, so forget the inherited client and build a fresh one lazily.
+    global _client, _client_pid, _client_lock
+    _client = None
+    _client_pid = None
+    _client_lock = threading.Lock()
+    _stats.reset()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_client():
+    """The process-wide pooled MongoClient, created on first use."""
+    global _client, _client_pid
+    if _client is not None and _client_pid == os.getpid():
+        return _client
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            _client = MongoClient(
+                MONGO_CONN,
+                maxPoolSize=MONGO_MAX_POOL_SIZE,
+                minPoolSize=MONGO_MIN_POOL_SIZE,
+                maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+                connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+                serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+                socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+                waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+                event_listeners=[_stats],
+            )
+            _client_pid = os.getpid()
+    return _client
+
+
+def get_db(name=None):
+    """Named database, or the one in MONGO_CONN (falling back to "test")."""
+    client = get_client()
+    if name:
+        return client[name]
+    try:
+        db = client.get_default_database()
+        if db is None:
+            db = client[FALLBACK_DB_NAME]
+    except ConfigurationError:
+        db = client[FALLBACK_DB_NAME]
+    return db
+
+
+class _LazyCollection:
+    """
+    Module-level stand-in for a Collection. It resolves against the current
+    process's client on every use, so collections declared at import time
+    stay valid after gunicorn forks workers.
+    """
+
+    def __init__(self, name, db_name=None):
+        self._name = name
+        self._db_name = db_name
+
+    def _resolve(self):
+        return get_db(self._db_name)[self._name]
+
+    def __getattr__(self, attr):
+        return getattr(self._resolve(), attr)
+
+    def __repr__(self):
+        return f"<collection {self._db_name or 'default'}.{self._name}>"
+
+
+def collection(name, db_name=None):
+    return _LazyCollection(name, db_name)
+
+
+def ping():
+    """(ok, error) for a round trip to the server; used by readiness checks."""
+    try:
+        get_client().admin.command("ping")
+        return True, None
+    except Exception as e:
+        return False, str(e)
+
+
+def pool_stats():
+    return {
+        "pid": os.getpid(),
+        "connected": _client is not None and _client_pid == os.getpid(),
+        "max_pool_size": MONGO_MAX_POOL_SIZE,
+        "min_pool_size": MONGO_MIN_POOL_SIZE,
+        **_stats.snapshot(),
+    }
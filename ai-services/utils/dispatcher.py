@@ -0,0 +1,352 @@
+import os
+import sys
+import zlib
+import time
+import threading
+import multiprocessing
+from functools import wraps
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from flask import jsonify
+from utils import metrics, model_registry
+
+# Routes are split into classes so that one Whisper job cannot starve the
+# chatbot:
+#   io    - LLM and Mongo bound (chatbot, recommendations, quizzes). Runs on
+#           the server's request threads, bounded by a semaphore.
+#   cpu   - long media jobs (Whisper, video analysis). The media steps run
+#           in a process pool so they never hold the GIL of the
+#           request-serving process; their Gemini calls stay in the request
+#           process, where the LLM governor's limits and metrics live.
+#   frame - proctoring frames. Runs on single-process shards picked by
+#           session id, so each session's calibration state stays in one
+#           worker.
+# Each class has its own in-flight limit; requests over the limit wait up to
+# DISPATCH_QUEUE_TIMEOUT and then get a 503 with Retry-After.
+
+# =========================
+#  CONFIG
+# =========================
+ROUTE_CLASS_NAMES = ("io", "cpu", "frame")
+# Classes served by this deployment, e.g. ROUTE_CLASSES=io for a chatbot-only
+# service and ROUTE_CLASSES=cpu,frame for the media one. Others answer 404.
+ROUTE_CLASSES = {
+    name.strip() for name in os.getenv("ROUTE_CLASSES", ",".join(ROUTE_CLASS_NAMES)).split(",") if name.strip()
+}
+# "process" runs cpu/frame work in worker processes; "inline" runs it on the
+# request thread (local development, or platforms without worker processes).
+CPU_EXECUTOR = os.getenv("CPU_EXECUTOR", "process")
+# Every cpu worker loads its own copy of Whisper (and torch): about 0.5-1 GB
+# of RSS per worker with the default "base" model, several GB with the large
+# ones. Keep this small and raise it only where memory allows.
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", min(2, os.cpu_count() or 1)))
+# torch/OpenMP threads per cpu worker; together the workers use every core
+# once instead of each one starting a thread per core.
+CPU_WORKER_THREADS = int(os.getenv("CPU_WORKER_THREADS", max(1, (os.cpu_count() or 1) // max(1, CPU_WORKERS))))
+FRAME_SHARDS = int(os.getenv("FRAME_SHARDS", 2))
+
+ROUTE_CLASS_LIMITS = {
+    "io": int(os.getenv("IO_MAX_IN_FLIGHT", 32)),
+    "cpu": int(os.getenv("CPU_MAX_IN_FLIGHT", CPU_WORKERS * 2)),
+    "frame": int(os.getenv("FRAME_MAX_IN_FLIGHT", FRAME_SHARDS * 8)),
+}
+DISPATCH_QUEUE_TIMEOUT = float(os.getenv("DISPATCH_QUEUE_TIMEOUT", 5))
+
+# Models each tier uses, so warmup loads them in the processes doing the work
+TIER_MODELS = {
+    "cpu": ("whisper", "moviepy", "mediapipe", "cv2"),
+    "frame": ("face_live", "cv2"),
+}
+
+
+class Overloaded(Exception):
+    """No free slot for the route class within DISPATCH_QUEUE_TIMEOUT."""
+
+    def __init__(self, route_class, retry_after=1):
+        super().__init__(f"Server busy: too many concurrent '{route_class}' requests")
+        self.route_class = route_class
+        self.retry_after = retry_after
+
+
+# =========================
+#  METRICS
+# =========================
+_in_flight = metrics.gauge("dispatch_in_flight", "Requests holding a route-class slot")
+_rejections = metrics.counter("dispatch_rejections_total", "Requests rejected for lack of a route-class slot")
+_queue_wait = metrics.histogram("dispatch_queue_wait_seconds", "Time spent waiting for a route-class slot")
+
+
+# =========================
+#  ROUTE CLASSES
+# =========================
+_slots = {name: threading.BoundedSemaphore(limit) for name, limit in ROUTE_CLASS_LIMITS.items()}
+
+
+def serves(route_class):
+    return route_class in ROUTE_CLASSES
+
+
+def load(name):
+    """In-flight requests of a route class as a fraction of its limit."""
+    return _in_flight.value(route_class=name) / max(1, ROUTE_CLASS_LIMITS[name])
+
+
+def route_class(name):
+    """
+    Mark a view as belonging to a route class: it answers 404 on deployments
+    that don't serve the class and runs under the class's in-flight limit.
+    """
+    if name not in _slots:
+        raise ValueError(f"Unknown route class: {name}")
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if name not in ROUTE_CLASSES:
+                return jsonify({"error": f"This deployment does not serve '{name}' routes"}), 404
+
+            started = time.monotonic()
+            acquired = _slots[name].acquire(timeout=DISPATCH_QUEUE_TIMEOUT)
+            _queue_wait.observe(time.monotonic() - started, route_class=name)
+            if not acquired:
+                _rejections.inc(route_class=name)
+                raise Overloaded(name)
+
+            _in_flight.inc(route_class=name)
+            try:
+                return view(*args, **kwargs)
+            finally:
+                _in_flight.dec(route_class=name)
+                _slots[name].release()
+
+        wrapper.route_class = name
+        return wrapper
+
+    return decorator
+
+
+# =========================
+#  EXECUTORS
+# =========================
+_pool_lock = threading.Lock()
+_cpu_pool = None
+_frame_shards = {}
+
+
+def _mp_context():
+    # Fork keeps already-imported models and patched modules; utils.db
+    # resets the Mongo client in the child on its own. Workers never make
+    # gRPC (Gemini) calls, so the parent's gRPC state is never used after fork.
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return multiprocessing.get_context()
+
+
+def _tier_models(tier, names):
+    return [name for name in names if name in TIER_MODELS[tier]]
+
+
+def _limit_threads(threads):
+    # Read by torch/OpenMP on import; a torch inherited through fork is
+    # already initialised and is told directly.
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(threads)
+
+
+def _init_worker(names, threads):
+    if threads:
+        _limit_threads(threads)
+    if names:
+        model_registry.warmup(names)
+
+
+def _new_pool(tier, workers):
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=_mp_context(),
+        initializer=_init_worker,
+        initargs=(
+            _tier_models(tier, model_registry.WARMUP_MODELS),
+            CPU_WORKER_THREADS if tier == "cpu" else None,
+        ),
+    )
+
+
+def _get_cpu_pool():
+    global _cpu_pool
+    with _pool_lock:
+        if _cpu_pool is None:
+            _cpu_pool = _new_pool("cpu", CPU_WORKERS)
+        return _cpu_pool
+
+
+def frame_shard(session_id):
+    return zlib.crc32(str(session_id).encode("utf-8")) % max(1, FRAME_SHARDS)
+
+
+def _get_frame_pool(shard):
+    with _pool_lock:
+        pool = _frame_shards.get(shard)
+        if pool is None:
+            pool = _frame_shards[shard] = _new_pool("frame", 1)
+        return pool
+
+
+def _discard(pool):
+    global _cpu_pool
+    with _pool_lock:
+        if _cpu_pool is pool:
+            _cpu_pool = None
+        for shard, p in list(_frame_shards.items()):
+            if p is pool:
+                del _frame_shards[shard]
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _run(pool, fn, args, kwargs):
+    try:
+        return pool.submit(fn, *args, **kwargs).result()
+    except BrokenProcessPool:
+        # A worker died (OOM, native crash): start a fresh pool next time
+        print(f"[DISPATCH] Worker process died while running {fn.__name__}; restarting pool")
+        _discard(pool)
+        raise
+
+
+def run_cpu(fn, *args, **kwargs):
+    """
+    Run `fn` on the cpu tier and wait for its result. `fn` must be picklable
+    and must not call the LLM: the governor's limits are per process.
+    """
+    if CPU_EXECUTOR == "inline":
+        return fn(*args, **kwargs)
+    return _run(_get_cpu_pool(), fn, args, kwargs)
+
+
+def run_frame(session_id, fn, *args, **kwargs):
+    """Run `fn` on the frame shard that owns `session_id`."""
+    if CPU_EXECUTOR == "inline":
+        return fn(*args, **kwargs)
+    return _run(_get_frame_pool(frame_shard(session_id)), fn, args, kwargs)
+
+
+_warmup_status = {"models": [], "state": "idle", "seconds": None, "error": None, "tiers": {}}
+
+
+def on_frame_shards(fn, timeout=1.0):
+    """
+    Results of `fn()` from every started frame shard (or this process when
+    inline). Shards that don't answer within `timeout` are left out.
+    """
+    if CPU_EXECUTOR == "inline":
+        return [fn()]
+    with _pool_lock:
+        pools = list(_frame_shards.values())
+    futures = [pool.submit(fn) for pool in pools]
+    results = []
+    for future in futures:
+        try:
+            results.append(future.result(timeout=timeout))
+        except Exception:
+            pass
+    return results
+
+
+def warmup(names=None):
+    """
+    Preload models where they are used: cpu-tier models in the cpu pool,
+    frame models on every frame shard, anything else in this process.
+    Returns model states keyed by tier.
+    """
+    names = model_registry.WARMUP_MODELS if names is None else list(names)
+    model_registry.check_names(names)
+    started = time.monotonic()
+    _warmup_status.update(models=names, state="running", seconds=None, error=None)
+    try:
+        plan = _warmup_plan(names)
+        result = _warmup(plan)
+    except Exception as e:
+        _warmup_status.update(state="failed", error=str(e))
+        raise
+    seconds = round(time.monotonic() - started, 3)
+    # model_registry.warmup logs load errors and carries on; a model that
+    # didn't load in some process fails the warmup as a whole
+    failed = _failed_models(plan, result)
+    if failed:
+        _warmup_status.update(
+            state="failed", seconds=seconds, tiers=result, error=f"Failed to load: {', '.join(failed)}"
+        )
+    else:
+        _warmup_status.update(state="done", seconds=seconds, tiers=result)
+    return result
+
+
+def _failed_models(plan, result):
+    failed = []
+    for tier, names in plan.items():
+        processes = result.get(tier, [])
+        for states in processes if isinstance(processes, list) else [processes]:
+            failed += [
+                f"{name} ({tier})" for name in names
+                if states["models"].get(name, {}).get("state") != model_registry.READY
+            ]
+    return sorted(set(failed))
+
+
+def warmup_status():
+    return dict(_warmup_status)
+
+
+def _warmup_plan(names):
+    """Which process tier loads each model."""
+    if CPU_EXECUTOR == "inline":
+        return {"main": list(names)}
+    plan = {
+        "cpu": _tier_models("cpu", names) if serves("cpu") else [],
+        "frame": _tier_models("frame", names) if serves("frame") else [],
+        # Models of tiers this deployment doesn't serve are skipped
+        "main": [name for name in names if not any(name in models for models in TIER_MODELS.values())],
+    }
+    return {tier: models for tier, models in plan.items() if models or tier == "main"}
+
+
+def _warmup(plan):
+    result = {}
+    if plan.get("cpu"):
+        # New workers warm themselves through _init_worker; this waits for one
+        result["cpu"] = run_cpu(model_registry.warmup, plan["cpu"])
+    if plan.get("frame"):
+        result["frame"] = [
+            _run(_get_frame_pool(shard), model_registry.warmup, (plan["frame"],), {})
+            for shard in range(max(1, FRAME_SHARDS))
+        ]
+    result["main"] = model_registry.warmup(plan["main"])
+    return result
+
+
+def stats():
+    return {
+        "route_classes": sorted(ROUTE_CLASSES),
+        "executor": CPU_EXECUTOR,
+        "cpu_workers": CPU_WORKERS,
+        "cpu_worker_threads": CPU_WORKER_THREADS,
+        "frame_shards": FRAME_SHARDS,
+        "limits": dict(ROUTE_CLASS_LIMITS),
+        "in_flight": {name: _in_flight.value(route_class=name) for name in ROUTE_CLASS_NAMES},
+        "rejections": {name: _rejections.value(route_class=name) for name in ROUTE_CLASS_NAMES},
+        "frame_shards_started": len(_frame_shards),
+        "cpu_pool_started": _cpu_pool is not None,
+    }
+
+
+def shutdown():
+    global _cpu_pool
+    with _pool_lock:
+        pools = [p for p in [_cpu_pool, *_frame_shards.values()] if p is not None]
+        _cpu_pool = None
+        _frame_shards.clear()
+    for pool in pools:
+        pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,61 @@
+import os
+import re
+import json
+
+# Canonical course domains. A course's domainKey is the lower-cased
+# canonical name; server/models/Course.js derives the same key on save.
+# Both read copies of shared/course_domains.json (regenerate them with
+# shared/sync_course_domains.py) and must match text the same way.
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "course_domains.json")) as _f:
+    _TABLE = json.load(_f)["domains"]
+
+COURSE_DOMAINS = [d["name"] for d in _TABLE]
+DOMAIN_KEYWORDS = {d["name"]: tuple(d["keywords"]) for d in _TABLE}
+DOMAIN_ACRONYMS = {d["name"]: tuple(d.get("acronyms", ())) for d in _TABLE}
+
+
+def _whole(phrase):
+    # ASCII word boundaries, spelled out so they behave like the JS side
+    words = r"\s+".join(re.escape(w) for w in phrase.split())
+    return re.compile(rf"(?<![A-Za-z0-9]){words}(?![A-Za-z0-9])")
+
+
+_KEYWORD_PATTERNS = {name: [_whole(k) for k in words] for name, words in DOMAIN_KEYWORDS.items()}
+_ACRONYM_PATTERNS = {name: [_whole(a) for a in words] for name, words in DOMAIN_ACRONYMS.items()}
+_CANONICAL = {d.lower(): d for d in COURSE_DOMAINS}
+
+
+def domain_key(domain):
+    """Key for a canonical domain name (or any string): trimmed, lower-cased."""
+    return (domain or "").strip().lower()
+
+
+def domain_keys(text):
+    """
+    Canonical domain keys for free-form text (e.g. LLM output), best match
+    first. "Health Tech" gives both healthcare and technology; text with no
+    recognizable domain gives [].
+    """
+    normalized = domain_key(text)
+    if not normalized:
+        return []
+    if normalized in _CANONICAL:
+        return [normalized]
+
+    # Keywords match the lower-cased text, acronyms the text as written
+    text = text.strip()
+    hits = []
+    for order, domain in enumerate(COURSE_DOMAINS):
+        count = (
+            sum(1 for pattern in _KEYWORD_PATTERNS[domain] if pattern.search(normalized))
+            + sum(1 for pattern in _ACRONYM_PATTERNS[domain] if pattern.search(text))
+        )
+        if count:
+            hits.append((-count, order, domain_key(domain)))
+    return [key for _, _, key in sorted(hits)]
+
+
+def course_domain_key(domain):
+    """domainKey stored on a course: best canonical match, else the text itself."""
+    keys = domain_keys(domain)
+    return keys[0] if keys else domain_key(domain)
@@ -0,0 +1,124 @@
+import re
+import hashlib
+from pymongo import ReturnDocument
+from pymongo.errors import OperationFailure
+
+# Repository for interviewsessions. Each session keeps questionHashes, a set
+# of normalized question hashes, so the duplicate check for a new question
+# is a set lookup rather than a scan of the question arrays.
+
+QUESTION_ARRAYS = ("questions", "answers", "skippedQuestions", "notAttemptedQuestions")
+
+SESSION_PROJECTION = {
+    "lastGeneratedQuestion": 1,
+    "questionHashes": 1,
+    # Only read for sessions created before questionHashes existed
+    **{f"{arr}.question": 1 for arr in QUESTION_ARRAYS},
+}
+
+_WS_RE = re.compile(r"\s+")
+_indexed = set()
+
+
+def question_hash(question):
+    normalized = _WS_RE.sub(" ", (question or "").strip().lower())
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:16]
+
+
+class QuestionHashes:
+    """`question in hashes` for raw question text, backed by a hash set."""
+
+    def __init__(self, hashes=()):
+        self._hashes = set(hashes)
+
+    def __contains__(self, question):
+        return question_hash(question) in self._hashes
+
+    def __len__(self):
+        return len(self._hashes)
+
+
+def _ensure_index(sessions_col):
+    key = repr(sessions_col)
+    if key in _indexed:
+        return
+    try:
+        sessions_col.create_index([("student", 1), ("course", 1)], unique=True)
+    except OperationFailure as e:
+        # Existing duplicate (student, course) sessions: keep a plain index
+        print(f"[INTERVIEW] Unique session index not created ({e}); using a non-unique one")
+        sessions_col.create_index([("student", 1), ("course", 1)])
+    _indexed.add(key)
+
+
+def _new_session(student_id, course_id):
+    return {
+        "student": student_id,
+        "course": course_id,
+        "questions": [],
+        "answers": [],
+        "skippedQuestions": [],
+        "notAttemptedQuestions": [],
+        "timestamps": [],
+        "status": "in-progress",
+        "lastGeneratedQuestion": {"index": 0, "question": ""},
+        "questionHashes": [],
+    }
+
+
+def open_session(sessions_col, student_id, course_id):
+    """
+    Existing session for (student, course), created if missing - one round
+    trip. Returns (session, QuestionHashes of every question asked so far).
+    """
+    _ensure_index(sessions_col)
+    session = sessions_col.find_one_and_update(
+        {"student": student_id, "course": course_id},
+        {"$setOnInsert": _new_session(student_id, course_id)},
+        projection=SESSION_PROJECTION,
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+
+    if "questionHashes" not in session:
+        # One-time backfill for sessions created before questionHashes
+        hashes = sorted({
+            question_hash(q.get("question"))
+            for arr in QUESTION_ARRAYS
+            for q in session.get(arr, [])
+            if (q.get("question") or "").strip()
+        })
+        sessions_col.update_one({"_id": session["_id"]}, {"$addToSet": {"questionHashes": {"$each": hashes}}})
+        session["questionHashes"] = hashes
+
+    return session, QuestionHashes(session["questionHashes"])
+
+
+def record_question(sessions_col, session_id, index, question):
+    """Make `question` the session's current one and remember its hash."""
+    sessions_col.update_one(
+        {"_id": session_id},
+        {
+            "$set": {"lastGeneratedQuestion": {"index": index, "question": question}},
+            "$addToSet": {"questionHashes": question_hash(question)},
+        },
+    )
+
+
+def start_session(sessions_col, student_id, course_id, question):
+    """(Re)start the session for (student, course) with its first question."""
+    _ensure_index(sessions_col)
+    sessions_col.update_one(
+        {"student": student_id, "course": course_id},
+        {"$set": {
+            "course": course_id,
+            "questions": [{"index": 0, "question": question}],
+            "answers": [],
+            "skippedQuestions": [],
+            "notAttemptedQuestions": [],
+            "lastGeneratedQuestion": {"index": 0, "question": question},
+            "status": "in-progress",
+            "questionHashes": [question_hash(question)],
+        }},
+        upsert=True,
+    )
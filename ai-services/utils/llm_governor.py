@@ -0,0 +1,245 @@
+import os
+import time
+import random
+import threading
+from contextlib import contextmanager
+from google.api_core import exceptions as gexc
+from utils import metrics
+from utils.llm_instrumentation import record_call, summary as llm_summary
+
+# =========================
+#  CONFIG
+# =========================
+# Global cap on in-flight Gemini calls for this process.
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 8))
+# Default per-endpoint cap; override individual endpoints with
+# LLM_ENDPOINT_LIMITS="score-quiz=2,generate=6".
+LLM_ENDPOINT_CONCURRENCY = int(os.getenv("LLM_ENDPOINT_CONCURRENCY", 4))
+LLM_ENDPOINT_LIMITS = {
+    name.strip(): int(limit)
+    for name, _, limit in (
+        item.partition("=") for item in os.getenv("LLM_ENDPOINT_LIMITS", "").split(",") if "=" in item
+    )
+}
+# How long a caller may wait for a free slot before being rejected.
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", 15))
+
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 3))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", 0.5))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", 8))
+
+# Consecutive failures before the breaker opens, and how long it stays open.
+LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", 5))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", 30))
+
+# Errors worth retrying: rate limits, overload and transient server faults.
+RETRYABLE_ERRORS = (
+    gexc.ResourceExhausted,
+    gexc.TooManyRequests,
+    gexc.ServiceUnavailable,
+    gexc.InternalServerError,
+    gexc.DeadlineExceeded,
+    gexc.GatewayTimeout,
+    ConnectionError,
+    TimeoutError,
+)
+
+
+class LLMUnavailable(Exception):
+    """Raised without calling Gemini when the breaker is open or no slot frees up in time."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# =========================
+#  METRICS
+# =========================
+_calls = metrics.counter("llm_calls_total", "Gemini calls by endpoint and outcome")
+_rejections = metrics.counter("llm_rejections_total", "Calls rejected before reaching Gemini")
+_retries = metrics.counter("llm_retries_total", "Retried Gemini attempts")
+_queue_depth = metrics.gauge("llm_queue_depth", "Callers waiting for a concurrency slot")
+_in_flight = metrics.gauge("llm_in_flight", "Gemini calls currently running")
+_breaker_state = metrics.gauge("llm_breaker_open", "1 while the circuit breaker is open")
+_queue_wait = metrics.histogram("llm_queue_wait_seconds", "Time spent waiting for a concurrency slot")
+
+
+# =========================
+#  CONCURRENCY LIMITS
+# =========================
+_global_slots = threading.BoundedSemaphore(LLM_MAX_CONCURRENCY)
+_endpoint_slots = {}
+_endpoint_lock = threading.Lock()
+
+
+def _slots_for(endpoint):
+    with _endpoint_lock:
+        sem = _endpoint_slots.get(endpoint)
+        if sem is None:
+            limit = LLM_ENDPOINT_LIMITS.get(endpoint, LLM_ENDPOINT_CONCURRENCY)
+            sem = _endpoint_slots[endpoint] = threading.BoundedSemaphore(limit)
+        return sem
+
+
+@contextmanager
+def _acquire(endpoint):
+    deadline = time.monotonic() + LLM_QUEUE_TIMEOUT
+    endpoint_sem = _slots_for(endpoint)
+
+    started = time.monotonic()
+    _queue_depth.inc(endpoint=endpoint)
+    try:
+        if not endpoint_sem.acquire(timeout=LLM_QUEUE_TIMEOUT):
+            _rejections.inc(endpoint=endpoint, reason="endpoint_busy")
+            raise LLMUnavailable(f"Too many concurrent '{endpoint}' LLM calls", retry_after=1)
+        if not _global_slots.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            endpoint_sem.release()
+            _rejections.inc(endpoint=endpoint, reason="global_busy")
+            raise LLMUnavailable("Too many concurrent LLM calls", retry_after=1)
+    finally:
+        _queue_depth.dec(endpoint=endpoint)
+        _queue_wait.observe(time.monotonic() - started, endpoint=endpoint)
+
+    _in_flight.inc(endpoint=endpoint)
+    try:
+        yield
+    finally:
+        _in_flight.dec(endpoint=endpoint)
+        _global_slots.release()
+        endpoint_sem.release()
+
+
+# =========================
+#  CIRCUIT BREAKER
+# =========================
+class CircuitBreaker:
+    """
+    closed    -> calls pass through; consecutive failures are counted
+    open      -> calls fail fast until the cooldown elapses
+    half-open -> a single probe call is let through; success closes it again
+    """
+
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probe_in_flight = False
+
+    @property
+    def state(self):
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.cooldown:
+            return "half-open"
+        return "open"
+
+    def before_call(self):
+        """Returns True when this call is the half-open probe."""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return False
+            if state == "half-open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            remaining = max(0.0, self.cooldown - (time.monotonic() - self._opened_at))
+        raise LLMUnavailable("LLM circuit breaker is open", retry_after=round(remaining, 1) or 1)
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probe_in_flight = False
+        _breaker_state.set(0)
+
+    def release_probe(self):
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            reopen = self._probe_in_flight or self._failures >= self.threshold
+            self._probe_in_flight = False
+            if reopen:
+                self._opened_at = time.monotonic()
+        if reopen:
+            _breaker_state.set(1)
+            print(f"[LLM] Circuit breaker opened after {self._failures} consecutive failures")
+
+
+breaker = CircuitBreaker(LLM_BREAKER_THRESHOLD, LLM_BREAKER_COOLDOWN)
+
+
+def _backoff(attempt):
+    # Full jitter: sleep a random amount up to the exponential cap.
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** attempt)))
+
+
+# =========================
+#  PUBLIC API
+# =========================
+def generate_content(model, prompt, endpoint="default", **kwargs):
+    """
+    Drop-in replacement for model.generate_content(prompt, **kwargs) that
+    enforces the concurrency caps, retries transient errors with jittered
+    exponential backoff and fails fast while the circuit breaker is open.
+    """
+    is_probe = breaker.before_call()
+    try:
+        return _call_with_retries(model, prompt, endpoint, **kwargs)
+    finally:
+        if is_probe:
+            # The probe may have been rejected before reaching Gemini.
+            breaker.release_probe()
+
+
+def _call_with_retries(model, prompt, endpoint, **kwargs):
+    started = time.monotonic()
+    attempt = 0
+    while True:
+        try:
+            # Slots are held per attempt, never across the backoff sleep,
+            # so failing calls don't starve healthy ones
+            with _acquire(endpoint):
+                response = model.generate_content(prompt, **kwargs)
+        except RETRYABLE_ERRORS as e:
+            breaker.record_failure()
+            if attempt >= LLM_MAX_RETRIES or breaker.state == "open":
+                _calls.inc(endpoint=endpoint, outcome="error")
+                record_call(endpoint, prompt, None, time.monotonic() - started, attempt, error=e)
+                raise
+            _retries.inc(endpoint=endpoint)
+            delay = _backoff(attempt)
+            print(f"[LLM] {endpoint}: {type(e).__name__}, retrying in {delay:.2f}s")
+            time.sleep(delay)
+            attempt += 1
+            continue
+        except LLMUnavailable:
+            raise
+        except Exception as e:
+            # Bad request, invalid key, or a bug on our side: says nothing
+            # about upstream health, so the breaker is left as it is.
+            _calls.inc(endpoint=endpoint, outcome="error")
+            record_call(endpoint, prompt, None, time.monotonic() - started, attempt, error=e)
+            raise
+
+        breaker.record_success()
+        _calls.inc(endpoint=endpoint, outcome="ok")
+        record_call(endpoint, prompt, response, time.monotonic() - started, attempt)
+        return response
+
+
+def get_stats():
+    stats = metrics.snapshot(prefix="llm_")
+    stats["breaker_state"] = breaker.state
+    stats["summary"] = llm_summary()
+    stats["limits"] = {
+        "global": LLM_MAX_CONCURRENCY,
+        "per_endpoint_default": LLM_ENDPOINT_CONCURRENCY,
+        "per_endpoint": LLM_ENDPOINT_LIMITS,
+    }
+    return stats
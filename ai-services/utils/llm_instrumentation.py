@@ -0,0 +1,149 @@
+import os
+import time
+import threading
+from utils import metrics
+
+# Seconds between printed per-endpoint summaries; 0 disables the reporter.
+LLM_SUMMARY_INTERVAL = float(os.getenv("LLM_SUMMARY_INTERVAL", 300))
+
+SIZE_BUCKETS = (100, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000)
+
+_latency = metrics.histogram("llm_latency_seconds", "Wall time per governed call, retries included")
+_prompt_chars = metrics.histogram("llm_prompt_chars", "Prompt size in characters", buckets=SIZE_BUCKETS)
+_prompt_tokens = metrics.histogram("llm_prompt_tokens", "Prompt tokens per call", buckets=SIZE_BUCKETS)
+_response_tokens = metrics.histogram("llm_response_tokens", "Response tokens per call", buckets=SIZE_BUCKETS)
+_prompt_tokens_total = metrics.counter("llm_prompt_tokens_total", "Prompt tokens consumed")
+_response_tokens_total = metrics.counter("llm_response_tokens_total", "Response tokens produced")
+_parse_failures = metrics.counter("llm_parse_failures_total", "Responses that could not be parsed")
+
+# Per-endpoint totals: "total" since the process started (what /llm/metrics
+# shows), "report" since the last printed summary. The reporter only ever
+# resets its own window.
+_windows = {"total": {}, "report": {}}
+_window_lock = threading.Lock()
+_reporter_started = False
+
+
+def _prompt_length(prompt):
+    if isinstance(prompt, str):
+        return len(prompt)
+    if isinstance(prompt, (list, tuple)):
+        return sum(_prompt_length(p) for p in prompt)
+    return len(str(prompt))
+
+
+def estimate_tokens(text):
+    """~4 characters per token; good enough for budgeting and fallbacks."""
+    return len(text or "") // 4
+
+
+def _token_counts(response, prompt_chars):
+    """
+    Token counts from the response's usage metadata. When Gemini does not
+    report usage, fall back to the ~4 chars/token rule of thumb.
+    """
+    usage = getattr(response, "usage_metadata", None)
+    prompt_tokens = getattr(usage, "prompt_token_count", None)
+    response_tokens = getattr(usage, "candidates_token_count", None)
+    if prompt_tokens is None:
+        prompt_tokens = prompt_chars // 4
+    if response_tokens is None:
+        try:
+            response_tokens = estimate_tokens(response.text)
+        except Exception:
+            response_tokens = 0
+    return int(prompt_tokens), int(response_tokens)
+
+
+def record_call(endpoint, prompt, response, latency, retries=0, error=None):
+    """Record one governed generate_content call (successful or not)."""
+    prompt_chars = _prompt_length(prompt)
+    _latency.observe(latency, endpoint=endpoint)
+    _prompt_chars.observe(prompt_chars, endpoint=endpoint)
+
+    prompt_tokens = response_tokens = 0
+    if response is not None:
+        prompt_tokens, response_tokens = _token_counts(response, prompt_chars)
+        _prompt_tokens.observe(prompt_tokens, endpoint=endpoint)
+        _response_tokens.observe(response_tokens, endpoint=endpoint)
+        _prompt_tokens_total.inc(prompt_tokens, endpoint=endpoint)
+        _response_tokens_total.inc(response_tokens, endpoint=endpoint)
+
+    with _window_lock:
+        for window in _windows.values():
+            w = window.setdefault(endpoint, {
+                "calls": 0, "errors": 0, "retries": 0, "parse_failures": 0,
+                "latency_sum": 0.0, "latency_max": 0.0,
+                "prompt_chars": 0, "prompt_tokens": 0, "response_tokens": 0,
+            })
+            w["calls"] += 1
+            w["errors"] += 1 if error is not None else 0
+            w["retries"] += retries
+            w["latency_sum"] += latency
+            w["latency_max"] = max(w["latency_max"], latency)
+            w["prompt_chars"] += prompt_chars
+            w["prompt_tokens"] += prompt_tokens
+            w["response_tokens"] += response_tokens
+
+    _ensure_reporter()
+
+
+def record_parse_failure(endpoint):
+    _parse_failures.inc(endpoint=endpoint)
+    with _window_lock:
+        for window in _windows.values():
+            if endpoint in window:
+                window[endpoint]["parse_failures"] += 1
+
+
+def summary(window="total", reset=False):
+    """Per-endpoint totals of `window` since its last reset, heaviest endpoint first."""
+    with _window_lock:
+        current = _windows[window]
+        snapshot = {k: dict(v) for k, v in current.items()}
+        if reset:
+            current.clear()
+
+    rows = []
+    for endpoint, w in snapshot.items():
+        calls = w["calls"] or 1
+        rows.append({
+            "endpoint": endpoint,
+            "calls": w["calls"],
+            "errors": w["errors"],
+            "retries": w["retries"],
+            "parse_failures": w["parse_failures"],
+            "avg_latency": round(w["latency_sum"] / calls, 3),
+            "max_latency": round(w["latency_max"], 3),
+            "total_latency": round(w["latency_sum"], 3),
+            "avg_prompt_chars": w["prompt_chars"] // calls,
+            "prompt_tokens": w["prompt_tokens"],
+            "response_tokens": w["response_tokens"],
+        })
+    return sorted(rows, key=lambda r: -r["total_latency"])
+
+
+def _report_forever():
+    while True:
+        time.sleep(LLM_SUMMARY_INTERVAL)
+        rows = summary("report", reset=True)
+        if not rows:
+            continue
+        print(f"[LLM] Summary for the last {int(LLM_SUMMARY_INTERVAL)}s:")
+        for r in rows:
+            print(
+                f"[LLM]   {r['endpoint']}: calls={r['calls']} errors={r['errors']} retries={r['retries']} "
+                f"parse_failures={r['parse_failures']} avg={r['avg_latency']}s max={r['max_latency']}s "
+                f"total={r['total_latency']}s prompt_tokens={r['prompt_tokens']} response_tokens={r['response_tokens']}"
+            )
+
+
+def _ensure_reporter():
+    global _reporter_started
+    if _reporter_started or LLM_SUMMARY_INTERVAL <= 0:
+        return
+    with _window_lock:
+        if _reporter_started:
+            return
+        _reporter_started = True
+    threading.Thread(target=_report_forever, daemon=True).start()
@@ -0,0 +1,364 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
+import requests
+from utils import metrics
+from utils.scratch import ScratchSpaceError
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Local, size-bounded cache of downloaded media (Cloudinary videos, YouTube
+# audio), so retries and re-analysis don't fetch hundreds of MB again.
+# Entries are keyed by a hash of the URL and revalidated against the
+# server's ETag / Content-Length; the least recently used are evicted once
+# the cache exceeds its byte budget. Callers get a hard link (or a copy)
+# of the entry in their own scratch directory, so eviction never pulls a
+# file out from under a running job.
+
+# =========================
+#  CONFIG
+# =========================
+MEDIA_CACHE_ENABLED = os.getenv("MEDIA_CACHE_ENABLED", "1") == "1"
+MEDIA_CACHE_DIR = os.getenv("MEDIA_CACHE_DIR", os.path.join(tempfile.gettempdir(), "ai-media-cache"))
+MEDIA_CACHE_MAX_MB = int(os.getenv("MEDIA_CACHE_MAX_MB", 2048))
+# Skip the HEAD revalidation for entries checked this recently.
+MEDIA_CACHE_REVALIDATE_SEC = int(os.getenv("MEDIA_CACHE_REVALIDATE_SEC", 300))
+MEDIA_DOWNLOAD_TIMEOUT = float(os.getenv("MEDIA_DOWNLOAD_TIMEOUT", 30))
+
+CHUNK_SIZE = 1024 * 1024
+_MB = 1024 * 1024
+
+_hits = metrics.counter("media_cache_hits_total", "Media served from the local cache")
+_misses = metrics.counter("media_cache_misses_total", "Media downloaded because it was missing or stale")
+_evictions = metrics.counter("media_cache_evictions_total", "Entries evicted to stay under the byte budget")
+_bytes = metrics.gauge("media_cache_bytes", "Bytes held in the media cache")
+
+
+class MediaDownloadError(Exception):
+    """The server answered with an error, or sent fewer bytes than announced."""
+
+
+# =========================
+#  ENTRIES
+# =========================
+# Cache users run in several processes (cpu-pool workers, other app
+# workers on the host), so each key is guarded by a file lock next to its
+# entry. Without fcntl (Windows) the locks only cover this process.
+_local_locks = {}
+_local_locks_guard = threading.Lock()
+
+
+@contextmanager
+def _local_lock(key, blocking):
+    with _local_locks_guard:
+        entry = _local_locks.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    acquired = entry[0].acquire(blocking)
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            entry[0].release()
+        with _local_locks_guard:
+            # Drop the lock once nobody uses it, so the table doesn't grow per URL
+            entry[1] -= 1
+            if entry[1] == 0:
+                del _local_locks[key]
+
+
+def _open_locked(path, blocking):
+    """fd holding an exclusive flock on `path`, or None if busy and not blocking."""
+    while True:
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        # Eviction unlinks lock files; if ours was replaced while we waited,
+        # lock the current one instead
+        try:
+            if os.fstat(fd).st_ino == os.stat(path).st_ino:
+                return fd
+        except FileNotFoundError:
+            pass
+        os.close(fd)
+
+
+@contextmanager
+def _key_lock(key, blocking=True):
+    """Exclusive lock on one cache key; yields False if busy and not blocking."""
+    if fcntl is None:
+        with _local_lock(key, blocking) as acquired:
+            yield acquired
+        return
+    path = _paths(key)[0][:-len(".bin")] + ".lock"
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd = _open_locked(path, blocking)
+    try:
+        yield fd is not None
+    finally:
+        if fd is not None:
+            os.close(fd)
+
+
+def cache_key(name):
+    return hashlib.sha256(name.encode("utf-8")).hexdigest()
+
+
+def _paths(key):
+    base = os.path.join(MEDIA_CACHE_DIR, key[:2], key)
+    return base + ".bin", base + ".json"
+
+
+def _read_meta(meta_path):
+    try:
+        with open(meta_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_meta(meta_path, meta):
+    tmp = f"{meta_path}.{os.getpid()}.{threading.get_ident()}"
+    with open(tmp, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp, meta_path)
+
+
+def _touch(path):
+    # mtime doubles as the LRU clock
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def _place(src, dest_path):
+    """Hard link the cache entry into the caller's directory, copying across filesystems."""
+    if os.path.exists(dest_path):
+        os.remove(dest_path)
+    try:
+        os.link(src, dest_path)
+    except OSError:
+        shutil.copyfile(src, dest_path)
+    return dest_path
+
+
+# =========================
+#  HTTP MEDIA
+# =========================
+def _validators(headers):
+    length = headers.get("Content-Length")
+    return {
+        "etag": headers.get("ETag"),
+        "length": int(length) if length and length.isdigit() else None,
+    }
+
+
+def _still_valid(meta, url):
+    if time.time() - meta.get("checked_at", 0) < MEDIA_CACHE_REVALIDATE_SEC:
+        return True
+    try:
+        head = requests.head(url, allow_redirects=True, timeout=MEDIA_DOWNLOAD_TIMEOUT)
+    except requests.RequestException:
+        # Can't reach the origin: a cached copy beats failing the job
+        return True
+    if head.status_code >= 400:
+        return False
+    current = _validators(head.headers)
+    if current["etag"] and meta.get("etag"):
+        return current["etag"] == meta["etag"]
+    if current["length"] is not None:
+        return current["length"] == meta.get("size")
+    # Nothing to compare against: trust the entry until the next check
+    return True
+
+
+def _too_large(url, size, max_bytes):
+    return ScratchSpaceError(
+        f"{url} is over the {max_bytes // _MB} MB left in the job's scratch quota ({size // _MB}+ MB)"
+    )
+
+
+def _stream_to(url, path, max_bytes=None):
+    """
+    Stream `url` into `path`; returns the response validators. Stops with
+    ScratchSpaceError as soon as the body exceeds `max_bytes`.
+    """
+    with requests.get(url, stream=True, timeout=MEDIA_DOWNLOAD_TIMEOUT) as response:
+        if response.status_code >= 400:
+            raise MediaDownloadError(f"GET {url} returned {response.status_code}")
+        validators = _validators(response.headers)
+        if max_bytes is not None and (validators["length"] or 0) > max_bytes:
+            raise _too_large(url, validators["length"], max_bytes)
+        written = 0
+        with open(path, "wb") as f:
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                f.write(chunk)
+                written += len(chunk)
+                if max_bytes is not None and written > max_bytes:
+                    raise _too_large(url, written, max_bytes)
+    if validators["length"] is not None and written != validators["length"]:
+        raise MediaDownloadError(f"GET {url} ended after {written} of {validators['length']} bytes")
+    return validators
+
+
+def fetch(url, dest_path, max_bytes=None):
+    """
+    Put the media at `url` in `dest_path`, from the cache when the cached
+    copy still matches the origin, otherwise by streaming it down (and
+    caching it for next time). Media larger than `max_bytes` (e.g. the
+    job's ScratchDir.remaining()) raises ScratchSpaceError.
+    """
+    if not MEDIA_CACHE_ENABLED:
+        _stream_to(url, dest_path, max_bytes)
+        return dest_path
+
+    key = cache_key(url)
+    data_path, meta_path = _paths(key)
+    with _key_lock(key):
+        meta = _read_meta(meta_path)
+        if meta and os.path.exists(data_path) and _still_valid(meta, url):
+            if max_bytes is not None and meta.get("size", 0) > max_bytes:
+                raise _too_large(url, meta["size"], max_bytes)
+            try:
+                _place(data_path, dest_path)
+            except FileNotFoundError:
+                # Removed behind our back (e.g. by hand): download it again
+                pass
+            else:
+                _hits.inc(kind="http")
+                meta["checked_at"] = time.time()
+                _write_meta(meta_path, meta)
+                _touch(data_path)
+                return dest_path
+
+        _misses.inc(kind="http")
+        os.makedirs(os.path.dirname(data_path), exist_ok=True)
+        tmp = f"{data_path}.part.{os.getpid()}.{threading.get_ident()}"
+        try:
+            validators = _stream_to(url, tmp, max_bytes)
+            _store(tmp, data_path, meta_path, dest_path, {"url": url, **validators})
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+    _evict()
+    return dest_path
+
+
+# =========================
+#  PRODUCED MEDIA
+# =========================
+def fetch_with(name, produce, dest_path):
+    """
+    Cache for media that isn't a plain URL download (e.g. yt-dlp audio).
+    `name` identifies the content and must change when it does;
+    `produce(work_dir)` creates the file and returns its path, or None.
+    Returns `dest_path`, or None if `produce` gave nothing.
+    """
+    key = cache_key(name)
+    data_path, meta_path = _paths(key)
+    with _key_lock(key):
+        if MEDIA_CACHE_ENABLED and os.path.exists(data_path) and _read_meta(meta_path):
+            try:
+                _place(data_path, dest_path)
+            except FileNotFoundError:
+                pass
+            else:
+                _hits.inc(kind="produced")
+                _touch(data_path)
+                return dest_path
+
+        _misses.inc(kind="produced")
+        work_dir = tempfile.mkdtemp(dir=os.path.dirname(dest_path) or None)
+        try:
+            produced = produce(work_dir)
+            if not produced or not os.path.exists(produced):
+                return None
+            if not MEDIA_CACHE_ENABLED:
+                shutil.move(produced, dest_path)
+                return dest_path
+            os.makedirs(os.path.dirname(data_path), exist_ok=True)
+            _store(produced, data_path, meta_path, dest_path, {"name": name, "etag": None})
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    _evict()
+    return dest_path
+
+
+# =========================
+#  BUDGET
+# =========================
+def _store(src, data_path, meta_path, dest_path, meta):
+    """Move a finished download into the cache and place it at `dest_path`."""
+    size = os.path.getsize(src)
+    if size > MEDIA_CACHE_MAX_MB * _MB:
+        # Larger than the whole budget: hand it over without caching it
+        shutil.move(src, dest_path)
+        return
+    shutil.move(src, data_path)
+    _write_meta(meta_path, {**meta, "size": size, "stored_at": time.time(), "checked_at": time.time()})
+    _place(data_path, dest_path)
+
+
+_evict_lock = threading.Lock()
+
+
+def _entries():
+    for root, _, files in os.walk(MEDIA_CACHE_DIR):
+        for name in files:
+            if name.endswith(".bin"):
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield st.st_mtime, st.st_size, path
+
+
+def _evict():
+    """Drop least recently used entries until the cache fits MEDIA_CACHE_MAX_MB."""
+    budget = MEDIA_CACHE_MAX_MB * _MB
+    with _evict_lock:
+        entries = sorted(_entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= budget:
+                break
+            key = os.path.basename(path)[:-len(".bin")]
+            base = path[:-len(".bin")]
+            with _key_lock(key, blocking=False) as held:
+                if not held:
+                    # Being validated, downloaded or placed right now
+                    continue
+                for p in (path, base + ".json", base + ".lock"):
+                    try:
+                        os.remove(p)
+                    except OSError:
+                        pass
+            total -= size
+            _evictions.inc()
+        _bytes.set(total)
+
+
+def stats():
+    entries = list(_entries()) if os.path.isdir(MEDIA_CACHE_DIR) else []
+    return {
+        "enabled": MEDIA_CACHE_ENABLED,
+        "dir": MEDIA_CACHE_DIR,
+        "entries": len(entries),
+        "bytes": sum(size for _, size, _ in entries),
+        "max_bytes": MEDIA_CACHE_MAX_MB * _MB,
+        "hits": sum(v for _, v in _hits.series()),
+        "misses": sum(v for _, v in _misses.series()),
+        "evictions": _evictions.value(),
+    }
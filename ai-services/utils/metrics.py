@@ -0,0 +1,154 @@
+import threading
+from bisect import bisect_left
+
+# Process-wide registry of named metrics. Each metric keeps one series per
+# label combination so callers can do e.g. counter.inc(endpoint="score-quiz").
+_REGISTRY = {}
+_REGISTRY_LOCK = threading.Lock()
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _key(labels):
+    return tuple(sorted(labels.items()))
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help=""):
+        self.name = name
+        self.help = help
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = _key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(_key(labels), 0)
+
+    def series(self):
+        with self._lock:
+            return [(dict(k), v) for k, v in self._values.items()]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[_key(labels)] = value
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help="", buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def observe(self, value, **labels):
+        key = _key(labels)
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = {
+                    "counts": [0] * (len(self.buckets) + 1),
+                    "sum": 0.0,
+                    "count": 0,
+                }
+            series["counts"][idx] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def series(self):
+        with self._lock:
+            return [
+                (dict(k), {"counts": list(v["counts"]), "sum": v["sum"], "count": v["count"]})
+                for k, v in self._values.items()
+            ]
+
+
+def _get_or_create(cls, name, help, **kwargs):
+    with _REGISTRY_LOCK:
+        metric = _REGISTRY.get(name)
+        if metric is None:
+            metric = _REGISTRY[name] = cls(name, help, **kwargs)
+        return metric
+
+
+def counter(name, help=""):
+    return _get_or_create(Counter, name, help)
+
+
+def gauge(name, help=""):
+    return _get_or_create(Gauge, name, help)
+
+
+def histogram(name, help="", buckets=DEFAULT_BUCKETS):
+    return _get_or_create(Histogram, name, help, buckets=buckets)
+
+
+def snapshot(prefix=""):
+    """Plain-dict view of every registered metric (optionally filtered by name prefix)."""
+    with _REGISTRY_LOCK:
+        metrics = [m for name, m in _REGISTRY.items() if name.startswith(prefix)]
+    out = {}
+    for m in metrics:
+        if m.kind == "histogram":
+            out[m.name] = [
+                {"labels": labels, "count": s["count"], "sum": round(s["sum"], 4),
+                 "buckets": dict(zip([*map(str, m.buckets), "+Inf"], s["counts"]))}
+                for labels, s in m.series()
+            ]
+        else:
+            out[m.name] = [{"labels": labels, "value": v} for labels, v in m.series()]
+    return out
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(labels, extra=None):
+    items = list(labels.items()) + (list(extra.items()) if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+def _number(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def render_prometheus():
+    """Every registered metric in the Prometheus text exposition format."""
+    with _REGISTRY_LOCK:
+        metrics = sorted(_REGISTRY.values(), key=lambda m: m.name)
+    lines = []
+    for m in metrics:
+        lines.append(f"# HELP {m.name} {m.help}")
+        lines.append(f"# TYPE {m.name} {m.kind}")
+        for labels, value in m.series():
+            if m.kind != "histogram":
+                lines.append(f"{m.name}{_labels(labels)} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip([*m.buckets, "+Inf"], value["counts"]):
+                cumulative += count
+                lines.append(f"{m.name}_bucket{_labels(labels, {'le': bound})} {cumulative}")
+            lines.append(f"{m.name}_sum{_labels(labels)} {_number(round(value['sum'], 6))}")
+            lines.append(f"{m.name}_count{_labels(labels)} {value['count']}")
+    return "\n".join(lines) + "\n"
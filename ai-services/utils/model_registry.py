@@ -0,0 +1,196 @@
+import os
+import time
+import threading
+import importlib
+
+# Heavy subsystems (Whisper/torch, MediaPipe graphs, moviepy, OpenCV) are
+# loaded on first use instead of at import, so a worker that only serves
+# chatbot routes never pays for them. warmup() preloads a chosen set ahead
+# of traffic; states() reports what is loaded for readiness checks.
+
+# =========================
+#  CONFIG
+# =========================
+WHISPER_MODEL = os.getenv("WHISPER_MODEL", "base")
+# Models to preload when the app starts, e.g. WARMUP_MODELS=whisper,face_live
+WARMUP_MODELS = [name.strip() for name in os.getenv("WARMUP_MODELS", "").split(",") if name.strip()]
+
+UNLOADED, LOADING, READY, FAILED = "unloaded", "loading", "ready", "failed"
+
+
+# =========================
+#  LAZY MODULES
+# =========================
+_import_seconds = {}
+
+
+class LazyModule:
+    """
+    Module-level stand-in for `import name`. The real import happens on the
+    first attribute access, so `cv2 = LazyModule("cv2")` costs nothing until
+    a frame is actually decoded.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            started = time.perf_counter()
+            module = importlib.import_module(self._name)
+            _import_seconds.setdefault(self._name, round(time.perf_counter() - started, 3))
+            self._module = module
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self._name} ({state})>"
+
+
+# =========================
+#  MODELS
+# =========================
+class _Model:
+    def __init__(self, name, loader, fork_safe):
+        self.name = name
+        self.loader = loader
+        self.fork_safe = fork_safe
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.value = None
+        self.state = UNLOADED
+        self.error = None
+        self.load_seconds = None
+
+    def get(self):
+        if self.state == READY:
+            return self.value
+        with self._lock:
+            if self.state != READY:
+                self.state = LOADING
+                started = time.perf_counter()
+                try:
+                    self.value = self.loader()
+                except Exception as e:
+                    self.state = FAILED
+                    self.error = str(e)
+                    raise
+                self.load_seconds = round(time.perf_counter() - started, 3)
+                self.error = None
+                self.state = READY
+                print(f"[MODELS] Loaded {self.name} in {self.load_seconds}s (pid {os.getpid()})")
+        return self.value
+
+    def describe(self):
+        return {"state": self.state, "load_seconds": self.load_seconds, "error": self.error}
+
+
+_REGISTRY = {}
+
+
+def register(name, loader, fork_safe=True):
+    """
+    Register a lazily loaded model. Models that are not fork-safe (they own
+    native threads, like MediaPipe graphs) are dropped in forked children
+    and loaded again there on first use.
+    """
+    _REGISTRY[name] = _Model(name, loader, fork_safe)
+
+
+def get(name):
+    """The loaded model, loading it first if needed."""
+    try:
+        model = _REGISTRY[name]
+    except KeyError:
+        raise ValueError(f"Unknown model: {name} (known: {', '.join(_REGISTRY)})")
+    return model.get()
+
+
+def check_names(names):
+    unknown = [name for name in names if name not in _REGISTRY]
+    if unknown:
+        raise ValueError(f"Unknown model(s): {', '.join(unknown)} (known: {', '.join(_REGISTRY)})")
+
+
+def warmup(names=None):
+    """Load `names` (default: every registered model) now. Returns states()."""
+    names = list(_REGISTRY) if names is None else list(names)
+    check_names(names)
+    for name in names:
+        try:
+            _REGISTRY[name].get()
+        except Exception as e:
+            print(f"[MODELS] Warmup of {name} failed: {e}")
+    return states()
+
+
+def is_ready(names):
+    return all(name in _REGISTRY and _REGISTRY[name].state == READY for name in names)
+
+
+def states():
+    return {
+        "pid": os.getpid(),
+        "models": {name: m.describe() for name, m in _REGISTRY.items()},
+        "imports": dict(_import_seconds),
+    }
+
+
+def _reset_after_fork():
+    global _whisper_lock
+    _whisper_lock = threading.Lock()
+    for model in _REGISTRY.values():
+        if not model.fork_safe:
+            model.reset()
+        model._lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+# =========================
+#  BUILT-IN MODELS
+# =========================
+def _load_whisper():
+    import whisper
+    return whisper.load_model(WHISPER_MODEL)
+
+
+def _load_face_live():
+    # Streaming detectors shared by live proctoring sessions
+    import mediapipe as mp
+    detection = mp.solutions.face_detection.FaceDetection(
+        model_selection=0, min_detection_confidence=0.5
+    )
+    mesh = mp.solutions.face_mesh.FaceMesh(
+        static_image_mode=False,
+        max_num_faces=1,
+        refine_landmarks=True,
+        min_detection_confidence=0.5,
+        min_tracking_confidence=0.5,
+    )
+    return detection, mesh
+
+
+register("whisper", _load_whisper)
+register("face_live", _load_face_live, fork_safe=False)
+register("mediapipe", lambda: importlib.import_module("mediapipe"))
+register("moviepy", lambda: importlib.import_module("moviepy.editor"))
+register("cv2", lambda: importlib.import_module("cv2"))
+
+# Whisper installs per-call decoder hooks on the shared model, so concurrent
+# transcriptions in one process must take turns.
+_whisper_lock = threading.Lock()
+
+
+def transcribe(audio_path, **kwargs):
+    model = get("whisper")
+    with _whisper_lock:
+        return model.transcribe(audio_path, **kwargs)
@@ -0,0 +1,54 @@
+import time
+from flask import g, request
+from utils import metrics
+
+# Per-route request counts, latency histograms and in-flight gauges, fed by
+# Flask hooks. Routes are labelled by their URL rule ("/reset/<session_id>"),
+# never the raw path, so the number of series stays bounded.
+
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_requests = metrics.counter("http_requests_total", "Requests by route, method and status")
+_latency = metrics.histogram("http_request_duration_seconds", "Request wall time by route", buckets=HTTP_BUCKETS)
+_in_flight = metrics.gauge("http_requests_in_flight", "Requests currently being handled")
+
+# Scrapes and probes are not traffic
+SKIP_ROUTES = {"/metrics", "/ready"}
+
+
+def _route():
+    rule = request.url_rule
+    return rule.rule if rule is not None else "unmatched"
+
+
+def _before():
+    route = _route()
+    if route in SKIP_ROUTES:
+        return
+    g._metrics_route = route
+    g._metrics_started = time.perf_counter()
+    _in_flight.inc(route=route)
+
+
+def _after(response):
+    route = g.pop("_metrics_route", None)
+    if route is not None:
+        elapsed = time.perf_counter() - g.pop("_metrics_started")
+        _latency.observe(elapsed, route=route, method=request.method)
+        _requests.inc(route=route, method=request.method, status=response.status_code)
+        _in_flight.dec(route=route)
+    return response
+
+
+def _teardown(exc):
+    # after_request is skipped when a response could not be built at all
+    route = g.pop("_metrics_route", None)
+    if route is not None:
+        _requests.inc(route=route, method=request.method, status=500)
+        _in_flight.dec(route=route)
+
+
+def init_app(app):
+    app.before_request(_before)
+    app.after_request(_after)
+    app.teardown_request(_teardown)
@@ -0,0 +1,197 @@
+import os
+import time
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Per-job scratch directories for media work. Every job gets its own
+# directory, so concurrent analyses (even for the same student or video)
+# never share a file name, and the directory is removed when the job ends,
+# however it ends.
+#
+# A job reserves its whole quota up front. Reservations are recorded in a
+# marker file inside each job directory, so jobs in other processes (cpu
+# pool workers, other app workers) count against the same free space.
+
+# =========================
+#  CONFIG
+# =========================
+# Put scratch on tmpfs (/dev/shm) when it has room; falls back to disk.
+SCRATCH_TMPFS = os.getenv("SCRATCH_TMPFS", "0") == "1"
+SCRATCH_TMPFS_ROOT = os.getenv("SCRATCH_TMPFS_ROOT", "/dev/shm")
+SCRATCH_ROOT = os.getenv("SCRATCH_ROOT", os.path.join(tempfile.gettempdir(), "ai-scratch"))
+# Space a job may use, checked before it starts and on demand while it runs.
+SCRATCH_JOB_QUOTA_MB = int(os.getenv("SCRATCH_JOB_QUOTA_MB", 2048))
+# Free space always left on the volume for everything else.
+SCRATCH_MIN_FREE_MB = int(os.getenv("SCRATCH_MIN_FREE_MB", 512))
+# Directories older than this were left by a crashed worker.
+SCRATCH_STALE_SEC = int(os.getenv("SCRATCH_STALE_SEC", 6 * 3600))
+
+_MB = 1024 * 1024
+_RESERVATION = ".reservation"
+
+
+class ScratchSpaceError(Exception):
+    """Not enough disk for a job, or a job went over its quota."""
+
+
+def _usage(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class ScratchDir:
+    def __init__(self, path, quota_bytes):
+        self.path = path
+        self.quota_bytes = quota_bytes
+
+    def file(self, name):
+        """Path of `name` inside this job's directory."""
+        return os.path.join(self.path, os.path.basename(name))
+
+    def usage(self):
+        return _usage(self.path)
+
+    def remaining(self):
+        """Bytes the job may still write; pass to downloads to stop them early."""
+        return max(0, self.quota_bytes - self.usage())
+
+    def check_quota(self):
+        used = self.usage()
+        if used > self.quota_bytes:
+            raise ScratchSpaceError(
+                f"Job used {used // _MB} MB of scratch space (quota {self.quota_bytes // _MB} MB)"
+            )
+        return used
+
+
+def _free_bytes(path):
+    return shutil.disk_usage(path).free
+
+
+_swept = set()
+_sweep_lock = threading.Lock()
+
+
+def _sweep(root):
+    """Once per process and root: remove job directories left by crashed workers."""
+    with _sweep_lock:
+        if root in _swept:
+            return
+        _swept.add(root)
+    cutoff = time.time() - SCRATCH_STALE_SEC
+    for entry in os.scandir(root):
+        try:
+            if entry.is_dir(follow_symlinks=False) and entry.stat().st_mtime < cutoff:
+                shutil.rmtree(entry.path, ignore_errors=True)
+        except OSError:
+            pass
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _outstanding(root):
+    """Bytes reserved by running jobs under `root` and not written yet."""
+    total = 0
+    for entry in os.scandir(root):
+        try:
+            with open(os.path.join(entry.path, _RESERVATION)) as f:
+                pid, quota = (int(v) for v in f.read().split())
+        except (OSError, ValueError):
+            continue
+        if _alive(pid):
+            total += max(0, quota - _usage(entry.path))
+    return total
+
+
+_root_locks = {}
+_root_locks_guard = threading.Lock()
+
+
+@contextmanager
+def _root_lock(root):
+    """Serialises reservations on `root` across threads and (with fcntl) processes."""
+    with _root_locks_guard:
+        lock = _root_locks.setdefault(root, threading.Lock())
+    with lock:
+        if fcntl is None:
+            yield
+            return
+        fd = os.open(os.path.join(root, ".lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+
+def _roots():
+    roots = []
+    if SCRATCH_TMPFS and os.path.isdir(SCRATCH_TMPFS_ROOT):
+        roots.append(os.path.join(SCRATCH_TMPFS_ROOT, "ai-scratch"))
+    roots.append(SCRATCH_ROOT)
+    return roots
+
+
+def _reserve(prefix, need_bytes):
+    """Create a job directory on the first root with room for `need_bytes` on top of running jobs."""
+    roots = _roots()
+    available = 0
+    for root in roots:
+        os.makedirs(root, exist_ok=True)
+        _sweep(root)
+        with _root_lock(root):
+            available = _free_bytes(root) - _outstanding(root) - SCRATCH_MIN_FREE_MB * _MB
+            if available >= need_bytes:
+                path = tempfile.mkdtemp(prefix=prefix, dir=root)
+                with open(os.path.join(path, _RESERVATION), "w") as f:
+                    f.write(f"{os.getpid()} {need_bytes}")
+                return path
+    raise ScratchSpaceError(
+        f"Not enough scratch space: job needs {need_bytes // _MB} MB, "
+        f"{max(0, available) // _MB} MB left after running jobs and the {SCRATCH_MIN_FREE_MB} MB reserve"
+    )
+
+
+def _safe(text):
+    return "".join(c if c.isalnum() or c in "-_" else "_" for c in str(text))[:40]
+
+
+@contextmanager
+def job_dir(kind, key=None, quota_mb=None):
+    """
+    A fresh directory for one job, removed on exit:
+
+        with job_dir("interview", student_id) as job:
+            video = job.file("video.mp4")
+
+    Raises ScratchSpaceError up front if the volume can't fit `quota_mb`
+    next to the quotas of jobs already running.
+    """
+    quota = (quota_mb or SCRATCH_JOB_QUOTA_MB) * _MB
+    prefix = f"{_safe(kind)}-{_safe(key)}-" if key is not None else f"{_safe(kind)}-"
+    path = _reserve(prefix, quota)
+    try:
+        yield ScratchDir(path, quota)
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,162 @@
+import os
+import re
+import zlib
+import numpy as np
+
+# Offline fuzzy matching for short catalog phrases (skills, roles,
+# challenges). Phrases become hashed TF-IDF vectors of whole words plus
+# character n-grams taken inside word boundaries, so "JS" can reach
+# "JavaScript" through the alias table, "Front-end" reaches "Frontend"
+# through shared n-grams, and a one-letter skill like "C" only matches the
+# word "c" - never every phrase containing the letter.
+
+SEMANTIC_DIMS = int(os.getenv("SEMANTIC_DIMS", 2048))
+# Cosine similarity at which two phrases count as the same thing.
+SEMANTIC_MATCH_THRESHOLD = float(os.getenv("SEMANTIC_MATCH_THRESHOLD", 0.6))
+
+NGRAM_SIZES = (3, 4, 5)
+WORD_WEIGHT = 2.0
+
+# Common abbreviations and spellings, expanded before vectorizing.
+ALIASES = {
+    "js": "javascript",
+    "ts": "typescript",
+    "py": "python",
+    "golang": "go",
+    "nodejs": "node.js",
+    "node": "node.js",
+    "reactjs": "react",
+    "react.js": "react",
+    "vuejs": "vue",
+    "vue.js": "vue",
+    "postgres": "postgresql",
+    "mongo": "mongodb",
+    "k8s": "kubernetes",
+    "ml": "machine learning",
+    "dl": "deep learning",
+    "ai": "artificial intelligence",
+    "nlp": "natural language processing",
+    "cv": "computer vision",
+    "ds": "data science",
+    "ui": "user interface",
+    "ux": "user experience",
+    "oop": "object oriented programming",
+    "dsa": "data structures and algorithms",
+    "db": "database",
+    "dbms": "database management",
+    "aws": "amazon web services",
+    "gcp": "google cloud",
+    "ci/cd": "continuous integration",
+    "hr": "human resources",
+    "pm": "project management",
+    "seo": "search engine optimization",
+}
+
+# Words kept with their symbols: c++, c#, node.js, ci/cd ...
+_TOKEN_RE = re.compile(r"[a-z0-9+#]+(?:[./][a-z0-9+#]+)*")
+
+
+def tokenize(text):
+    """Lower-cased words with aliases expanded."""
+    tokens = []
+    for token in _TOKEN_RE.findall((text or "").lower()):
+        tokens.extend(ALIASES.get(token, token).split())
+    return tokens
+
+
+def _bucket(feature):
+    return zlib.crc32(feature.encode("utf-8")) % SEMANTIC_DIMS
+
+
+def _feature_counts(tokens):
+    counts = {}
+    for token in tokens:
+        b = _bucket("w:" + token)
+        counts[b] = counts.get(b, 0.0) + WORD_WEIGHT
+        padded = f" {token} "
+        for n in NGRAM_SIZES:
+            for i in range(len(padded) - n + 1):
+                b = _bucket(padded[i:i + n])
+                counts[b] = counts.get(b, 0.0) + 1.0
+    return counts
+
+
+def _contains_words(haystack, needle):
+    """True if `needle` tokens appear contiguously in `haystack` tokens."""
+    n = len(needle)
+    if not n or n > len(haystack):
+        return False
+    first = needle[0]
+    return any(
+        haystack[i] == first and haystack[i:i + n] == needle
+        for i in range(len(haystack) - n + 1)
+    )
+
+
+class SemanticMatcher:
+    """
+    Precomputed vectors for a fixed set of phrases. match() answers many
+    query terms with one matrix product against all phrases.
+    """
+
+    def __init__(self, phrases):
+        self.phrases = list(phrases)
+        self._tokens = [tuple(tokenize(p)) for p in self.phrases]
+
+        counts = [_feature_counts(t) for t in self._tokens]
+        df = np.zeros(SEMANTIC_DIMS, dtype=np.float32)
+        for c in counts:
+            df[list(c)] += 1
+        n = len(self.phrases)
+        self._idf = (np.log((1 + n) / (1 + df)) + 1).astype(np.float32)
+        self.matrix = self._vectors(counts)
+
+        # word -> phrase ids, to find whole-word containment quickly
+        self._by_word = {}
+        for i, tokens in enumerate(self._tokens):
+            for token in set(tokens):
+                self._by_word.setdefault(token, set()).add(i)
+
+    def _vectors(self, counts):
+        m = np.zeros((len(counts), SEMANTIC_DIMS), dtype=np.float32)
+        for row, c in enumerate(counts):
+            if c:
+                idx = np.fromiter(c.keys(), dtype=np.int64, count=len(c))
+                m[row, idx] = np.fromiter(c.values(), dtype=np.float32, count=len(c)) * self._idf[idx]
+        norms = np.linalg.norm(m, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return m / norms
+
+    def _contained_in(self, tokens):
+        """Phrase ids containing all of `tokens` as a contiguous word run."""
+        if not tokens:
+            return set()
+        ids = set.intersection(*(self._by_word.get(t, set()) for t in tokens))
+        return {i for i in ids if _contains_words(self._tokens[i], tuple(tokens))}
+
+    def match(self, terms, threshold=SEMANTIC_MATCH_THRESHOLD):
+        """
+        For each query term, the phrases it matches: cosine similarity at or
+        above `threshold`, or the term's words appearing in the phrase.
+        Returns a list of sets of phrases, aligned with `terms`.
+        """
+        if not terms or not self.phrases:
+            return [set() for _ in terms]
+        term_tokens = [tokenize(t) for t in terms]
+        queries = self._vectors([_feature_counts(t) for t in term_tokens])
+        sims = queries @ self.matrix.T
+
+        results = []
+        for row, tokens in enumerate(term_tokens):
+            if not tokens:
+                results.append(set())
+                continue
+            ids = set(np.flatnonzero(sims[row] >= threshold).tolist())
+            ids |= self._contained_in(tokens)
+            results.append({self.phrases[i] for i in ids})
+        return results
+
+    def similarity(self, a, b):
+        va, vb = self._vectors([_feature_counts(tokenize(a)), _feature_counts(tokenize(b))])
+        return float(va @ vb)
+
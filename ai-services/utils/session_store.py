@@ -0,0 +1,260 @@
+import os
+import abc
+import json
+import time
+import sqlite3
+import tempfile
+import threading
+from collections import deque
+
+# Where live proctoring sessions keep their per-session state between
+# frames. "memory" is the old behaviour: state lives in this process, so
+# every frame of a session must reach the same worker. "sqlite" (one host)
+# and "redis" (many hosts) are shared, so any worker can serve any frame.
+#
+# Shared backends store a compact JSON diff against a fresh state and use a
+# version number for compare-and-set. If two frames of one session are
+# processed at once, the later save loses and its state change is dropped
+# (the frame's response is still returned).
+
+# =========================
+#  CONFIG
+# =========================
+SESSION_STORE = os.getenv("SESSION_STORE", "memory")
+SESSION_STORE_PATH = os.getenv(
+    "SESSION_STORE_PATH", os.path.join(tempfile.gettempdir(), "proctoring_sessions.sqlite3")
+)
+SESSION_STORE_REDIS_URL = os.getenv("SESSION_STORE_REDIS_URL", "redis://localhost:6379/0")
+# Sessions untouched for this long are dropped.
+SESSION_TTL_SEC = int(os.getenv("SESSION_TTL_SEC", 2 * 3600))
+
+_MISSING = object()
+
+
+# =========================
+#  CODEC
+# =========================
+def _plain(value):
+    return list(value) if isinstance(value, deque) else value
+
+
+def encode_state(state, new_state):
+    """JSON of only the fields that differ from a fresh state."""
+    defaults = new_state()
+    diff = {
+        key: _plain(value)
+        for key, value in state.items()
+        if _plain(value) != _plain(defaults.get(key, _MISSING))
+    }
+    return json.dumps(diff, separators=(",", ":"))
+
+
+def decode_state(blob, new_state):
+    state = new_state()
+    for key, value in json.loads(blob).items():
+        current = state.get(key)
+        if isinstance(current, deque):
+            state[key] = deque(value, maxlen=current.maxlen)
+        else:
+            state[key] = value
+    return state
+
+
+# =========================
+#  BACKENDS
+# =========================
+class SessionStore(abc.ABC):
+    """
+    load(id) -> (state, version); mutate state; save(id, state, version).
+    `new_state()` builds the state of a session seen for the first time.
+    """
+
+    shared = False
+    # Idle sessions are dropped by every SWEEP_EVERY-th save
+    SWEEP_EVERY = 500
+
+    def __init__(self, new_state):
+        self.new_state = new_state
+
+    @abc.abstractmethod
+    def load(self, session_id):
+        pass
+
+    @abc.abstractmethod
+    def save(self, session_id, state, version):
+        """False if another worker saved the session since it was loaded."""
+
+    @abc.abstractmethod
+    def delete(self, session_id):
+        pass
+
+    @abc.abstractmethod
+    def count(self):
+        """Sessions seen within SESSION_TTL_SEC."""
+
+
+class MemorySessionStore(SessionStore):
+    """Process-local dict; load() hands out the live state object."""
+
+    def __init__(self, new_state):
+        super().__init__(new_state)
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._ops = 0
+
+    def load(self, session_id):
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                entry = self._sessions[session_id] = [self.new_state(), time.time()]
+            return entry[0], 0
+
+    def save(self, session_id, state, version):
+        now = time.time()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None or entry[0] is not state:
+                # Reset while the frame was being processed
+                return False
+            entry[1] = now
+            self._ops += 1
+            if self._ops % self.SWEEP_EVERY == 0:
+                cutoff = now - SESSION_TTL_SEC
+                for sid in [sid for sid, (_, seen) in self._sessions.items() if seen < cutoff]:
+                    del self._sessions[sid]
+        return True
+
+    def delete(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def count(self):
+        cutoff = time.time() - SESSION_TTL_SEC
+        with self._lock:
+            return sum(1 for _, seen in self._sessions.values() if seen >= cutoff)
+
+
+class SqliteSessionStore(SessionStore):
+    """One SQLite file shared by every worker on the host (WAL mode)."""
+
+    shared = True
+
+    def __init__(self, new_state, path=SESSION_STORE_PATH):
+        super().__init__(new_state)
+        self.path = path
+        self._local = threading.local()
+        self._ops = 0
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS proctoring_sessions ("
+                "id TEXT PRIMARY KEY, state TEXT NOT NULL, version INTEGER NOT NULL, updated REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS proctoring_sessions_updated ON proctoring_sessions (updated)")
+
+    def _conn(self):
+        # One connection per thread, and never one inherited across fork
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def load(self, session_id):
+        row = self._conn().execute(
+            "SELECT state, version, updated FROM proctoring_sessions WHERE id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            return self.new_state(), 0
+        blob, version, updated = row
+        if updated < time.time() - SESSION_TTL_SEC:
+            return self.new_state(), version
+        return decode_state(blob, self.new_state), version
+
+    def save(self, session_id, state, version):
+        blob = encode_state(state, self.new_state)
+        now = time.time()
+        conn = self._conn()
+        if version == 0:
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO proctoring_sessions (id, state, version, updated) VALUES (?, ?, 1, ?)",
+                (session_id, blob, now),
+            )
+        else:
+            cur = conn.execute(
+                "UPDATE proctoring_sessions SET state = ?, version = version + 1, updated = ? "
+                "WHERE id = ? AND version = ?",
+                (blob, now, session_id, version),
+            )
+        self._ops += 1
+        if self._ops % self.SWEEP_EVERY == 0:
+            conn.execute("DELETE FROM proctoring_sessions WHERE updated < ?", (now - SESSION_TTL_SEC,))
+        return cur.rowcount == 1
+
+    def delete(self, session_id):
+        self._conn().execute("DELETE FROM proctoring_sessions WHERE id = ?", (session_id,))
+
+    def count(self):
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM proctoring_sessions WHERE updated >= ?", (time.time() - SESSION_TTL_SEC,)
+        ).fetchone()[0]
+
+
+class RedisSessionStore(SessionStore):
+    """Redis (or any server speaking its protocol), shared across hosts."""
+
+    shared = True
+    PREFIX = "proctoring:session:"
+
+    # Compare-and-set: write only if the stored version is the one loaded
+    _SAVE_SCRIPT = """
+    local current = redis.call('HGET', KEYS[1], 'v') or '0'
+    if current ~= ARGV[1] then return 0 end
+    redis.call('HSET', KEYS[1], 'v', tostring(tonumber(ARGV[1]) + 1), 's', ARGV[2])
+    redis.call('EXPIRE', KEYS[1], ARGV[3])
+    return 1
+    """
+
+    def __init__(self, new_state, url=SESSION_STORE_REDIS_URL):
+        super().__init__(new_state)
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("SESSION_STORE=redis needs the 'redis' package (pip install redis)")
+        self._redis = redis.Redis.from_url(url)
+        self._save = self._redis.register_script(self._SAVE_SCRIPT)
+
+    def load(self, session_id):
+        found = self._redis.hmget(self.PREFIX + session_id, "v", "s")
+        version, blob = found
+        if version is None or blob is None:
+            return self.new_state(), int(version or 0)
+        return decode_state(blob, self.new_state), int(version)
+
+    def save(self, session_id, state, version):
+        blob = encode_state(state, self.new_state)
+        return bool(self._save(keys=[self.PREFIX + session_id], args=[str(version), blob, SESSION_TTL_SEC]))
+
+    def delete(self, session_id):
+        self._redis.delete(self.PREFIX + session_id)
+
+    def count(self):
+        return sum(1 for _ in self._redis.scan_iter(match=self.PREFIX + "*", count=500))
+
+
+BACKENDS = {
+    "memory": MemorySessionStore,
+    "sqlite": SqliteSessionStore,
+    "redis": RedisSessionStore,
+}
+
+
+def create(new_state, backend=None):
+    """The session store selected by SESSION_STORE (or `backend`)."""
+    name = backend or SESSION_STORE
+    try:
+        cls = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown SESSION_STORE '{name}' (known: {', '.join(BACKENDS)})")
+    return cls(new_state)
@@ -0,0 +1,158 @@
+import re
+import json
+from utils.llm_governor import generate_content
+from utils.llm_instrumentation import record_parse_failure
+
+# Schemas are plain dicts in the OpenAPI subset Gemini understands:
+#   {"type": "object", "properties": {...}, "required": [...]}
+#   {"type": "array", "items": {...}}
+#   {"type": "string", "enum": [...]}, "integer", "number", "boolean"
+# The same dict is sent as response_schema and used to validate/coerce the
+# parsed result, so every call site declares its shape exactly once.
+
+_FENCE_RE = re.compile(r"^```(?:json)?\s*|\s*```$", re.IGNORECASE)
+_TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+_NUMBER_RE = re.compile(r"-?\d+(?:\.\d+)?")
+_decoder = json.JSONDecoder()
+
+
+class StructuredOutputError(ValueError):
+    """The model output could not be parsed or does not match the schema."""
+
+
+# =========================
+#  PARSING
+# =========================
+def parse_json(text, expect=None):
+    """
+    Tolerant JSON extraction. Handles markdown fences, prose around the
+    payload, nested objects and trailing commas. `expect` ("object" or
+    "array") picks which kind of value to look for first.
+    """
+    if not text or not text.strip():
+        raise StructuredOutputError("Gemini returned empty output.")
+
+    cleaned = _FENCE_RE.sub("", text.strip())
+    try:
+        return json.loads(cleaned)
+    except ValueError:
+        pass
+
+    openers = {"object": "{", "array": "["}.get(expect, "{[")
+    for candidate in (cleaned, _TRAILING_COMMA_RE.sub(r"\1", cleaned)):
+        for idx, ch in enumerate(candidate):
+            if ch not in openers:
+                continue
+            try:
+                value, _ = _decoder.raw_decode(candidate, idx)
+                return value
+            except ValueError:
+                continue
+    raise StructuredOutputError("No valid JSON found in model output.")
+
+
+# =========================
+#  VALIDATION
+# =========================
+def _coerce(value, schema, path):
+    kind = schema.get("type", "string")
+
+    if value is None:
+        if schema.get("nullable"):
+            return None
+        raise StructuredOutputError(f"{path}: missing value")
+
+    if kind == "object":
+        if not isinstance(value, dict):
+            raise StructuredOutputError(f"{path}: expected object")
+        out = {}
+        for key, sub in schema.get("properties", {}).items():
+            if key in value:
+                out[key] = _coerce(value[key], sub, f"{path}.{key}")
+            elif key in schema.get("required", []):
+                raise StructuredOutputError(f"{path}.{key}: required")
+        return out
+
+    if kind == "array":
+        if isinstance(value, str):
+            value = [v.strip() for v in value.split(",") if v.strip()]
+        if not isinstance(value, list):
+            raise StructuredOutputError(f"{path}: expected array")
+        item_schema = schema.get("items", {"type": "string"})
+        return [_coerce(v, item_schema, f"{path}[{i}]") for i, v in enumerate(value)]
+
+    if kind in ("integer", "number"):
+        if isinstance(value, bool):
+            value = int(value)
+        if isinstance(value, str):
+            match = _NUMBER_RE.search(value)
+            if not match:
+                raise StructuredOutputError(f"{path}: expected {kind}")
+            value = float(match.group())
+        if not isinstance(value, (int, float)):
+            raise StructuredOutputError(f"{path}: expected {kind}")
+        return int(round(value)) if kind == "integer" else float(value)
+
+    if kind == "boolean":
+        if isinstance(value, str):
+            return value.strip().lower() in ("true", "yes", "1")
+        return bool(value)
+
+    # string
+    value = value if isinstance(value, str) else str(value)
+    value = value.strip()
+    enum = schema.get("enum")
+    if enum:
+        match = next((e for e in enum if e.lower() == value.lower()), None)
+        if match is None:
+            raise StructuredOutputError(f"{path}: '{value}' not in {enum}")
+        value = match
+    return value
+
+
+def validate(data, schema):
+    """Coerce parsed JSON into the declared shape or raise StructuredOutputError."""
+    return _coerce(data, schema, "$")
+
+
+# =========================
+#  GEMINI
+# =========================
+def to_gemini_schema(schema):
+    """Copy of a schema with the upper-case type names Gemini's Schema proto uses."""
+    out = {}
+    for key, value in schema.items():
+        if key == "type":
+            out[key] = value.upper()
+        elif key == "properties":
+            out[key] = {k: to_gemini_schema(v) for k, v in value.items()}
+        elif key == "items":
+            out[key] = to_gemini_schema(value)
+        else:
+            out[key] = value
+    return out
+
+
+def structured_config(schema, **extra):
+    return {
+        "response_mime_type": "application/json",
+        "response_schema": to_gemini_schema(schema),
+        **extra,
+    }
+
+
+def generate_structured(model, prompt, schema, endpoint="default", generation_config=None):
+    """
+    Ask Gemini for JSON constrained to `schema`, then parse and validate it.
+    Raises StructuredOutputError (a ValueError) on unusable output; parse
+    failures are recorded against `endpoint`.
+    """
+    config = structured_config(schema, **(generation_config or {}))
+    response = generate_content(model, prompt, endpoint=endpoint, generation_config=config)
+    try:
+        return validate(parse_json(response.text, expect=schema.get("type")), schema)
+    except ValueError as e:
+        record_parse_failure(endpoint)
+        if isinstance(e, StructuredOutputError):
+            raise
+        raise StructuredOutputError(str(e)) from e
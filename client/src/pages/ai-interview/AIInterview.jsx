@@ -434,14 +434,20 @@ const AIInterview = () => {
   };
 
   const processingRef = useRef(false);
+  // Server-suggested time of the next frame (next_frame_interval_ms)
+  const nextFrameAtRef = useRef(0);
 
   const WARNING_COOLDOWN_MS = 6000;
 
   const startCheatingDetection = () => {
     const canvas = document.createElement("canvas");
+    nextFrameAtRef.current = 0;
     frameIntervalRef.current = setInterval(async () => {
-      if (processingRef.current) return;
+      if (processingRef.current || Date.now() < nextFrameAtRef.current) return;
       processingRef.current = true;
+      // Default 1s pace, also used after errors; replaced by the server's hint
+      const startedAt = Date.now();
+      nextFrameAtRef.current = startedAt + 1000;
 
       try {
         const video = videoRef.current;
@@ -477,6 +483,11 @@ const AIInterview = () => {
 
         const data = res.data || {};
         console.debug("Cheat detector response:", data);
+        nextFrameAtRef.current =
+          startedAt +
+          (typeof data.next_frame_interval_ms === "number"
+            ? data.next_frame_interval_ms
+            : 1000);
 
         // Update attempts safely
         const attemptsFromServer =
@@ -563,7 +574,7 @@ const AIInterview = () => {
       } finally {
         processingRef.current = false;
       }
-    }, 1000); // still runs every 1.5s, but no-face detection gap shortened in backend
+    }, 100); // polls often; frames are only sent when nextFrameAtRef is due
   };
 
   const handleStart = async () => {
@@ -162,14 +162,41 @@ const StudentCourses = () => {
     // eslint-disable-next-line react-hooks/exhaustive-deps
   }, [studentId]); // Only re-run if studentId changes
 
+  // Full analysis runs as a background job: poll its status and load the
+  // recommendations once it is done
   useEffect(() => {
-    if (!loading) return; // only rotate messages while loading
+    if (isProcessed || !studentId) return;
+    const timer = setInterval(async () => {
+      try {
+        const res = await apiClient.get(
+          `/api/recommendations/${studentId}/status`
+        );
+        if (res.data.isProcessed) {
+          clearInterval(timer);
+          fetchCourses(false);
+        } else if (res.data.job?.status === "failed") {
+          clearInterval(timer);
+          setIsProcessed(true);
+          setError(res.data.job.error || "Profile analysis failed.");
+        }
+      } catch (err) {
+        // Transient errors: keep polling
+        console.error("Error checking analysis status", err);
+      }
+    }, 5000);
+
+    return () => clearInterval(timer);
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [isProcessed, studentId]);
+
+  useEffect(() => {
+    if (!loading && isProcessed) return; // only rotate messages while loading
     const interval = setInterval(() => {
       setLoadingMessageIndex((prev) => (prev + 1) % loadingMessages.length);
     }, 3000);
 
     return () => clearInterval(interval);
-  }, [loading, loadingMessages.length]); // Added loadingMessages.length to dependencies
+  }, [loading, isProcessed, loadingMessages.length]); // Added loadingMessages.length to dependencies
 
   // Helper: is course enrolled?
   const isEnrolled = (courseId) =>
@@ -311,7 +338,7 @@ const StudentCourses = () => {
     return null;
   }
 
-  if (loading || refreshing) {
+  if (loading || refreshing || !isProcessed) {
     // Video still processing: show fun rotating messages + spinner
     return (
       <div className="min-h-screen flex flex-col justify-center items-center bg-white  text-gray-700  px-4 text-center">
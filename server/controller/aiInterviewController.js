@@ -442,6 +442,8 @@ exports.checkCheating = async (req, res) => {
 
     const form = new FormData();
     form.append("frame", req.file.buffer, req.file.originalname);
+    // Per-user detector state (the same id /reset/:id clears)
+    form.append("sessionId", String(req.user?.id || "default"));
 
     let result;
     try {
@@ -27,18 +27,24 @@ exports.handleMessage = async (req, res) => {
     // Fetch recommended courses
     let courses = [];
     if (assessment?.recommended_courses?.length) {
-      const courseIds = assessment.recommended_courses.map((c) => c._id);
+      // Entries are { courseId, score, label, breakdown }; older documents
+      // still hold full course copies with _id.
+      const courseIds = assessment.recommended_courses
+        .map((c) => c.courseId || c._id)
+        .filter(Boolean);
       courses = await Course.find({ _id: { $in: courseIds } }).lean();
     }
 
     // Compose context to send to Flask
     const context = { student, assessment, courses };
 
-    // Call Python Flask server with context + messages
+    // Conversation history is kept by the AI service, so only the newest
+    // message is forwarded. A one-message history means a new chat window.
     const flaskRes = await axios.post(`${AI_BASE}/generate`, {
       userId,
       courseId,
-      messages,
+      message: messages[messages.length - 1]?.text || "",
+      newConversation: messages.length <= 1,
     });
     console.log("Flask response:", flaskRes.data);
     const reply =
@@ -62,6 +62,7 @@ const courseSchema = new mongoose.Schema(
       default: "Beginner",
     },
     domain: { type: String, required: true }, // AI-required
+    domainKey: { type: String, index: true }, // normalized, see domainKeyFor
     idealRoles: [{ type: String, required: true }], // AI-required
     skillsCovered: [{ type: String, required: true }], // AI-required
     challengesAddressed: [{ type: String, required: true }], // AI-required
@@ -82,5 +83,63 @@ const courseSchema = new mongoose.Schema(
   }
 );
 
+// 🔹 Normalized domain key, used by the AI service for exact indexed domain
+// lookups. The table is a copy of shared/course_domains.json (regenerate it
+// with shared/sync_course_domains.py); ai-services/utils/domains.py reads
+// the same table and must match text the same way.
+const { domains: DOMAIN_TABLE } = require("../config/courseDomains.json");
+
+const escapeRegExp = (s) => s.replace(/[.*+?^${}()|[\]\\]/g, "\\$&");
+// ASCII word boundaries, spelled out so they behave like the Python side
+const wholePhrase = (phrase) =>
+  new RegExp(
+    `(?<![A-Za-z0-9])${phrase.split(/\s+/).map(escapeRegExp).join("\\s+")}(?![A-Za-z0-9])`
+  );
+
+const DOMAIN_PATTERNS = DOMAIN_TABLE.map((d) => ({
+  name: d.name,
+  keywords: d.keywords.map(wholePhrase),
+  acronyms: (d.acronyms || []).map(wholePhrase),
+}));
+
+const domainKeyFor = (domain) => {
+  const text = (domain || "").trim();
+  const normalized = text.toLowerCase();
+  if (!normalized) return "";
+  if (DOMAIN_TABLE.some((d) => d.name.toLowerCase() === normalized)) return normalized;
+
+  // Keywords match the lower-cased text, acronyms the text as written
+  let best = null;
+  let bestCount = 0;
+  DOMAIN_PATTERNS.forEach((d) => {
+    const count =
+      d.keywords.filter((re) => re.test(normalized)).length +
+      d.acronyms.filter((re) => re.test(text)).length;
+    if (count > bestCount) {
+      best = d.name;
+      bestCount = count;
+    }
+  });
+  return best ? best.toLowerCase() : normalized;
+};
+
+courseSchema.pre("save", function (next) {
+  if (this.isNew || this.isModified("domain")) {
+    this.domainKey = domainKeyFor(this.domain);
+  }
+  next();
+});
+
+courseSchema.pre(["findOneAndUpdate", "updateOne"], function (next) {
+  const update = this.getUpdate() || {};
+  const domain = update.domain ?? update.$set?.domain;
+  if (domain !== undefined) {
+    this.set("domainKey", domainKeyFor(domain));
+  }
+  next();
+});
+
+courseSchema.statics.domainKeyFor = domainKeyFor;
+
 // Ensure the model name is "Course" (capital C, singular) for Mongoose population compatibility
 module.exports = mongoose.model("Course", courseSchema);
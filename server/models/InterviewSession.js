@@ -47,6 +47,9 @@ const InterviewSessionSchema = new mongoose.Schema(
       index: Number,
       question: String,
     },
+    // Normalized hashes of every question asked; maintained by the AI
+    // service for its duplicate check.
+    questionHashes: [String],
 
     status: {
       type: String,
@@ -62,4 +65,6 @@ const InterviewSessionSchema = new mongoose.Schema(
   { timestamps: true }
 );
 
+InterviewSessionSchema.index({ student: 1, course: 1 });
+
 module.exports = mongoose.model("InterviewSession", InterviewSessionSchema);
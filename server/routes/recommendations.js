@@ -32,4 +32,20 @@ router.get("/recommendations/:studentId", async (req, res) => {
   }
 });
 
+// Status of the background analysis job, polled by the client while
+// recommendations are still being processed
+router.get("/recommendations/:studentId/status", async (req, res) => {
+  try {
+    const flaskResponse = await axios.get(
+      `${AI_BASE}/recommend/status/${req.params.studentId}`
+    );
+    res.json(flaskResponse.data);
+  } catch (error) {
+    const status = error.response?.status === 404 ? 404 : 500;
+    res
+      .status(status)
+      .json(error.response?.data || { error: "Failed to get analysis status" });
+  }
+});
+
 module.exports = router;
@@ -0,0 +1,57 @@
+"""
+Copy shared/course_domains.json into the two services, which are deployed
+separately and each read their own copy:
+
+    python shared/sync_course_domains.py          # regenerate the copies
+    python shared/sync_course_domains.py --check  # exit 1 if a copy is stale
+"""
+import os
+import sys
+import json
+import argparse
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+SOURCE = os.path.join(HERE, "course_domains.json")
+TARGETS = [
+    os.path.join(ROOT, "server", "config", "courseDomains.json"),
+    os.path.join(ROOT, "ai-services", "utils", "course_domains.json"),
+]
+
+
+def render():
+    with open(SOURCE) as f:
+        table = json.load(f)
+    table["_comment"] = "Generated from shared/course_domains.json by shared/sync_course_domains.py - do not edit."
+    return json.dumps(table, indent=2) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--check", action="store_true", help="only report stale copies")
+    args = parser.parse_args()
+
+    expected = render()
+    stale = []
+    for path in TARGETS:
+        try:
+            with open(path) as f:
+                current = f.read()
+        except FileNotFoundError:
+            current = None
+        if current == expected:
+            continue
+        stale.append(os.path.relpath(path, ROOT))
+        if not args.check:
+            with open(path, "w") as f:
+                f.write(expected)
+
+    if args.check and stale:
+        print(f"Out of sync with shared/course_domains.json: {', '.join(stale)}")
+        sys.exit(1)
+    for path in stale:
+        print(f"Wrote {path}")
+
+
+if __name__ == "__main__":
+    main()